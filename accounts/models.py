@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import Count, Sum, Avg, StdDev
+from django.db.models import Avg, StdDev
 from django.utils import timezone
 
 
@@ -72,18 +72,14 @@ class FactoryDetails(models.Model):
         return False
 
     def get_current_capacity_usage(self):
-        """Get current capacity usage from waste inventory"""
+        """Get current capacity usage from the stored capacity ledger"""
         if not hasattr(self, "factorypartner"):
             return 0
 
+        from inventory.capacity import get_capacity_usage
+
         # Only count items that are taking up storage space
-        active_statuses = ["AVAILABLE", "PENDING_REVIEW", "RESERVED"]
-        return sum(
-            waste.quantity
-            for waste in self.factorypartner.waste_items.filter(
-                status__in=active_statuses
-            )
-        )
+        return get_capacity_usage(self.factorypartner)
 
     def get_capacity_percentage(self):
         """Get capacity usage as a percentage"""
@@ -104,13 +100,9 @@ class FactoryDetails(models.Model):
         if not hasattr(self, "factorypartner"):
             return {}
 
-        breakdown = self.factorypartner.waste_items.values("status").annotate(
-            count=Count("id"), total=Sum("quantity")
-        )
-        return {
-            item["status"]: {"count": item["count"], "total": item["total"]}
-            for item in breakdown
-        }
+        from inventory.capacity import get_capacity_breakdown
+
+        return get_capacity_breakdown(self.factorypartner)
 
     def calculate_recommended_capacity(self, time_period_days=30):
         """Calculate recommended capacity based on historical usage patterns"""
@@ -2,7 +2,7 @@ import logging
 
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 
 from .models import (
@@ -88,3 +88,28 @@ def update_related_models(sender, instance, **kwargs):
             instance.factorypartner.save()
     except Exception as e:
         logger.error(f"Error updating related models: {str(e)}")
+
+
+@receiver(pre_save, sender=User)
+def capture_previous_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember the stored username so a designer rename can reindex their designs"""
+    instance._previous_username = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "username" not in update_fields:
+        return
+    instance._previous_username = (
+        sender.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def reindex_renamed_designer_designs(sender, instance, created, raw=False, **kwargs):
+    """Refresh the search vectors of a renamed designer's designs, which index the username"""
+    previous = getattr(instance, "_previous_username", None)
+    if raw or created or previous is None or previous == instance.username:
+        return
+    from designs.models import Design
+    from designs.search import update_search_vectors
+
+    update_search_vectors(Design.objects.filter(designer__user=instance))
@@ -1,3 +1,107 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from designs.models import Design
+from orders.models import DeliveryInfo, Order, PaymentInfo
+from transactions.models import Transaction
+
+from .models import User
+
+
+def create_user(username, user_type):
+    return User.objects.create_user(
+        username=username, email=f"{username}@example.com", user_type=user_type
+    )
+
+
+class AdminDesignersTest(TestCase):
+    def setUp(self):
+        self.admin = create_user("siteadmin", "ADMIN")
+        # Profiles are created by the user signals
+        buyer = create_user("buyer", "BUYER").buyer
+
+        # Designer i has i designs (one published) and i orders, each a completed 10.00 sale
+        self.designers = []
+        for i in range(4):
+            designer = create_user(f"designer{i}", "DESIGNER").designer
+            designer.is_approved = i > 0
+            designer.save()
+            self.designers.append(designer)
+            for j in range(i):
+                design = Design.objects.create(
+                    design_id=f"DSG-{i}-{j}",
+                    name=f"Design {i}-{j}",
+                    description="Design",
+                    designer=designer,
+                    price=Decimal("10.00"),
+                    status="PUBLISHED" if j == 0 else "DRAFT",
+                )
+                order = Order.objects.create(
+                    order_id=f"ORD-{i}-{j}",
+                    buyer=buyer,
+                    design=design,
+                    total_price=Decimal("10.00"),
+                    payment_info=PaymentInfo.objects.create(
+                        payment_id=f"PAY-{i}-{j}", method="INVOICE", amount=Decimal("10.00")
+                    ),
+                    delivery_info=DeliveryInfo.objects.create(
+                        tracking_number=f"TRK-{i}-{j}",
+                        carrier="Carrier",
+                        address="Address",
+                        estimated_delivery_date=timezone.localdate(),
+                    ),
+                )
+                Transaction.objects.create(
+                    transaction_id=f"TXN-{i}-{j}", order=order, amount=Decimal("10.00"),
+                    type="SALE", status="COMPLETED",
+                )
+        self.client.force_login(self.admin)
+
+    def get_designers(self, **params):
+        response = self.client.get(reverse("accounts:admin_designers"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["designers"]
+
+    def test_metrics_are_annotated(self):
+        designers = {designer.id: designer for designer in self.get_designers()}
+
+        busiest = designers[self.designers[3].id]
+        self.assertEqual(busiest.design_count, 3)
+        self.assertEqual(busiest.published_count, 1)
+        self.assertEqual(busiest.order_count, 3)
+        self.assertEqual(busiest.revenue, Decimal("30.00"))
+        self.assertEqual(designers[self.designers[0].id].revenue, 0)
+
+    def test_sorting_and_paging_use_constant_queries(self):
+        url = reverse("accounts:admin_designers")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url, {"sort": "revenue"})
+        for i in range(4, 40):
+            create_user(f"designer{i}", "DESIGNER")
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url, {"sort": "revenue"})
+        self.assertEqual(len(many), len(few))
+
+        page = self.get_designers(sort="revenue")
+        self.assertEqual(
+            [designer.id for designer in page][:3],
+            [designer.id for designer in reversed(self.designers[1:])],
+        )
+        self.assertTrue(page.has_next)
+
+        # The cursor carries the annotated revenue and continues after it
+        next_page = self.client.get(f"{url}?{page.next_query}").context["designers"]
+        self.assertEqual(len(next_page), 40 - 25)
+        self.assertFalse({designer.id for designer in page} & {designer.id for designer in next_page})
+
+    def test_ascending_sort_and_pending_first_default(self):
+        ascending = [designer.id for designer in self.get_designers(sort="orders", direction="asc")]
+        self.assertEqual(ascending, [designer.id for designer in self.designers])
 
-# Create your tests here.
+        # Only designer0 is still pending
+        self.assertEqual(self.get_designers()[0].id, self.designers[0].id)
@@ -22,6 +22,8 @@ urlpatterns = [
     path("admin/reject-designer/<int:designer_id>/", views.admin_reject_designer, name="admin_reject_designer"),
     path("admin/designer/<int:designer_id>/designs/", views.admin_designer_designs, name="admin_designer_designs"),
     path("admin/orders/", views.admin_orders, name="admin_orders"),
+    path("admin/export/<str:dataset>/", views.admin_export, name="admin_export"),
+    path("admin/request-metrics/", views.admin_request_metrics, name="admin_request_metrics"),
     path("admin/update-order-status/<int:order_id>/", views.admin_update_order_status, name="admin_update_order_status"),
     path("admin/approve-payment/<int:order_id>/", views.admin_approve_payment, name="admin_approve_payment"),
     path("admin/analytics/", views.admin_analytics, name="admin_analytics"),
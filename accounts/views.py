@@ -4,11 +4,9 @@ from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction, models
 from django.shortcuts import redirect, render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.db.models import Count, Sum
 from django.utils import timezone
-import xlsxwriter
-from io import BytesIO
 import datetime
 import math
 import logging
@@ -617,17 +615,17 @@ def admin_approve_waste(request, waste_id):
     
     waste_item = get_object_or_404(TextileWaste, waste_id=waste_id)
     
-    # Update status to approved
-    waste_item.status = "AVAILABLE"
-    waste_item.save()
-    
-    # Add notification for factory
+    # Update status and notify the factory in one transaction
     from notifications.utils import send_notification
-    send_notification(
-        waste_item.factory.user,
-        f"Your waste item '{waste_item.material}' has been approved by admin.",
-        "waste_approved"
-    )
+    with transaction.atomic():
+        waste_item.status = "AVAILABLE"
+        waste_item.save()
+        
+        send_notification(
+            waste_item.factory.user,
+            f"Your waste item '{waste_item.material}' has been approved by admin.",
+            "waste_approved"
+        )
     
     return JsonResponse({
         "status": "success", 
@@ -649,23 +647,68 @@ def admin_reject_waste(request, waste_id):
     
     waste_item = get_object_or_404(TextileWaste, waste_id=waste_id)
     
-    # Update status to rejected
-    waste_item.status = "REJECTED"
-    waste_item.save()
-    
-    # Add notification for factory
+    # Update status and notify the factory in one transaction
     from notifications.utils import send_notification
-    send_notification(
-        waste_item.factory.user,
-        f"Your waste item '{waste_item.material}' was rejected. Reason: {reason}",
-        "waste_rejected"
-    )
+    with transaction.atomic():
+        waste_item.status = "REJECTED"
+        waste_item.save()
+        
+        send_notification(
+            waste_item.factory.user,
+            f"Your waste item '{waste_item.material}' was rejected. Reason: {reason}",
+            "waste_rejected"
+        )
     
     return JsonResponse({
         "status": "success", 
         "message": "Waste item rejected successfully"
     })
 
+# Orderings of the designer management page, each ending with a unique key
+DESIGNER_SORTS = {
+    'pending': ('is_approved', '-id'),
+    'designs': ('-design_count', '-id'),
+    'published': ('-published_count', '-id'),
+    'orders': ('-order_count', '-id'),
+    'revenue': ('-revenue', '-id'),
+}
+
+
+def annotate_designer_metrics(designers):
+    """Annotate designers with their design, published design and order counts and revenue.
+
+    Each metric is a correlated subquery rather than a join, so the counts
+    are not multiplied by each other and every designer costs no extra
+    query. Revenue is the sum of completed sales, as in the revenue reports.
+    """
+    from django.db.models import DecimalField, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+    from designs.models import Design
+    from orders.models import Order
+    from transactions.models import Transaction
+    
+    def metric(queryset, designer_path, aggregate, output_field=models.IntegerField()):
+        rows = (
+            queryset.filter(**{designer_path: OuterRef('pk')})
+            .order_by()
+            .values(designer_path)
+            .annotate(value=aggregate)
+            .values('value')
+        )
+        return Coalesce(Subquery(rows, output_field=output_field), 0, output_field=output_field)
+    
+    return designers.annotate(
+        design_count=metric(Design.objects.all(), 'designer', Count('id')),
+        published_count=metric(Design.objects.filter(status="PUBLISHED"), 'designer', Count('id')),
+        order_count=metric(Order.objects.all(), 'design__designer', Count('id')),
+        revenue=metric(
+            Transaction.objects.filter(type='SALE', status='COMPLETED'),
+            'order__design__designer',
+            Sum('amount'),
+            DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+
 @login_required
 def admin_designers(request):
     """Admin view to approve and manage designers"""
@@ -676,21 +719,27 @@ def admin_designers(request):
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect("accounts:profile")
     
-    # Get all designers, pending first
-    designers = Designer.objects.select_related('user').order_by('is_approved', '-approval_date')
+    from common.pagination import paginate_keyset
     
-    from designs.models import Design
+    # Pending designers first unless another metric was picked
+    sort = request.GET.get('sort')
+    if sort not in DESIGNER_SORTS:
+        sort = 'pending'
+    direction = 'asc' if request.GET.get('direction') == 'asc' else 'desc'
+    ordering = DESIGNER_SORTS[sort]
+    if direction == 'asc' and sort != 'pending':
+        ordering = [field.lstrip('-') for field in ordering]
     
-    # Get design counts for each designer
-    for designer in designers:
-        designer.design_count = Design.objects.filter(designer=designer).count()
-        designer.published_count = Design.objects.filter(
-            designer=designer, status="PUBLISHED"
-        ).count()
+    # Every metric is computed in the page query, however many designers there are
+    designers = paginate_keyset(
+        request, annotate_designer_metrics(Designer.objects.select_related('user')), 25, ordering
+    )
     
     context = {
         'user': user,
         'designers': designers,
+        'sort': sort,
+        'direction': direction,
     }
     
     return render(request, "accounts/admin/designers.html", context)
@@ -868,6 +917,49 @@ def admin_orders(request):
     }
     return render(request, "accounts/admin/orders.html", context)
 
+@login_required
+def admin_export(request, dataset):
+    """Stream waste, orders or transactions as CSV or NDJSON"""
+    user = request.user
+    
+    # Verify user is admin
+    if user.user_type != "ADMIN":
+        return JsonResponse({"status": "error", "message": "Access denied"}, status=403)
+    
+    from common.exports import EXPORT_FORMATS, EXPORTS, export_response
+    
+    export_format = request.GET.get("format", "csv")
+    if dataset not in EXPORTS or export_format not in EXPORT_FORMATS:
+        return JsonResponse({"status": "error", "message": "Unknown export"}, status=404)
+    
+    try:
+        filters = {
+            key: datetime.date.fromisoformat(request.GET[key])
+            for key in ("start_date", "end_date")
+            if request.GET.get(key)
+        }
+        if request.GET.get("factory"):
+            filters["factory_id"] = int(request.GET["factory"])
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid filters"}, status=400)
+    filters["status"] = request.GET.get("status") or None
+    
+    filename = f"{dataset}_{timezone.now().strftime('%Y%m%d')}"
+    return export_response(dataset, export_format, filename, **filters)
+
+@login_required
+def admin_request_metrics(request):
+    """Latency histogram, database time and query counts of the latest requests per view"""
+    user = request.user
+    
+    # Verify user is admin
+    if user.user_type != "ADMIN":
+        return JsonResponse({"status": "error", "message": "Access denied"}, status=403)
+    
+    from common.middleware import request_metrics
+    
+    return JsonResponse(request_metrics.snapshot())
+
 @login_required
 def admin_update_order_status(request, order_id):
     """Update the status of an order"""
@@ -888,39 +980,42 @@ def admin_update_order_status(request, order_id):
     if status not in [s[0] for s in Order.ORDER_STATUS_CHOICES]:
         return JsonResponse({"status": "error", "message": "Invalid status"})
     
-    # Inventory logic: adjust material quantities on DELIVERED/CANCELED
-    previous_status = order.status
-    design = order.design
-    quantity = order.quantity
-    # Only adjust if status is changing
-    if status == "DELIVERED" and previous_status != "DELIVERED":
-        # Reduce material quantities
-        for material in design.required_materials.all():
-            material.quantity = max(0, material.quantity - quantity)
-            # Optionally set status to USED if depleted
-            if material.quantity == 0:
-                material.status = "USED"
-            material.save()
-    elif status == "CANCELED" and previous_status == "DELIVERED":
-        # Restore material quantities
-        for material in design.required_materials.all():
-            material.quantity += quantity
-            # Optionally set status back to AVAILABLE if restored
-            if material.quantity > 0 and material.status == "USED":
-                material.status = "AVAILABLE"
-            material.save()
-
-    # Update order status
-    order.status = status
-    order.save()
-    
-    # Add notification for buyer
     from notifications.utils import send_notification
-    send_notification(
-        order.buyer.user,
-        f"Your order #{order.id} status has been updated to {status}.",
-        "order_status_update"
-    )
+    
+    # Inventory changes, the status update and the buyer notification commit together
+    with transaction.atomic():
+        # Inventory logic: adjust material quantities on DELIVERED/CANCELED
+        previous_status = order.status
+        design = order.design
+        quantity = order.quantity
+        # Only adjust if status is changing
+        if status == "DELIVERED" and previous_status != "DELIVERED":
+            # Reduce material quantities
+            for material in design.required_materials.all():
+                material.quantity = max(0, material.quantity - quantity)
+                # Optionally set status to USED if depleted
+                if material.quantity == 0:
+                    material.status = "USED"
+                material.save()
+        elif status == "CANCELED" and previous_status == "DELIVERED":
+            # Restore material quantities
+            for material in design.required_materials.all():
+                material.quantity += quantity
+                # Optionally set status back to AVAILABLE if restored
+                if material.quantity > 0 and material.status == "USED":
+                    material.status = "AVAILABLE"
+                material.save()
+
+        # Update order status
+        order.status = status
+        order.save()
+        
+        # Add notification for buyer
+        send_notification(
+            order.buyer.user,
+            f"Your order #{order.id} status has been updated to {status}.",
+            "order_status_update"
+        )
     
     return JsonResponse({
         "status": "success",
@@ -983,11 +1078,11 @@ def admin_analytics(request):
     debug_mode = 'debug' in request.GET
     
     # Factory analytics - Material Type Distribution
-    from inventory.models import TextileWaste
-    waste_by_material = TextileWaste.objects.values('material').annotate(
-        count=Count('id'),
-        total_quantity=Sum('quantity')
-    ).order_by('-total_quantity')
+    from common.rollups import query_rollup, rollup_queryset
+    waste_by_material = [
+        {'material': row['material'], 'count': row['item_count'], 'total_quantity': row['total_quantity']}
+        for row in query_rollup('waste', ['material'], order_by=['-total_quantity'])
+    ]
     
     # Calculate percentages and add colors for HTML visualization
     total_waste_quantity = sum(item['total_quantity'] or 0 for item in waste_by_material)
@@ -1052,10 +1147,10 @@ def admin_analytics(request):
         item['clip_path_y'] = y
     
     # Buyer analytics - Order Status Distribution
-    from orders.models import Order
-    orders_by_status = Order.objects.values('status').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    orders_by_status = [
+        {'status': row['status'], 'count': row['order_count']}
+        for row in query_rollup('orders', ['status'], order_by=['-order_count'])
+    ]
     
     # Calculate percentages for HTML visualization
     total_orders = sum(item['count'] for item in orders_by_status)
@@ -1090,35 +1185,28 @@ def admin_analytics(request):
         item['clip_path_x'] = x
         item['clip_path_y'] = y
     
-    # Monthly order revenue
-    months = 6  # Last 6 months
-    end_date = timezone.now()
-    start_date = end_date - datetime.timedelta(days=30*months)
+    # Monthly order revenue for the last 6 calendar months
+    from common.timeseries import get_time_series
+    monthly_series = get_time_series(
+        rollup_queryset('orders'),
+        'date',
+        {'count': Sum('order_count'), 'revenue': Sum('revenue')},
+        periods=6
+    )
     
     monthly_orders = []
     max_order_count = 0
     max_revenue = 0
     
-    for i in range(months):
-        month_start = start_date + datetime.timedelta(days=30*i)
-        month_end = start_date + datetime.timedelta(days=30*(i+1))
-        
-        month_data = Order.objects.filter(
-            date_ordered__gte=month_start,
-            date_ordered__lt=month_end
-        ).aggregate(
-            count=Count('id'),
-            revenue=Sum('total_price')
-        )
-        
-        count = month_data['count'] or 0
-        revenue = month_data['revenue'] or 0
+    for month_data in monthly_series:
+        count = month_data['count']
+        revenue = month_data['revenue']
         
         max_order_count = max(max_order_count, count)
         max_revenue = max(max_revenue, revenue)
         
         monthly_orders.append({
-            'month': month_start.strftime('%b %Y'),
+            'month': month_data['period'].strftime('%b %Y'),
             'count': count,
             'revenue': revenue,
             'display_revenue': f"${revenue:.2f}" if revenue else "$0.00"
@@ -1134,9 +1222,15 @@ def admin_analytics(request):
     # Get top factories by waste quantity (for the table section)
     from accounts.models import FactoryPartner
     top_factories = FactoryPartner.objects.select_related('factory_details').annotate(
-        total_quantity=Sum('waste_items__quantity'),
-        available_quantity=Sum('waste_items__quantity', filter=models.Q(waste_items__status="AVAILABLE")),
-        recycled_quantity=Sum('waste_items__quantity', filter=models.Q(waste_items__status="RECYCLED"))
+        total_quantity=Sum('daily_waste_rollups__total_quantity'),
+        available_quantity=Sum(
+            'daily_waste_rollups__total_quantity',
+            filter=models.Q(daily_waste_rollups__status="AVAILABLE")
+        ),
+        recycled_quantity=Sum(
+            'daily_waste_rollups__total_quantity',
+            filter=models.Q(daily_waste_rollups__status="RECYCLED")
+        )
     ).order_by('-total_quantity')[:5]
     
     # Calculate percentages
@@ -1183,28 +1277,21 @@ def admin_sustainability(request):
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect("accounts:profile")
     
-    from inventory.models import TextileWaste
+    from common.rollups import query_rollup, rollup_queryset
     from django.db.models import Sum, Case, When, Value, FloatField, F, Count
     
-    # Calculate total and recycled waste
-    total_waste = TextileWaste.objects.aggregate(total=Sum('quantity'))['total'] or 0
+    # Calculate total and recycled waste from the daily rollups
+    status_totals = {
+        row['status']: row['total_quantity'] or 0
+        for row in query_rollup('waste', ['status'])
+    }
+    total_waste = sum(status_totals.values())
     
     # Count both RECYCLED and USED status as recycled waste for sustainability metrics
-    recycled_waste = TextileWaste.objects.filter(status__in=["RECYCLED", "USED"]).aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-    
-    available_waste = TextileWaste.objects.filter(status="AVAILABLE").aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-    
-    used_waste = TextileWaste.objects.filter(status="USED").aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-    
-    pending_waste = TextileWaste.objects.filter(status="PENDING_REVIEW").aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
+    recycled_waste = status_totals.get("RECYCLED", 0) + status_totals.get("USED", 0)
+    available_waste = status_totals.get("AVAILABLE", 0)
+    used_waste = status_totals.get("USED", 0)
+    pending_waste = status_totals.get("PENDING_REVIEW", 0)
 
     # Print debug information
     print(f"DEBUG - Total Waste: {total_waste}")
@@ -1253,9 +1340,9 @@ def admin_sustainability(request):
     print(f"DEBUG - Water Goal %: {water_percentage}")
     
     # Get waste by material type for breakdown
-    waste_by_material = TextileWaste.objects.values('material').annotate(
-        total=Sum('quantity'),
-        recycled=Sum('quantity', filter=models.Q(status__in=["RECYCLED", "USED"])),
+    waste_by_material = rollup_queryset('waste').values('material').annotate(
+        total=Sum('total_quantity'),
+        recycled=Sum('total_quantity', filter=models.Q(status__in=["RECYCLED", "USED"])),
         recycled_percentage=Case(
             When(total__gt=0, then=100.0 * F('recycled') / F('total')),
             default=Value(0.0),
@@ -1264,16 +1351,16 @@ def admin_sustainability(request):
     ).order_by('-total')
 
     # Get waste utilization by factory
-    waste_by_factory = TextileWaste.objects.values(
+    waste_by_factory = rollup_queryset('waste').values(
         'factory__factory_details__factory_name'
     ).annotate(
-        total=Sum('quantity'),
-        recycled=Sum('quantity', filter=models.Q(status__in=["RECYCLED", "USED"])),
-        available=Sum('quantity', filter=models.Q(status="AVAILABLE")),
+        total=Sum('total_quantity'),
+        recycled=Sum('total_quantity', filter=models.Q(status__in=["RECYCLED", "USED"])),
+        available=Sum('total_quantity', filter=models.Q(status="AVAILABLE")),
         utilized=Case(
             When(
                 total__gt=0,
-                then=Sum('quantity', filter=models.Q(status__in=["RECYCLED", "USED"]))
+                then=Sum('total_quantity', filter=models.Q(status__in=["RECYCLED", "USED"]))
             ),
             default=Value(0.0),
             output_field=FloatField()
@@ -1281,7 +1368,7 @@ def admin_sustainability(request):
         utilization_rate=Case(
             When(
                 total__gt=0,
-                then=100.0 * Sum('quantity', filter=models.Q(status__in=["RECYCLED", "USED"])) / F('total')
+                then=100.0 * Sum('total_quantity', filter=models.Q(status__in=["RECYCLED", "USED"])) / F('total')
             ),
             default=Value(0.0),
             output_field=FloatField()
@@ -1296,31 +1383,26 @@ def admin_sustainability(request):
         {'status': 'Pending', 'quantity': pending_waste, 'percentage': pending_percentage}
     ]
     
-    # Monthly trends for the last 6 months
-    months = 6
-    end_date = timezone.now()
-    start_date = end_date - datetime.timedelta(days=30*months)
+    # Monthly trends for the last 6 calendar months
+    from common.timeseries import get_time_series
+    monthly_series = get_time_series(
+        rollup_queryset('waste'),
+        'date',
+        {
+            'collected': Sum('total_quantity'),
+            'recycled': Sum('total_quantity', filter=models.Q(status__in=["RECYCLED", "USED"]))
+        },
+        periods=6
+    )
     
     monthly_data = []
-    for i in range(months):
-        month_start = start_date + datetime.timedelta(days=30*i)
-        month_end = start_date + datetime.timedelta(days=30*(i+1))
-        
-        month_data = TextileWaste.objects.filter(
-            date_added__gte=month_start,
-            date_added__lt=month_end
-        ).aggregate(
-            collected=Sum('quantity'),
-            recycled=Sum('quantity', filter=models.Q(status__in=["RECYCLED", "USED"]))
-        )
-        
-        # Fix: Properly handle None values
-        collected = month_data['collected'] or 0
-        recycled = month_data['recycled'] or 0
+    for month_data in monthly_series:
+        collected = month_data['collected']
+        recycled = month_data['recycled']
         efficiency = (recycled / collected * 100) if collected > 0 else 0
         
         monthly_data.append({
-            'month': month_start.strftime('%b %Y'),
+            'month': month_data['period'].strftime('%b %Y'),
             'collected': collected,
             'recycled': recycled,
             'efficiency': efficiency
@@ -1363,9 +1445,10 @@ def generate_sustainability_report(request):
         messages.error(request, "Access denied. Admin privileges required.")
         return redirect("accounts:profile")
     
-    # Create an in-memory output file
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    from common.exports import EXPORT_CHUNK_SIZE, excel_file_response, open_streaming_workbook
+
+    # Rows are flushed to a temporary file as they are written
+    workbook, output = open_streaming_workbook()
     
     # Add formatting
     title_format = workbook.add_format({
@@ -1381,13 +1464,11 @@ def generate_sustainability_report(request):
     metrics_sheet = workbook.add_worksheet('Sustainability Metrics')
     metrics_sheet.set_column('A:C', 25)
     
-    from inventory.models import TextileWaste
+    from common.rollups import query_rollup, rollup_queryset
     
     # Calculate textile waste recycled
-    total_waste = TextileWaste.objects.aggregate(total=Sum('quantity'))['total'] or 0
-    recycled_waste = TextileWaste.objects.filter(status="RECYCLED").aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
+    total_waste = query_rollup('waste')['total_quantity']
+    recycled_waste = query_rollup('waste', status="RECYCLED")['total_quantity']
     
     # Calculate CO2 reduction (estimated 6kg CO2 saved per kg textile recycled)
     co2_reduction = recycled_waste * 6  # in kg
@@ -1427,16 +1508,16 @@ def generate_sustainability_report(request):
     ], header_format)
     
     # Get waste by factory
-    waste_by_factory = TextileWaste.objects.values(
+    waste_by_factory = rollup_queryset('waste').values(
         'factory__factory_details__factory_name'
     ).annotate(
-        total=Sum('quantity'),
-        recycled=Sum('quantity', filter=models.Q(status="RECYCLED")),
-        available=Sum('quantity', filter=models.Q(status="AVAILABLE"))
+        total=Sum('total_quantity'),
+        recycled=Sum('total_quantity', filter=models.Q(status="RECYCLED")),
+        available=Sum('total_quantity', filter=models.Q(status="AVAILABLE"))
     ).order_by('-total')
     
     # Add factory data
-    for i, factory in enumerate(waste_by_factory):
+    for i, factory in enumerate(waste_by_factory.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
         factory_name = factory['factory__factory_details__factory_name'] or 'Unknown'
         total = factory['total'] or 0
         recycled = factory['recycled'] or 0
@@ -1459,12 +1540,12 @@ def generate_sustainability_report(request):
     ], header_format)
     
     # Get waste by material type
-    waste_by_material = TextileWaste.objects.values('material').annotate(
-        total=Sum('quantity')
+    waste_by_material = rollup_queryset('waste').values('material').annotate(
+        total=Sum('total_quantity')
     ).order_by('-total')
     
     # Add material data
-    for i, material in enumerate(waste_by_material):
+    for i, material in enumerate(waste_by_material.iterator(chunk_size=EXPORT_CHUNK_SIZE)):
         material_type = material['material']
         total = material['total'] or 0
         percentage = total/total_waste if total_waste > 0 else 0
@@ -1480,29 +1561,24 @@ def generate_sustainability_report(request):
     trends_sheet.merge_range('A1:C1', 'Monthly Waste Collection Trends', title_format)
     trends_sheet.write_row(1, 0, ['Month', 'Waste Collected (kg)', 'Waste Recycled (kg)'], header_format)
     
-    # Get monthly waste data for the last 12 months
-    months = 12
-    end_date = timezone.now()
-    start_date = end_date - datetime.timedelta(days=30*months)
-    
-    monthly_data = []
-    for i in range(months):
-        month_start = start_date + datetime.timedelta(days=30*i)
-        month_end = start_date + datetime.timedelta(days=30*(i+1))
-        
-        month_data = TextileWaste.objects.filter(
-            date_added__gte=month_start,
-            date_added__lt=month_end
-        ).aggregate(
-            collected=Sum('quantity'),
-            recycled=Sum('quantity', filter=models.Q(status="RECYCLED"))
+    # Get monthly waste data for the last 12 calendar months
+    from common.timeseries import get_time_series
+    monthly_data = [
+        {
+            'month': month['period'].strftime('%b %Y'),
+            'collected': month['collected'],
+            'recycled': month['recycled']
+        }
+        for month in get_time_series(
+            rollup_queryset('waste'),
+            'date',
+            {
+                'collected': Sum('total_quantity'),
+                'recycled': Sum('total_quantity', filter=models.Q(status="RECYCLED"))
+            },
+            periods=12
         )
-        
-        monthly_data.append({
-            'month': month_start.strftime('%b %Y'),
-            'collected': month_data['collected'] or 0,
-            'recycled': month_data['recycled'] or 0
-        })
+    ]
     
     # Add monthly data
     for i, month in enumerate(monthly_data):
@@ -1513,12 +1589,4 @@ def generate_sustainability_report(request):
     # Close the workbook
     workbook.close()
     
-    # Create the HttpResponse with Excel
-    output.seek(0)
-    response = HttpResponse(
-        output.read(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename=sustainability_report.xlsx'
-    
-    return response
+    return excel_file_response(output, 'sustainability_report.xlsx')
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'common'
\ No newline at end of file
+    name = 'common'
+
+    def ready(self):
+        import common.signals
@@ -0,0 +1,149 @@
+"""Resized and WebP copies of uploaded images.
+
+Listing pages show images a few hundred pixels wide, so serving the
+original upload wastes most of what is downloaded. Once an upload is
+committed, its derivatives are rendered in a process pool and stored next to
+the original as ``<name>.<width>w.<ext>`` under MEDIA_ROOT. They are then
+recorded on the row, and the ``responsive_image`` template tag picks the
+smallest one covering the displayed size.
+"""
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Widths rendered for every image narrower than the original
+DERIVATIVE_WIDTHS = [160, 320, 640, 1280]
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+DERIVATIVE_NAME = re.compile(r"\.\d+w\.(webp|jpg|png)$")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process pool shared by every derivative rendering of this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned workers only render images, so they never inherit open connections
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _executor
+
+
+def render_derivatives(media_root, name, widths=DERIVATIVE_WIDTHS):
+    """Render the derivatives of an image stored under ``media_root``.
+
+    Every width gets a WebP copy and a JPEG one (PNG for images with
+    transparency) for browsers without WebP, each resized from the next
+    larger copy rather than from the original. The full-size image also
+    gets a WebP copy. Runs in pool workers, so it uses nothing but Pillow.
+    Returns the derivatives, smallest first.
+    """
+    stem = os.path.splitext(name)[0]
+    derivatives = []
+
+    def save(image, width, image_format, extension, **options):
+        derivative = f"{stem}.{width}w.{extension}"
+        path = os.path.join(media_root, derivative)
+        image.save(path, image_format, **options)
+        derivatives.append({
+            "name": derivative,
+            "width": image.width,
+            "height": image.height,
+            "format": extension,
+            "size": os.path.getsize(path),
+        })
+
+    with Image.open(os.path.join(media_root, name)) as original:
+        has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+        image = ImageOps.exif_transpose(original).convert("RGBA" if has_alpha else "RGB")
+
+    save(image, image.width, "WEBP", "webp", quality=WEBP_QUALITY, method=4)
+    for width in sorted((width for width in widths if width < image.width), reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        save(image, width, "WEBP", "webp", quality=WEBP_QUALITY, method=4)
+        if has_alpha:
+            save(image, width, "PNG", "png", optimize=True)
+        else:
+            save(image, width, "JPEG", "jpg", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+    derivatives.sort(key=lambda derivative: (derivative["width"], derivative["format"]))
+    return derivatives
+
+
+def record_derivatives(label, pk, field, record_field, name, derivatives):
+    """Store rendered derivatives on a row, unless its image was replaced meanwhile"""
+    model = apps.get_model(label)
+    return model._default_manager.filter(pk=pk, **{field: name}).update(
+        **{record_field: {"source": name, "items": derivatives}}
+    )
+
+
+def _record_rendered(label, pk, field, record_field, name, future):
+    # Runs on the pool's management thread, which keeps no connection between calls
+    try:
+        record_derivatives(label, pk, field, record_field, name, future.result())
+    except Exception as e:
+        logger.error(f"Could not create the derivatives of {name}: {e}")
+    finally:
+        connection.close()
+
+
+def _submit(label, pk, field, record_field, name):
+    media_root = str(settings.MEDIA_ROOT)
+    if not getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        try:
+            derivatives = render_derivatives(media_root, name)
+        except Exception as e:
+            logger.error(f"Could not create the derivatives of {name}: {e}")
+            return
+        record_derivatives(label, pk, field, record_field, name, derivatives)
+        return
+
+    future = get_executor().submit(render_derivatives, media_root, name)
+    future.add_done_callback(
+        lambda done: _record_rendered(label, pk, field, record_field, name, done)
+    )
+
+
+def schedule_derivatives(instance, field="image", record_field="image_derivatives"):
+    """Render the derivatives of an instance's image once the current transaction commits.
+
+    Rendering happens in the process pool unless ``IMAGE_DERIVATIVES_ASYNC``
+    is off, so the request that saved the image does not wait for it.
+    """
+    name = getattr(instance, field).name
+    transaction.on_commit(
+        lambda: _submit(instance._meta.label, instance.pk, field, record_field, name)
+    )
+
+
+def is_derivative(name):
+    """Tell whether a file name is one ``render_derivatives`` writes"""
+    return bool(DERIVATIVE_NAME.search(name))
+
+
+def pick_derivative(derivatives, width, image_format):
+    """Get the smallest derivative of a format at least ``width`` wide, or the largest one"""
+    candidates = [item for item in derivatives.get("items", []) if item["format"] == image_format]
+    for item in candidates:
+        if item["width"] >= width:
+            return item
+    return candidates[-1] if candidates else None
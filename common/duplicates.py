@@ -0,0 +1,155 @@
+"""Near-duplicate detection over the perceptual hashes of stored images.
+
+Two images are near duplicates when their 64-bit perceptual hashes differ
+in at most ``DUPLICATE_DISTANCE`` bits. Single lookups use a multi-index
+over ``ImageFeatures``: every hash is split into ``HASH_CHUNKS`` chunks and
+any hash within the distance has at least one chunk within
+``distance // HASH_CHUNKS`` bits of the query's. Those chunk values are
+probed through a GIN index, so only a handful of candidates are compared
+however many images are stored. Sweeps over many hashes use a BK-tree.
+"""
+from itertools import combinations
+
+from .images import FEATURES_VERSION, analyze_image
+from .models import ImageFeatures
+
+# Largest number of differing hash bits between two near-duplicate images
+DUPLICATE_DISTANCE = 6
+
+HASH_BITS = 64
+HASH_CHUNKS = 4
+CHUNK_BITS = HASH_BITS // HASH_CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def unsigned_hash(value):
+    """Read back a hash stored in a signed BIGINT column"""
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def hamming_distance(first, second):
+    return (unsigned_hash(first) ^ unsigned_hash(second)).bit_count()
+
+
+def hash_chunks(value):
+    """Split a hash into its chunks, each tagged with its position so they can share one index"""
+    value = unsigned_hash(value)
+    return [
+        (position << CHUNK_BITS) | ((value >> (position * CHUNK_BITS)) & CHUNK_MASK)
+        for position in range(HASH_CHUNKS)
+    ]
+
+
+def _chunk_probes(value, distance):
+    """Tagged chunk values one of which any hash within ``distance`` bits must share"""
+    radius = distance // HASH_CHUNKS
+    probes = []
+    for chunk in hash_chunks(value):
+        probes.append(chunk)
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(CHUNK_BITS), flips):
+                probes.append(chunk ^ sum(1 << bit for bit in bits))
+    return probes
+
+
+def find_similar_hashes(value, distance=DUPLICATE_DISTANCE):
+    """Get the digests of the stored images within ``distance`` bits of a hash, closest first"""
+    candidates = ImageFeatures.objects.filter(
+        version=FEATURES_VERSION, phash_chunks__overlap=_chunk_probes(value, distance)
+    ).values_list("digest", "phash")
+    similar = [
+        (digest, hamming_distance(value, phash))
+        for digest, phash in candidates
+    ]
+    return sorted(
+        (match for match in similar if match[1] <= distance),
+        key=lambda match: (match[1], match[0]),
+    )
+
+
+def find_duplicates(path, distance=DUPLICATE_DISTANCE):
+    """Analyse an image file and find the stored images it nearly duplicates.
+
+    Returns its ``ImageFeatures`` with the (digest, distance) pairs of the
+    similar images, including its own digest, or (None, []) if the file
+    cannot be read.
+    """
+    features = analyze_image(path)
+    if features is None:
+        return None, []
+    return features, find_similar_hashes(features.phash, distance)
+
+
+class BKTree:
+    """Burkhard-Keller tree of hashes under the Hamming distance.
+
+    Every child sits under the edge of its distance to the parent, so a
+    search only descends into edges within ``distance`` of the query's own
+    distance to the node (triangle inequality).
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, key):
+        value = unsigned_hash(value)
+        if self.root is None:
+            self.root = (value, [key], {})
+            return
+        node = self.root
+        while True:
+            node_value, keys, children = node
+            gap = hamming_distance(value, node_value)
+            if gap == 0:
+                keys.append(key)
+                return
+            if gap not in children:
+                children[gap] = (value, [key], {})
+                return
+            node = children[gap]
+
+    def search(self, value, distance):
+        """Get the (key, distance) pairs of every hash within ``distance`` bits"""
+        value = unsigned_hash(value)
+        found = []
+        pending = [self.root] if self.root else []
+        while pending:
+            node_value, keys, children = pending.pop()
+            gap = hamming_distance(value, node_value)
+            if gap <= distance:
+                found.extend((key, gap) for key in keys)
+            pending.extend(
+                child for edge, child in children.items() if gap - distance <= edge <= gap + distance
+            )
+        return found
+
+
+def group_duplicates(hashes, distance=DUPLICATE_DISTANCE):
+    """Group keys whose hashes are near duplicates, directly or through each other.
+
+    ``hashes`` maps keys to hashes. Returns the groups of more than one key,
+    each sorted, largest group first.
+    """
+    tree = BKTree()
+    for key, value in hashes.items():
+        tree.add(value, key)
+
+    parents = {key: key for key in hashes}
+
+    def root(key):
+        while parents[key] != key:
+            parents[key] = parents[parents[key]]
+            key = parents[key]
+        return key
+
+    for key, value in hashes.items():
+        for other, _ in tree.search(value, distance):
+            parents[root(other)] = root(key)
+
+    groups = {}
+    for key in hashes:
+        groups.setdefault(root(key), []).append(key)
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: (-len(group), group[0]),
+    )
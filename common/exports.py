@@ -0,0 +1,222 @@
+import csv
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+
+import xlsxwriter
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Q
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from inventory.models import TextileWaste
+from orders.models import Order
+from transactions.models import Transaction
+
+EXCEL_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows fetched per round trip when streaming a queryset into an export
+EXPORT_CHUNK_SIZE = 2000
+
+
+def open_streaming_workbook():
+    """Create a constant-memory workbook backed by an anonymous temporary file.
+
+    In ``constant_memory`` mode xlsxwriter flushes every row to disk as soon
+    as the next row is started, so rows must be written in order but memory
+    stays flat however many are written. Returns the workbook and the file
+    it is written to.
+    """
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(
+        output,
+        {
+            "constant_memory": True,
+            "remove_timezone": True,
+            "default_date_format": "yyyy-mm-dd hh:mm",
+        },
+    )
+    return workbook, output
+
+
+def write_sheet_rows(worksheet, first_row, rows, cell_format=None):
+    """Write an iterable of row sequences one after another and return the next free row"""
+    row_number = first_row
+    for row in rows:
+        worksheet.write_row(row_number, 0, row, cell_format)
+        row_number += 1
+    return row_number
+
+
+def excel_file_response(output, filename):
+    """Send a closed workbook's file as an attachment.
+
+    ``FileResponse`` reads the file in blocks and closes it once sent, which
+    also removes the temporary file.
+    """
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=filename, content_type=EXCEL_CONTENT_TYPE
+    )
+
+
+# Rows per keyset page of a CSV/NDJSON export. Each page is its own short
+# query, read through a server-side cursor in EXPORT_CHUNK_SIZE chunks.
+EXPORT_PAGE_SIZE = 10000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _materials_of_factory(design_path):
+    """Build a factory filter matching rows whose design uses the factory's waste"""
+    return lambda factory_id: Exists(
+        TextileWaste.objects.filter(
+            factory_id=factory_id, designs_requiring=OuterRef(design_path)
+        )
+    )
+
+
+# Source model, filter lookups and columns of every bulk export
+EXPORTS = {
+    "waste": {
+        "model": TextileWaste,
+        "date_field": "date_added",
+        "factory_filter": lambda factory_id: Q(factory_id=factory_id),
+        "columns": {
+            "waste_id": "waste_id",
+            "factory": "factory__factory_details__factory_name",
+            "type": "type",
+            "material": "material",
+            "quantity": "quantity",
+            "unit": "unit",
+            "color": "color",
+            "quality_grade": "quality_grade",
+            "status": "status",
+            "sustainability_score": "sustainability_score",
+            "storage_location": "storage_location",
+            "batch_number": "batch_number",
+            "date_added": "date_added",
+        },
+    },
+    "orders": {
+        "model": Order,
+        "date_field": "date_ordered",
+        "factory_filter": _materials_of_factory("design_id"),
+        "columns": {
+            "order_id": "order_id",
+            "buyer": "buyer__user__username",
+            "design_id": "design__design_id",
+            "design": "design__name",
+            "quantity": "quantity",
+            "total_price": "total_price",
+            "status": "status",
+            "date_ordered": "date_ordered",
+        },
+    },
+    "transactions": {
+        "model": Transaction,
+        "date_field": "date",
+        "factory_filter": _materials_of_factory("order__design_id"),
+        "columns": {
+            "transaction_id": "transaction_id",
+            "order_id": "order__order_id",
+            "type": "type",
+            "amount": "amount",
+            "status": "status",
+            "date": "date",
+        },
+    },
+}
+
+
+def get_export_queryset(name, start_date=None, end_date=None, status=None, factory_id=None):
+    """Get the rows of an export, filtered by date range (both dates inclusive), status and factory"""
+    spec = EXPORTS[name]
+    queryset = spec["model"].objects.all()
+    date_field = spec["date_field"]
+    if start_date:
+        queryset = queryset.filter(**{f"{date_field}__gte": _day_start(start_date)})
+    if end_date:
+        queryset = queryset.filter(
+            **{f"{date_field}__lt": _day_start(end_date + timedelta(days=1))}
+        )
+    if status:
+        queryset = queryset.filter(status=status)
+    if factory_id:
+        queryset = queryset.filter(spec["factory_filter"](factory_id))
+    return queryset
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def iter_export_rows(name, **filters):
+    """Yield the rows of an export as dicts of column values, oldest first.
+
+    Rows are read in keyset pages on the primary key rather than with
+    OFFSET, so every page costs the same and no query or cursor stays open
+    for the whole export.
+    """
+    columns = EXPORTS[name]["columns"]
+    queryset = get_export_queryset(name, **filters).order_by("pk")
+    fields = ["pk", *columns.values()]
+
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        fetched = 0
+        for values in page.values_list(*fields)[:EXPORT_PAGE_SIZE].iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        ):
+            last_pk, fetched = values[0], fetched + 1
+            yield dict(zip(columns, values[1:]))
+        if fetched < EXPORT_PAGE_SIZE:
+            return
+
+
+class _Echo:
+    """File-like object whose write returns the line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def render_csv(columns, rows):
+    """Yield a header line and then one CSV line per row"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_export_value(value) for value in row.values()])
+
+
+def render_ndjson(rows):
+    """Yield one JSON document per line per row"""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def export_response(name, export_format, filename, **filters):
+    """Stream an export as a CSV or NDJSON attachment.
+
+    The first rows are sent as soon as they are read, and memory stays
+    constant however many rows the export has.
+    """
+    rows = iter_export_rows(name, **filters)
+    if export_format == "csv":
+        content = render_csv(list(EXPORTS[name]["columns"]), rows)
+    else:
+        content = render_ndjson(rows)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
@@ -0,0 +1,287 @@
+"""Batch feature extraction for design and waste images.
+
+Every image is decoded once, downsampled to ``ANALYSIS_SIZE`` square and
+stacked with the rest of its batch, so the colour, texture, defect and
+hash features of the whole batch are computed with array operations.
+Results are stored in ``ImageFeatures`` under the SHA-256 of the file, so
+analysing a file again, or a copy of it, reads a row instead of decoding.
+"""
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .derivatives import is_derivative
+from .models import ImageFeatures
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the features change so stored results are recomputed
+FEATURES_VERSION = 1
+
+# Side of the square every image is downsampled to before analysis
+ANALYSIS_SIZE = 128
+
+# Images decoded and analysed together
+ANALYSIS_BATCH_SIZE = 32
+
+# Side of the pixel grid clustered into dominant colours
+KMEANS_SIZE = 32
+DOMINANT_COLORS = 5
+KMEANS_ITERATIONS = 10
+
+HISTOGRAM_BINS = 16
+
+# Gradient magnitude, on a 0-1 brightness scale, counted as an edge
+EDGE_THRESHOLD = 0.1
+
+# The perceptual hash keeps the HASH_SIZE x HASH_SIZE lowest frequencies of a DCT_SIZE DCT
+DCT_SIZE = 32
+HASH_SIZE = 8
+
+# Blocks per side checked for defects, and the deviation from the typical block that flags one
+DEFECT_GRID = 8
+DEFECT_THRESHOLD = 3.0
+
+# File extensions swept as images under MEDIA_ROOT
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def find_image_files(root):
+    """List the image files under a directory, sorted by path, leaving out rendered derivatives"""
+    return sorted(
+        str(path) for path in Path(root).rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS and not is_derivative(path.name)
+    )
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_image(path, size=ANALYSIS_SIZE):
+    """Decode an image once into a ``size`` square RGB array scaled to 0-1.
+
+    Returns the array with the original width and height. JPEGs are decoded
+    straight at a reduced scale, which is much faster than a full decode.
+    """
+    with Image.open(path) as image:
+        width, height = image.size
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image = image.resize((size, size), Image.Resampling.BILINEAR)
+        return np.asarray(image, dtype=np.float32) / 255, width, height
+
+
+def _block_means(images, blocks):
+    """Average (N, S, S[, C]) images down to (N, blocks, blocks[, C])"""
+    count, size = images.shape[:2]
+    step = size // blocks
+    shape = (count, blocks, step, blocks, step) + images.shape[3:]
+    return images[:, : blocks * step, : blocks * step].reshape(shape).mean(axis=(2, 4))
+
+
+def _histograms(values, bins):
+    """Normalised histograms of the last axes of (N, ...) values in 0-1, for every image at once"""
+    count = values.shape[0]
+    indices = np.minimum((values * bins).astype(np.int64), bins - 1).reshape(count, -1)
+    indices += (np.arange(count) * bins)[:, None]
+    counts = np.bincount(indices.ravel(), minlength=count * bins).reshape(count, bins)
+    return counts / indices.shape[1]
+
+
+def dominant_colors(images, k=DOMINANT_COLORS, iterations=KMEANS_ITERATIONS):
+    """Cluster the downsampled pixels of every image into ``k`` colours with k-means.
+
+    All images are clustered together: each iteration assigns the pixels of
+    the whole batch in one array operation. Centres start at pixels spread
+    evenly over each image's brightness range, so results are deterministic.
+    Returns the (N, k, 3) centres and the (N, k) share of pixels of each.
+    """
+    pixels = _block_means(images, KMEANS_SIZE).reshape(len(images), -1, 3)
+    count, total = pixels.shape[:2]
+    by_brightness = np.argsort(pixels @ LUMA, axis=1)
+    starts = ((np.arange(k) + 0.5) / k * total).astype(np.int64)
+    centers = np.take_along_axis(pixels, by_brightness[:, starts, None], axis=1)
+
+    clusters = np.arange(k)
+    for _ in range(iterations):
+        distances = ((pixels[:, :, None, :] - centers[:, None, :, :]) ** 2).sum(axis=-1)
+        members = (distances.argmin(axis=-1)[..., None] == clusters).astype(np.float32)
+        sizes = members.sum(axis=1)
+        sums = np.einsum("npk,npc->nkc", members, pixels)
+        centers = np.where(sizes[..., None] > 0, sums / np.maximum(sizes, 1)[..., None], centers)
+    return centers, sizes / total
+
+
+def _dct_matrix(size):
+    """Orthonormal DCT-II matrix"""
+    frequencies = np.arange(size)[:, None]
+    positions = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * positions + 1) * frequencies / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+def perceptual_hashes(gray):
+    """64-bit DCT perceptual hashes of (N, S, S) grayscale images, as unsigned integers.
+
+    Each bit tells whether one of the lowest frequencies is above their
+    median, which survives resizing, recompression and small edits.
+    """
+    small = _block_means(gray, DCT_SIZE)
+    dct = _dct_matrix(DCT_SIZE)
+    low = (dct @ small @ dct.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(gray), -1)
+    # The DC term only says how bright the image is, so it is left out of the median
+    bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    return [int.from_bytes(row.tobytes(), "big") for row in np.packbits(bits, axis=1)]
+
+
+def compute_features(images):
+    """Compute the features of a (N, S, S, 3) batch of images scaled to 0-1"""
+    count = len(images)
+    gray = images @ LUMA
+
+    color_histograms = _histograms(np.moveaxis(images, -1, 1).reshape(count * 3, -1), HISTOGRAM_BINS)
+    color_histograms = color_histograms.reshape(count, 3, HISTOGRAM_BINS)
+    brightness_histograms = _histograms(gray, HISTOGRAM_BINS)
+    nonzero = np.where(brightness_histograms > 0, brightness_histograms, 1)
+    entropy = -(brightness_histograms * np.log2(nonzero)).sum(axis=1)
+
+    # Central differences and the Laplacian, over the interior of every image
+    gx = (gray[:, 1:-1, 2:] - gray[:, 1:-1, :-2]) / 2
+    gy = (gray[:, 2:, 1:-1] - gray[:, :-2, 1:-1]) / 2
+    gradient = np.hypot(gx, gy)
+    laplacian = (
+        gray[:, 1:-1, 2:] + gray[:, 1:-1, :-2] + gray[:, 2:, 1:-1] + gray[:, :-2, 1:-1]
+        - 4 * gray[:, 1:-1, 1:-1]
+    )
+
+    # Blocks far brighter or darker than the typical block are stains, holes or fading
+    blocks = _block_means(gray, DEFECT_GRID).reshape(count, -1)
+    typical = np.median(blocks, axis=1, keepdims=True)
+    spread = 1.4826 * np.median(np.abs(blocks - typical), axis=1, keepdims=True) + 0.02
+    deviations = (blocks - typical) / spread
+
+    centers, shares = dominant_colors(images)
+    hashes = perceptual_hashes(gray)
+
+    results = []
+    for i in range(count):
+        colors = [
+            {
+                "color": "#{:02x}{:02x}{:02x}".format(*np.rint(centers[i, c] * 255).astype(int)),
+                "share": round(float(shares[i, c]), 4),
+            }
+            for c in np.argsort(-shares[i])
+            if shares[i, c] > 0
+        ]
+        defects = [
+            {
+                "row": int(block // DEFECT_GRID),
+                "column": int(block % DEFECT_GRID),
+                "deviation": round(float(deviations[i, block]), 2),
+            }
+            for block in np.flatnonzero(np.abs(deviations[i]) > DEFECT_THRESHOLD)
+        ]
+        results.append({
+            "dominant_colors": colors,
+            "color_histogram": {
+                channel: np.round(color_histograms[i, c], 4).tolist()
+                for c, channel in enumerate("rgb")
+            },
+            "brightness": round(float(gray[i].mean()), 4),
+            # Half the largest possible channel deviation is 0.5, so this spans 0-1
+            "color_consistency": round(float(1 - 2 * images[i].reshape(-1, 3).std(axis=0).mean()), 4),
+            "texture": {
+                "edge_density": round(float((gradient[i] > EDGE_THRESHOLD).mean()), 4),
+                "mean_gradient": round(float(gradient[i].mean()), 4),
+                "contrast": round(float(gray[i].std()), 4),
+                "sharpness": round(float(laplacian[i].var()), 6),
+                "entropy": round(float(entropy[i]), 4),
+            },
+            "defects": defects,
+            "phash": f"{hashes[i]:016x}",
+        })
+    return results
+
+
+def _signed(value):
+    """Store an unsigned 64-bit hash in a signed BIGINT column"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def analyze_images(paths, batch_size=ANALYSIS_BATCH_SIZE):
+    """Get the ``ImageFeatures`` of many image files, keyed by path.
+
+    Files already analysed, under any name, are read back in one query; the
+    rest are decoded and analysed ``batch_size`` at a time. Unreadable files
+    map to None.
+    """
+    from .duplicates import hash_chunks
+
+    digests = {}
+    for path in paths:
+        try:
+            digests[path] = file_digest(path)
+        except OSError as e:
+            logger.warning(f"Cannot read image {path}: {e}")
+    stored = {
+        features.digest: features
+        for features in ImageFeatures.objects.filter(
+            digest__in=set(digests.values()), version=FEATURES_VERSION
+        )
+    }
+
+    # One path per new content is enough
+    pending = {digest: path for path, digest in digests.items() if digest not in stored}
+    pending = list(pending.items())
+    for start in range(0, len(pending), batch_size):
+        decoded = []
+        for digest, path in pending[start : start + batch_size]:
+            try:
+                decoded.append((digest, *load_image(path)))
+            except Exception as e:
+                logger.warning(f"Cannot decode image {path}: {e}")
+        if not decoded:
+            continue
+
+        batch = compute_features(np.stack([pixels for _, pixels, _, _ in decoded]))
+        rows = [
+            ImageFeatures(
+                digest=digest,
+                version=FEATURES_VERSION,
+                width=width,
+                height=height,
+                phash=_signed(int(features["phash"], 16)),
+                phash_chunks=hash_chunks(int(features["phash"], 16)),
+                features=features,
+            )
+            for (digest, _, width, height), features in zip(decoded, batch)
+        ]
+        ImageFeatures.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["digest"],
+            update_fields=[
+                "version", "width", "height", "phash", "phash_chunks", "features", "analysed_at",
+            ],
+        )
+        stored.update((row.digest, row) for row in rows)
+        logger.info(f"Analysed {len(rows)} images")
+
+    return {path: stored.get(digests.get(path)) for path in paths}
+
+
+def analyze_image(path):
+    """Get the ``ImageFeatures`` of one image file, or None if it cannot be read"""
+    return analyze_images([path])[path]
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.images import ANALYSIS_BATCH_SIZE, analyze_images, find_image_files
+from common.models import ImageFeatures
+
+
+class Command(BaseCommand):
+    help = (
+        'Computes colour, texture, defect and perceptual hash features of every image '
+        'under MEDIA_ROOT, skipping files already analysed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Directory to sweep instead of MEDIA_ROOT'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ANALYSIS_BATCH_SIZE,
+            help='Images decoded and analysed together'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        paths = find_image_files(options['path'] or settings.MEDIA_ROOT)
+        if not paths:
+            self.stdout.write(self.style.WARNING('No images found.'))
+            return
+
+        stored_before = ImageFeatures.objects.count()
+        unreadable = 0
+        # Digests are looked up a batch at a time so progress shows on large media folders
+        for start in range(0, len(paths), options['batch_size']):
+            batch = paths[start : start + options['batch_size']]
+            results = analyze_images(batch, batch_size=options['batch_size'])
+            unreadable += sum(1 for features in results.values() if features is None)
+            self.stdout.write(f'Processed {min(start + len(batch), len(paths))}/{len(paths)} images')
+
+        analysed = ImageFeatures.objects.count() - stored_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Analysed {analysed} new images, {len(paths) - analysed - unreadable} were '
+            f'already analysed or duplicates, {unreadable} could not be read.'
+        ))
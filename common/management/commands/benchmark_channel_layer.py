@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from notifications.layers import PostgresChannelLayer
+
+
+class Command(BaseCommand):
+    help = 'Measures group_send throughput and latency of the in-memory and PostgreSQL channel layers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=2000,
+            help='Number of group messages to send through each layer'
+        )
+        parser.add_argument(
+            '--layer',
+            action='append',
+            dest='layers',
+            choices=['memory', 'postgres'],
+            help='Only benchmark the given layer (can be repeated)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help='Seconds to wait for every message to arrive'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        capacity = count + 1
+
+        for name in options.get('layers') or ['memory', 'postgres']:
+            if name == 'memory':
+                # The in-memory layer only reaches sockets in its own process
+                sender = receiver = InMemoryChannelLayer(capacity=capacity)
+            else:
+                # Separate layer instances use separate connections, as two processes would
+                sender = PostgresChannelLayer(capacity=capacity)
+                receiver = PostgresChannelLayer(capacity=capacity)
+
+            result = asyncio.run(self.run_benchmark(sender, receiver, count, options['timeout']))
+            latencies = sorted(result['latencies'])
+            if not latencies:
+                self.stdout.write(self.style.WARNING(f'{name}: no messages were delivered'))
+                continue
+
+            self.stdout.write(
+                f"{name}: {len(latencies)}/{count} delivered, "
+                f"{len(latencies) / result['elapsed']:.0f} msg/s, "
+                f"p50 {self.percentile(latencies, 0.50) * 1000:.2f} ms, "
+                f"p99 {self.percentile(latencies, 0.99) * 1000:.2f} ms"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Channel layer benchmark complete.'))
+
+    @staticmethod
+    def percentile(values, fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    async def run_benchmark(self, sender, receiver, count, timeout):
+        channel = await receiver.new_channel()
+        await receiver.group_add('benchmark', channel)
+        latencies = []
+
+        async def consume():
+            while len(latencies) < count:
+                message = await receiver.receive(channel)
+                latencies.append(time.perf_counter() - message['sent_at'])
+
+        consumer = asyncio.create_task(consume())
+        started = time.perf_counter()
+        for sequence in range(count):
+            await sender.group_send(
+                'benchmark',
+                {'type': 'benchmark.message', 'sent_at': time.perf_counter(), 'sequence': sequence}
+            )
+
+        try:
+            await asyncio.wait_for(consumer, timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+
+        for layer in {sender, receiver}:
+            await layer.close()
+        return {'latencies': latencies, 'elapsed': elapsed}
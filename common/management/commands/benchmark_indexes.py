@@ -0,0 +1,288 @@
+import random
+import re
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from accounts.models import Buyer, FactoryPartner
+from designs.models import Design
+from inventory.models import Dimensions, TextileWaste, WasteHistory
+from inventory.utils import get_expiring_inventory
+from orders.models import DeliveryInfo, Order, PaymentInfo
+from transactions.models import Transaction
+
+BENCHMARK_MODELS = [TextileWaste, WasteHistory, Order, Transaction]
+
+TYPES = ["Fabric Scraps", "Leftover Material", "Deadstock Fabric", "Cutting Waste", "End of Roll", "Sample Yardage"]
+MATERIALS = ["Cotton", "Linen", "Polyester", "Wool", "Silk", "Denim", "Canvas", "Rayon", "Nylon", "Spandex"]
+
+# Most waste of a long-running factory has already left the inventory
+WASTE_STATUSES = ["AVAILABLE", "PENDING_REVIEW", "RESERVED", "USED", "RECYCLED", "EXPIRED"]
+WASTE_STATUS_WEIGHTS = [0.1, 0.05, 0.05, 0.4, 0.3, 0.1]
+ORDER_STATUSES = [status for status, _ in Order.ORDER_STATUS_CHOICES]
+TRANSACTION_TYPES = [kind for kind, _ in Transaction.TRANSACTION_TYPE_CHOICES]
+TRANSACTION_STATUSES = [status for status, _ in Transaction.TRANSACTION_STATUS_CHOICES]
+
+BATCH_SIZE = 5000
+
+
+class BenchmarkRollback(Exception):
+    """Raised to discard the generated dataset once the benchmark is done"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares query plans and timings of the hot inventory, order and transaction '
+        'queries with and without the composite indexes, on a generated dataset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--waste',
+            type=int,
+            default=50000,
+            help='Number of waste items to generate'
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=20000,
+            help='Number of orders (each with a transaction) to generate'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Times each query is run; the median time is reported'
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Print the full query plans instead of the scans they use'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The index benchmark needs a PostgreSQL database.')
+
+        factories = list(FactoryPartner.objects.all())
+        buyers = list(Buyer.objects.all())
+        designs = list(Design.objects.all())
+        if not factories:
+            self.stdout.write(self.style.WARNING(
+                'No factories found. Run generate_dummy_data first.'
+            ))
+            return
+        if options['orders'] and not (buyers and designs):
+            self.stdout.write(self.style.WARNING(
+                'No buyers or designs found, skipping orders. Run generate_dummy_data to include them.'
+            ))
+            options['orders'] = 0
+
+        # Everything, the dropped indexes included, is rolled back at the end
+        results = {}
+        try:
+            with transaction.atomic():
+                self.generate_waste(factories, options['waste'])
+                self.generate_orders(buyers, designs, options['orders'])
+                self.analyze()
+
+                queries = self.get_queries(factories, buyers)
+                self.stdout.write('Running queries with the indexes...')
+                for name, queryset in queries.items():
+                    results[name] = {'after': self.measure(queryset, options['repeat'])}
+
+                self.drop_indexes()
+                self.stdout.write('Running queries without the indexes...')
+                for name, queryset in queries.items():
+                    results[name]['before'] = self.measure(queryset, options['repeat'])
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+        for name, result in results.items():
+            before, after = result['before'], result['after']
+            speedup = before['time'] / after['time'] if after['time'] else 0
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f"  before {before['time'] * 1000:.2f} ms, after {after['time'] * 1000:.2f} ms "
+                f"({speedup:.1f}x)"
+            )
+            for label, measured in (('before', before), ('after', after)):
+                self.stdout.write(f'  {label}:')
+                plan = measured['plan'] if options['plans'] else self.summarize_plan(measured['plan'])
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('Index benchmark complete, generated data rolled back.'))
+
+    def generate_waste(self, factories, count):
+        self.stdout.write(f'Generating {count} waste items...')
+        token = uuid.uuid4().hex[:8].upper()
+        now = timezone.now()
+
+        for start in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - start)
+            dimensions = Dimensions.objects.bulk_create(
+                Dimensions(length=random.uniform(0.5, 10.0), width=random.uniform(0.5, 5.0), unit='m')
+                for _ in range(size)
+            )
+            waste_items = []
+            for offset, dimension in enumerate(dimensions):
+                status = random.choices(WASTE_STATUSES, weights=WASTE_STATUS_WEIGHTS)[0]
+                has_expiry = random.random() < 0.3
+                waste_items.append(TextileWaste(
+                    waste_id=f'BENCH-{token}-{start + offset}',
+                    type=random.choice(TYPES),
+                    material=random.choice(MATERIALS),
+                    quantity=round(random.uniform(0.5, 20.0), 2),
+                    color='Grey',
+                    dimensions=dimension,
+                    status=status,
+                    factory=random.choice(factories),
+                    expiry_date=now + timedelta(days=random.randint(-180, 180)) if has_expiry else None,
+                ))
+            waste_items = TextileWaste.objects.bulk_create(waste_items)
+            WasteHistory.objects.bulk_create(
+                WasteHistory(waste_item=waste, status=waste.status) for waste in waste_items
+            )
+
+        # auto_now_add stamps every row with now, so spread the dates over two years
+        self.spread_dates(TextileWaste, 'date_added')
+        self.spread_dates(WasteHistory, 'timestamp')
+
+    def generate_orders(self, buyers, designs, count):
+        if not count:
+            return
+        self.stdout.write(f'Generating {count} orders and transactions...')
+        token = uuid.uuid4().hex[:8].upper()
+        today = timezone.now().date()
+
+        for start in range(0, count, BATCH_SIZE):
+            numbers = range(start, min(start + BATCH_SIZE, count))
+            payments = PaymentInfo.objects.bulk_create(
+                PaymentInfo(payment_id=f'BENCH-PAY-{token}-{n}', method='INVOICE', amount=100)
+                for n in numbers
+            )
+            deliveries = DeliveryInfo.objects.bulk_create(
+                DeliveryInfo(
+                    tracking_number=f'BENCH-TRK-{token}-{n}',
+                    carrier='Benchmark',
+                    address='Benchmark',
+                    estimated_delivery_date=today,
+                )
+                for n in numbers
+            )
+            orders = Order.objects.bulk_create(
+                Order(
+                    order_id=f'BENCH-ORD-{token}-{n}',
+                    buyer=random.choice(buyers),
+                    design=random.choice(designs),
+                    status=random.choice(ORDER_STATUSES),
+                    total_price=random.randint(50, 300),
+                    payment_info=payment,
+                    delivery_info=delivery,
+                )
+                for n, payment, delivery in zip(numbers, payments, deliveries)
+            )
+            Transaction.objects.bulk_create(
+                Transaction(
+                    transaction_id=f'BENCH-TXN-{token}-{n}',
+                    order=order,
+                    amount=order.total_price,
+                    type=random.choice(TRANSACTION_TYPES),
+                    status=random.choice(TRANSACTION_STATUSES),
+                )
+                for n, order in zip(numbers, orders)
+            )
+
+        self.spread_dates(Order, 'date_ordered')
+        self.spread_dates(Transaction, 'date')
+
+    def spread_dates(self, model, field):
+        table = model._meta.db_table
+        column = model._meta.get_field(field).column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {column} = now() - random() * interval '730 days' "
+                f"WHERE {column} >= %s",
+                [timezone.now() - timedelta(hours=1)],
+            )
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            for model in BENCHMARK_MODELS:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in BENCHMARK_MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def get_queries(self, factories, buyers):
+        """Build the hot queries of the inventory, order and transaction pages"""
+        factory = random.choice(factories)
+        month_ago = timezone.now() - timedelta(days=30)
+        queries = {
+            'Factory totals by status': TextileWaste.objects.filter(factory=factory)
+            .values('status')
+            .annotate(total=Sum('quantity'), count=Count('id'))
+            .order_by(),
+            'Factory waste list page': TextileWaste.objects.filter(factory=factory)
+            .order_by('-date_added', '-id')[:20],
+            'Available waste page': TextileWaste.objects.filter(status='AVAILABLE')
+            .order_by('-date_added', '-id')[:20],
+            'Waste pending review this month': TextileWaste.objects.filter(
+                status='PENDING_REVIEW', date_added__gte=month_ago
+            ),
+            'Expiring inventory': get_expiring_inventory(30),
+            'Available waste by material and type': TextileWaste.objects.filter(
+                material=MATERIALS[0], type=TYPES[0], status='AVAILABLE'
+            ),
+            'Factory recent activity': WasteHistory.objects.filter(waste_item__factory=factory)
+            .order_by('-timestamp')[:10],
+            'Transaction totals this month': Transaction.objects.filter(
+                type='SALE', status='COMPLETED', date__gte=month_ago
+            )
+            .values('type')
+            .annotate(total=Sum('amount'))
+            .order_by(),
+        }
+        if buyers:
+            buyer = random.choice(buyers)
+            queries['Buyer pending orders'] = Order.objects.filter(
+                buyer=buyer, status='PENDING'
+            ).order_by('-date_ordered')
+            queries['Buyer order list page'] = Order.objects.filter(buyer=buyer).order_by(
+                '-date_ordered', '-id'
+            )[:20]
+        return queries
+
+    def measure(self, queryset, repeat):
+        plan = queryset.explain().splitlines()
+        list(queryset.all())  # Warm the cache so both runs read from memory
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - started)
+        return {'time': statistics.median(timings), 'plan': plan}
+
+    @staticmethod
+    def summarize_plan(plan):
+        """Keep the scan nodes of a plan, without their cost estimates"""
+        scans = [
+            re.sub(r'\s*\(cost=.*\)$', '', line).strip(' ->')
+            for line in plan
+            if 'Scan' in line and '(cost=' in line
+        ]
+        return scans or [plan[0].strip()]
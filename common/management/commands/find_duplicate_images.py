@@ -0,0 +1,89 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.duplicates import DUPLICATE_DISTANCE, HASH_BITS, group_duplicates
+from common.images import ANALYSIS_BATCH_SIZE, analyze_images, find_image_files
+from designs.models import Design
+
+
+class Command(BaseCommand):
+    help = (
+        'Finds groups of near-duplicate images under MEDIA_ROOT by perceptual hash '
+        'and flags the designs whose image duplicates an older design\'s'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Directory to sweep instead of MEDIA_ROOT'
+        )
+        parser.add_argument(
+            '--distance',
+            type=int,
+            default=DUPLICATE_DISTANCE,
+            help='Largest number of differing hash bits between duplicates'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ANALYSIS_BATCH_SIZE,
+            help='Images decoded and analysed together'
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['distance'] < HASH_BITS:
+            raise CommandError(f'--distance must be between 0 and {HASH_BITS - 1}.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        paths = find_image_files(options['path'] or settings.MEDIA_ROOT)
+        if not paths:
+            self.stdout.write(self.style.WARNING('No images found.'))
+            return
+
+        # Files analysed before are read back from their stored features
+        features = {}
+        for start in range(0, len(paths), options['batch_size']):
+            batch = paths[start : start + options['batch_size']]
+            features.update(analyze_images(batch, batch_size=options['batch_size']))
+        features = {
+            os.path.abspath(path): analysed for path, analysed in features.items() if analysed is not None
+        }
+
+        groups = group_duplicates(
+            {path: analysed.phash for path, analysed in features.items()}, options['distance']
+        )
+        for group in groups:
+            self.stdout.write(f'{len(group)} near-duplicate images:')
+            for path in group:
+                self.stdout.write(f'  {path}')
+
+        flagged = self.flag_designs(features, groups)
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(groups)} groups of near-duplicate images among {len(features)} images, '
+            f'{flagged} designs flagged.'
+        ))
+
+    def flag_designs(self, features, groups):
+        """Record the digest of every swept design image and the oldest design it duplicates"""
+        group_of = {path: index for index, group in enumerate(groups) for path in group}
+        designs = []
+        for design in Design.objects.exclude(image="").exclude(image__isnull=True).order_by('pk').only('pk', 'image'):
+            path = os.path.abspath(design.image.path)
+            if path in features:
+                designs.append((design, path))
+
+        oldest = {}
+        for design, path in designs:
+            oldest.setdefault(group_of.get(path, path), design)
+
+        for design, path in designs:
+            first = oldest[group_of.get(path, path)]
+            design.image_digest = features[path].digest
+            design.duplicate_of = first if first.pk != design.pk else None
+        Design.objects.bulk_update(
+            [design for design, _ in designs], ['image_digest', 'duplicate_of'], batch_size=500
+        )
+        return sum(1 for design, _ in designs if design.duplicate_of_id)
@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from common.derivatives import record_derivatives, render_derivatives
+from designs.models import Design
+
+
+class Command(BaseCommand):
+    help = 'Renders the resized and WebP copies of design images that have none for their current file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render every image again, even those with up-to-date derivatives'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+            help='Worker processes rendering images'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        designs = Design.objects.exclude(image='').exclude(image__isnull=True).values_list(
+            'pk', 'image', 'image_derivatives'
+        )
+        pending = [
+            (pk, image) for pk, image, derivatives in designs
+            if options['force'] or (derivatives or {}).get('source') != image
+        ]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('Every design image already has its derivatives.'))
+            return
+
+        self.stdout.write(f'Rendering derivatives of {len(pending)} images...')
+        media_root = str(settings.MEDIA_ROOT)
+        rendered = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(render_derivatives, media_root, image): (pk, image)
+                for pk, image in pending
+            }
+            for future in as_completed(futures):
+                pk, image = futures[future]
+                try:
+                    derivatives = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'{image}: {e}'))
+                    continue
+                record_derivatives(Design._meta.label, pk, 'image', 'image_derivatives', image, derivatives)
+                rendered += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} images, {failed} failed.'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import FactoryPartner
+from inventory.capacity import reconcile_capacity_ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-factory capacity ledger from waste inventory and reports drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factory',
+            type=int,
+            help='Only reconcile the factory partner with this ID'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            help='Report drift without correcting the ledger'
+        )
+
+    def handle(self, *args, **options):
+        factory = None
+        if options.get('factory'):
+            try:
+                factory = FactoryPartner.objects.get(id=options['factory'])
+            except FactoryPartner.DoesNotExist:
+                raise CommandError(f"Factory partner {options['factory']} does not exist.")
+
+        dry_run = options.get('dry_run')
+        drift = reconcile_capacity_ledger(factory=factory, apply=not dry_run)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Capacity ledger is in sync with waste inventory.'))
+            return
+
+        for entry in drift:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Factory {entry['factory_id']} [{entry['status']}]: "
+                    f"stored {entry['stored_total']:.2f}kg/{entry['stored_count']} items, "
+                    f"actual {entry['actual_total']:.2f}kg/{entry['actual_count']} items"
+                )
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'Found drift in {len(drift)} ledger entries (not corrected).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {len(drift)} ledger entries.'))
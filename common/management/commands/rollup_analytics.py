@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from common.rollups import ROLLUPS, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the daily analytics rollup tables from waste, order and transaction data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            dest='full',
+            help='Rebuild the rollup tables from scratch instead of only the days changed since the last run'
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            dest='only',
+            choices=list(ROLLUPS),
+            help='Only refresh the given rollup table (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = refresh_rollups(full=options.get('full'), names=options.get('only'))
+        except Exception as e:
+            raise CommandError(f'Error refreshing analytics rollups: {str(e)}')
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: rebuilt {result['days']} days ({result['rows']} rollup rows)"
+            )
+        self.stdout.write(self.style.SUCCESS('Analytics rollups are up to date.'))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import OUTBOX_BATCH_SIZE, deliver_pending_notifications
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued notifications from the notification outbox over the channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            dest='batch_size',
+            help='Number of outbox entries to deliver per batch'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before polling again when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit instead of running continuously'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {'sent': 0, 'retry': 0, 'failed': 0}
+
+        self.stdout.write('Notification worker started.')
+        try:
+            while True:
+                result = deliver_pending_notifications(batch_size=batch_size)
+                for key, value in result.items():
+                    totals[key] += value
+
+                delivered = sum(result.values())
+                if delivered:
+                    self.stdout.write(
+                        f"Delivered batch: {result['sent']} sent, "
+                        f"{result['retry']} to retry, {result['failed']} failed"
+                    )
+                if delivered < batch_size:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Notification worker stopped.')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Notification outbox drained: {totals['sent']} sent, "
+                f"{totals['retry']} to retry, {totals['failed']} failed."
+            )
+        )
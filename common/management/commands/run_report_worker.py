@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.report_jobs import run_pending_report_jobs
+
+
+class Command(BaseCommand):
+    help = 'Builds queued inventory report exports and notifies the users who requested them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait before polling again when no jobs are pending'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the pending jobs once and exit instead of running continuously'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+
+        self.stdout.write('Report worker started.')
+        try:
+            while True:
+                processed = run_pending_report_jobs()
+                if processed:
+                    self.stdout.write(f'Ran {processed} report jobs')
+                total += processed
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Report worker stopped.')
+
+        self.stdout.write(self.style.SUCCESS(f'Report jobs run: {total}.'))
@@ -0,0 +1,164 @@
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds of the histogram buckets; the last one is open
+HISTOGRAM_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Requests kept per view for the rolling histogram
+HISTOGRAM_WINDOW = 1000
+
+
+class QueryRecorder:
+    """Database execute wrapper counting the queries of a request and their time.
+
+    A query is a duplicate when the same SQL already ran with the same
+    parameters during the request, which is the signature of an N+1.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duplicates = 0
+        self.duration = 0.0
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            key = (sql, repr(params))
+            if key in self.seen:
+                self.duplicates += 1
+            else:
+                self.seen.add(key)
+
+
+class RequestMetrics:
+    """Rolling in-process record of the latest requests of every view"""
+
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, view, total_ms, db_ms, queries, duplicates):
+        with self.lock:
+            self.samples[view].append((total_ms, db_ms, queries, duplicates))
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def snapshot(self):
+        """Summarise every view's window, slowest total time first"""
+        with self.lock:
+            samples = {view: list(requests) for view, requests in self.samples.items()}
+
+        views = []
+        for view, requests in samples.items():
+            totals = sorted(request[0] for request in requests)
+            histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            for total_ms in totals:
+                histogram[_bucket_of(total_ms)] += 1
+            views.append({
+                "view": view,
+                "count": len(requests),
+                "p50_ms": _percentile(totals, 0.50),
+                "p95_ms": _percentile(totals, 0.95),
+                "p99_ms": _percentile(totals, 0.99),
+                "max_ms": round(totals[-1], 2),
+                "avg_db_ms": round(sum(request[1] for request in requests) / len(requests), 2),
+                "avg_queries": round(sum(request[2] for request in requests) / len(requests), 2),
+                "duplicate_queries": sum(request[3] for request in requests),
+                "histogram": histogram,
+                "time_spent_ms": round(sum(totals), 2),
+            })
+        views.sort(key=lambda entry: entry["time_spent_ms"], reverse=True)
+        return {"window": self.window, "buckets_ms": HISTOGRAM_BUCKETS_MS, "views": views}
+
+
+def _bucket_of(value):
+    for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+        if value <= bound:
+            return index
+    return len(HISTOGRAM_BUCKETS_MS)
+
+
+def _percentile(sorted_values, fraction):
+    return round(sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)], 2)
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures every request's total time, database time, query count and
+    duplicate queries.
+
+    The numbers are added to the rolling histogram in ``request_metrics``
+    and, for requests slower than ``REQUEST_METRICS_SLOW_MS``, written as a
+    JSON line to the slow request log for a ``REQUEST_METRICS_SAMPLE_RATE``
+    fraction of them. They are also sent back in a ``Server-Timing`` header
+    to admins, or to everyone when ``DEBUG`` is on. Streamed responses are
+    measured up to the point their body starts streaming.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        request_metrics.record(view, total_ms, db_ms, recorder.count, recorder.duplicates)
+
+        # request.user is lazy: only use it if the view loaded it, as loading it
+        # here would run session and user queries the recorder never sees
+        user = getattr(request, "_cached_user", None)
+        if user is not None and not user.is_authenticated:
+            user = None
+
+        # Timings and query counts are profiling data, so only admins get them in production
+        if settings.DEBUG or (user is not None and user.user_type == "ADMIN"):
+            response["Server-Timing"] = (
+                f'db;dur={db_ms:.1f};desc="{recorder.count} queries, {recorder.duplicates} duplicates", '
+                f"app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}"
+            )
+
+        slow_ms = getattr(settings, "REQUEST_METRICS_SLOW_MS", 500)
+        sample_rate = getattr(settings, "REQUEST_METRICS_SAMPLE_RATE", 1.0)
+        if total_ms >= slow_ms and random.random() < sample_rate:
+            logger.warning(json.dumps({
+                "view": view,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "user_id": user.id if user is not None else None,
+                "total_ms": round(total_ms, 1),
+                "db_ms": round(db_ms, 1),
+                "queries": recorder.count,
+                "duplicate_queries": recorder.duplicates,
+            }))
+        return response
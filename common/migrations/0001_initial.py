@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+                ('last_run', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='unique_order_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('type', models.CharField(max_length=20)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'type'), name='unique_transaction_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WasteDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('material', models.CharField(max_length=100)),
+                ('quality_grade', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('item_count', models.IntegerField(default=0)),
+                ('total_quantity', models.FloatField(default=0)),
+                ('score_total', models.FloatField(default=0)),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_waste_rollups', to='accounts.factorypartner')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'status'], name='common_wast_date_1790d8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'factory', 'material', 'quality_grade', 'status'), name='unique_waste_daily_rollup')],
+            },
+        ),
+    ]
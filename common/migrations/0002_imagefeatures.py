@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageFeatures',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('version', models.PositiveSmallIntegerField()),
+                ('width', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('phash', models.BigIntegerField()),
+                ('features', models.JSONField()),
+                ('analysed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+# Every 16-bit chunk of the hash, tagged with its position in the upper bits
+POPULATE_PHASH_CHUNKS = """
+UPDATE common_imagefeatures SET phash_chunks = ARRAY[
+    (phash & 65535)::integer,
+    (1 << 16) | ((phash >> 16) & 65535)::integer,
+    (2 << 16) | ((phash >> 32) & 65535)::integer,
+    (3 << 16) | ((phash >> 48) & 65535)::integer
+]
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_imagefeatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagefeatures',
+            name='phash_chunks',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='imagefeatures',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['phash_chunks'], name='imagefeatures_phash_chunks'),
+        ),
+        migrations.RunSQL(POPULATE_PHASH_CHUNKS, migrations.RunSQL.noop),
+    ]
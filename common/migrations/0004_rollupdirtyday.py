@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_imagefeatures_phash_chunks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('date', models.DateField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'date'), name='unique_rollup_dirty_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,132 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+
+class WasteDailyRollup(models.Model):
+    """Daily totals of textile waste by factory, material, quality and status.
+
+    Built from ``TextileWaste`` by the ``rollup_analytics`` command so the
+    analytics dashboards read pre-aggregated rows instead of the raw inventory.
+    """
+
+    date = models.DateField()
+    factory = models.ForeignKey(
+        "accounts.FactoryPartner",
+        on_delete=models.CASCADE,
+        related_name="daily_waste_rollups",
+    )
+    material = models.CharField(max_length=100)
+    quality_grade = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    item_count = models.IntegerField(default=0)
+    total_quantity = models.FloatField(default=0)
+    score_total = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.factory_id} {self.material} [{self.status}]"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "factory", "material", "quality_grade", "status"],
+                name="unique_waste_daily_rollup",
+            )
+        ]
+        indexes = [models.Index(fields=["date", "status"])]
+
+
+class OrderDailyRollup(models.Model):
+    """Daily order counts and revenue by status"""
+
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    order_count = models.IntegerField(default=0)
+    total_quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} [{self.status}]: {self.order_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "status"], name="unique_order_daily_rollup"
+            )
+        ]
+
+
+class TransactionDailyRollup(models.Model):
+    """Daily transaction counts and amounts by status and type"""
+
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    type = models.CharField(max_length=20)
+    transaction_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.type} [{self.status}]: {self.transaction_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "status", "type"], name="unique_transaction_daily_rollup"
+            )
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Point in time up to which a rollup table has been refreshed"""
+
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True)
+    last_run = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+
+class RollupDirtyDay(models.Model):
+    """Day of a rollup table to rebuild because source rows of it were deleted.
+
+    Deleted rows leave no ``last_updated`` behind for the incremental refresh
+    to find, so ``post_delete`` handlers record their day here instead and
+    ``refresh_rollup`` drains it.
+    """
+
+    name = models.CharField(max_length=50)
+    date = models.DateField()
+
+    def __str__(self):
+        return f"{self.name}: {self.date}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "date"], name="unique_rollup_dirty_day")
+        ]
+
+
+class ImageFeatures(models.Model):
+    """Features of an image file computed by ``common.images``.
+
+    Keyed by the SHA-256 of the file's content, so every copy of a file
+    shares one row and is only ever analysed once per ``version``.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    version = models.PositiveSmallIntegerField()
+    width = models.IntegerField()
+    height = models.IntegerField()
+    # 64-bit perceptual hash stored as a signed integer
+    phash = models.BigIntegerField()
+    # Position-tagged chunks of the hash, probed by common.duplicates
+    phash_chunks = ArrayField(models.IntegerField(), default=list)
+    features = models.JSONField()
+    analysed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.width}x{self.height})"
+
+    class Meta:
+        indexes = [GinIndex(fields=["phash_chunks"], name="imagefeatures_phash_chunks")]
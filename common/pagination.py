@@ -0,0 +1,183 @@
+import base64
+import json
+import logging
+from functools import cached_property
+
+from django.db import connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(direction, values):
+    """Encode a page boundary as an opaque URL-safe token"""
+    # Full isoformat keeps microseconds, which the key comparison needs
+    values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+    payload = json.dumps({"d": direction, "k": values}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Decode a token from ``encode_cursor`` into its direction and key values.
+
+    Raises ``ValueError`` for tokens that were not made by ``encode_cursor``.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        direction, values = payload["d"], payload["k"]
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError(f"Invalid page cursor: {e}") from e
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        raise ValueError("Invalid page cursor")
+    return direction, values
+
+
+def estimate_count(queryset):
+    """Estimate the number of rows of a queryset from the query planner.
+
+    Costs one EXPLAIN instead of a COUNT over every matching row. Returns
+    None on databases other than PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset.
+
+    Iterates like a list of the page's objects. ``next_query`` and
+    ``previous_query`` are the request's query string with the cursor of the
+    neighbouring page, ready to be used as ``href="?{{ page.next_query }}"``.
+    """
+
+    def __init__(self, object_list, queryset, has_next, has_previous, next_cursor,
+                 previous_cursor, query_params, cursor_param):
+        self.object_list = object_list
+        self.queryset = queryset
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query_params = query_params
+        self.cursor_param = cursor_param
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query_with_cursor(self, cursor):
+        params = self.query_params.copy()
+        params[self.cursor_param] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query_with_cursor(self.next_cursor) if self.has_next else ""
+
+    @property
+    def previous_query(self):
+        return self._query_with_cursor(self.previous_cursor) if self.has_previous else ""
+
+    @cached_property
+    def estimated_count(self):
+        """Planner estimate of the total number of rows, computed on first use"""
+        return estimate_count(self.queryset)
+
+
+def _keyset_filter(ordering, values, forward):
+    """Build the filter for rows after (or before) a key in the given ordering.
+
+    ``(a, b) > (x, y)`` expands to ``a > x OR (a = x AND b > y)``, with each
+    comparison flipped for descending fields.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        descending = field.startswith("-")
+        lookup = "lt" if descending == forward else "gt"
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return condition
+
+
+def _key_field(queryset, name):
+    """Get the field of an ordering key, which may be a model field or an annotation"""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    return queryset.model._meta.get_field(name)
+
+
+def paginate_keyset(request, queryset, per_page, ordering, cursor_param="cursor"):
+    """Get the page of a queryset addressed by the request's cursor.
+
+    ``ordering`` must end with a unique field, typically ``("-date_added",
+    "-id")``; non-null annotations can be used as keys too. Pages are read
+    with ``WHERE key < cursor LIMIT per_page + 1`` rather than OFFSET, so a
+    deep page costs the same as the first one, and no COUNT query is run.
+    Invalid cursors fall back to the first page.
+    """
+    ordering = list(ordering)
+    queryset = queryset.order_by(*ordering)
+    page_queryset = queryset
+    direction = "next"
+
+    token = request.GET.get(cursor_param)
+    if token:
+        try:
+            direction, raw_values = decode_cursor(token)
+            if len(raw_values) != len(ordering):
+                raise ValueError("Cursor does not match the ordering")
+            values = [
+                _key_field(queryset, field.lstrip("-")).to_python(value)
+                for field, value in zip(ordering, raw_values)
+            ]
+        except Exception as e:
+            logger.warning(f"Ignoring page cursor: {e}")
+            direction, token = "next", None
+        else:
+            page_queryset = queryset.filter(_keyset_filter(ordering, values, direction == "next"))
+
+    if direction == "prev":
+        # Walk backwards from the cursor, then restore the display order
+        reversed_ordering = [f[1:] if f.startswith("-") else f"-{f}" for f in ordering]
+        rows = list(page_queryset.order_by(*reversed_ordering)[: per_page + 1])
+        has_previous = len(rows) > per_page
+        object_list = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        rows = list(page_queryset[: per_page + 1])
+        has_next = len(rows) > per_page
+        object_list = rows[:per_page]
+        has_previous = bool(token)
+
+    def key_of(obj):
+        return [getattr(obj, field.lstrip("-")) for field in ordering]
+
+    return KeysetPage(
+        object_list,
+        queryset,
+        has_next=has_next and bool(object_list),
+        has_previous=has_previous and bool(object_list),
+        next_cursor=encode_cursor("next", key_of(object_list[-1])) if object_list else None,
+        previous_cursor=encode_cursor("prev", key_of(object_list[0])) if object_list else None,
+        query_params=request.GET,
+        cursor_param=cursor_param,
+    )
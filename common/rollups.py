@@ -0,0 +1,193 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventory.models import TextileWaste
+from orders.models import Order
+from transactions.models import Transaction
+
+from .models import (
+    OrderDailyRollup,
+    RollupDirtyDay,
+    RollupWatermark,
+    TransactionDailyRollup,
+    WasteDailyRollup,
+)
+
+logger = logging.getLogger(__name__)
+
+# Days rebuilt per query when refreshing a rollup table
+ROLLUP_CHUNK_DAYS = 31
+
+# Rows saved just before a refresh may commit after it has scanned the source
+# table, so every refresh also looks back this far past the stored watermark.
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+# Source table, grouping dimensions and measures for every rollup table
+ROLLUPS = {
+    "waste": {
+        "model": WasteDailyRollup,
+        "source": TextileWaste,
+        "date_field": "date_added",
+        "dimensions": ["factory_id", "material", "quality_grade", "status"],
+        "measures": {
+            "item_count": Count("id"),
+            "total_quantity": Sum("quantity"),
+            "score_total": Sum("sustainability_score"),
+        },
+    },
+    "orders": {
+        "model": OrderDailyRollup,
+        "source": Order,
+        "date_field": "date_ordered",
+        "dimensions": ["status"],
+        "measures": {
+            "order_count": Count("id"),
+            "total_quantity": Sum("quantity"),
+            "revenue": Sum("total_price"),
+        },
+    },
+    "transactions": {
+        "model": TransactionDailyRollup,
+        "source": Transaction,
+        "date_field": "date",
+        "dimensions": ["status", "type"],
+        "measures": {
+            "transaction_count": Count("id"),
+            "total_amount": Sum("amount"),
+        },
+    },
+}
+
+
+def _as_date(value):
+    """Convert a date or datetime to a date in the current time zone"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def get_touched_days(name, since=None):
+    """Get the days whose source rows changed since the given time"""
+    spec = ROLLUPS[name]
+    queryset = spec["source"].objects.all()
+    if since:
+        queryset = queryset.filter(last_updated__gte=since)
+    return set(
+        queryset.annotate(day=TruncDate(spec["date_field"]))
+        .order_by()
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def mark_rollup_day(name, value):
+    """Have the next refresh of a rollup table rebuild the day of a date or datetime"""
+    if value is None:
+        return
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(name=name, date=_as_date(value))], ignore_conflicts=True
+    )
+
+
+def rebuild_rollup_days(name, days):
+    """Recompute the rollup rows of the given days from the source table"""
+    spec = ROLLUPS[name]
+    model = spec["model"]
+    days = sorted(days)
+    created = 0
+
+    for start in range(0, len(days), ROLLUP_CHUNK_DAYS):
+        chunk = days[start:start + ROLLUP_CHUNK_DAYS]
+        rows = (
+            spec["source"].objects.filter(**{f"{spec['date_field']}__date__in": chunk})
+            .annotate(day=TruncDate(spec["date_field"]))
+            .order_by()
+            .values("day", *spec["dimensions"])
+            .annotate(**spec["measures"])
+        )
+        with transaction.atomic():
+            model.objects.filter(date__in=chunk).delete()
+            created += len(
+                model.objects.bulk_create(
+                    [model(date=row.pop("day"), **row) for row in rows],
+                    batch_size=1000,
+                )
+            )
+    return created
+
+
+def refresh_rollup(name, full=False):
+    """Bring a rollup table up to date and advance its watermark.
+
+    Only days with source rows changed since the last watermark, or deleted
+    since the last refresh, are rebuilt, unless ``full`` is set, in which
+    case the table is rebuilt from scratch. Everything happens in one
+    transaction, so readers never see a partly rebuilt table.
+    Returns a dict with the number of ``days`` and ``rows`` rebuilt.
+    """
+    started = timezone.now()
+
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=name)
+
+        since = None
+        if not full and watermark.processed_until:
+            since = watermark.processed_until - WATERMARK_OVERLAP
+
+        # Days marked while this refresh runs stay marked for the next one
+        dirty = list(RollupDirtyDay.objects.filter(name=name).values_list("id", "date"))
+        days = get_touched_days(name, since) | {day for _, day in dirty}
+        if full:
+            ROLLUPS[name]["model"].objects.all().delete()
+        rows = rebuild_rollup_days(name, days)
+
+        RollupDirtyDay.objects.filter(id__in=[pk for pk, _ in dirty]).delete()
+        watermark.processed_until = started
+        watermark.save()
+
+    logger.info(f"Refreshed {name} rollup: {len(days)} days, {rows} rows")
+    return {"days": len(days), "rows": rows}
+
+
+def refresh_rollups(full=False, names=None):
+    """Refresh every rollup table, or only the named ones"""
+    return {name: refresh_rollup(name, full=full) for name in (names or ROLLUPS)}
+
+
+def rollup_queryset(name, start_date=None, end_date=None, **filters):
+    """Get the rollup rows of a table between two days (both inclusive)"""
+    queryset = ROLLUPS[name]["model"].objects.filter(**filters)
+    if start_date:
+        queryset = queryset.filter(date__gte=_as_date(start_date))
+    if end_date:
+        queryset = queryset.filter(date__lte=_as_date(end_date))
+    return queryset
+
+
+def query_rollup(name, group_by=None, start_date=None, end_date=None, order_by=None, **filters):
+    """Sum the measures of a rollup table, optionally grouped by some fields.
+
+    Without ``group_by`` a single dict of totals is returned; otherwise a list
+    with one dict per group holding the group fields and their totals.
+    """
+    queryset = rollup_queryset(name, start_date, end_date, **filters)
+    totals = {field: Sum(field) for field in ROLLUPS[name]["measures"]}
+
+    if not group_by:
+        return {
+            field: value or 0 for field, value in queryset.aggregate(**totals).items()
+        }
+    return list(
+        queryset.order_by()
+        .values(*group_by)
+        .annotate(**totals)
+        .order_by(*(order_by or group_by))
+    )
+
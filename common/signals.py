@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from inventory.models import TextileWaste
+from orders.models import Order
+from transactions.models import Transaction
+
+from .rollups import mark_rollup_day
+
+# Deleted rows leave nothing for the incremental refresh to find, so their days are marked
+
+
+@receiver(post_delete, sender=TextileWaste)
+def mark_deleted_waste_day(sender, instance, **kwargs):
+    mark_rollup_day("waste", instance.date_added)
+
+
+@receiver(post_delete, sender=Order)
+def mark_deleted_order_day(sender, instance, **kwargs):
+    mark_rollup_day("orders", instance.date_ordered)
+
+
+@receiver(post_delete, sender=Transaction)
+def mark_deleted_transaction_day(sender, instance, **kwargs):
+    mark_rollup_day("transactions", instance.date)
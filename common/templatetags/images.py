@@ -0,0 +1,47 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from common.derivatives import pick_derivative
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, derivatives, width, css_class="", alt="", style=""):
+    """Render an image at a display ``width`` in pixels from its smallest fitting derivatives.
+
+    Browsers choose between the WebP copies and the JPEG or PNG ones through
+    ``srcset``, twice as wide on high density screens. Images without
+    derivatives for their current file fall back to the original.
+    """
+    if not image:
+        return ""
+    items = derivatives.get("items", []) if derivatives else []
+    if not items or derivatives.get("source") != image.name:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy">', image.url, css_class, alt, style
+        )
+
+    fallback_format = "png" if any(item["format"] == "png" for item in items) else "jpg"
+    fallback = pick_derivative(derivatives, width, fallback_format)
+
+    def srcset(image_format):
+        return ", ".join(
+            f"{default_storage.url(item['name'])} {item['width']}w"
+            for item in items
+            if item["format"] == image_format
+        )
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}px">'
+        '<img src="{}" srcset="{}" sizes="{}px" class="{}" alt="{}" style="{}" loading="lazy"></picture>',
+        srcset("webp"),
+        width,
+        default_storage.url(fallback["name"]) if fallback else image.url,
+        srcset(fallback_format) if fallback else "",
+        width,
+        css_class,
+        alt,
+        style,
+    )
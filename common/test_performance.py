@@ -0,0 +1,189 @@
+"""Query-count and latency budgets of the hot views.
+
+Every scale seeds its own dataset with ``generate_dummy_data`` and checks
+each view against the same query ceiling, so a query per row fails the
+larger scales. Wall-clock budgets are too noisy for shared CI runners, so
+the 95th percentile of the response times is only checked against each
+view's budget when PERF_BUDGET_FACTOR is set, e.g. PERF_BUDGET_FACTOR=1,
+or 2 on a slower machine.
+"""
+import math
+import os
+import random
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import Buyer, Designer, FactoryPartner, User
+from common.management.commands.generate_dummy_data import Command as GenerateDummyData
+from designs.models import Design
+from .rollups import refresh_rollup
+
+# Timed requests per view, after one untimed warm-up request
+PERF_SAMPLES = 20
+
+# Latency budgets are opt-in; without the setting only query ceilings are checked
+PERF_BUDGET_FACTOR = os.environ.get("PERF_BUDGET_FACTOR")
+PERF_BUDGET_FACTOR = float(PERF_BUDGET_FACTOR) if PERF_BUDGET_FACTOR else None
+
+
+class HotViewPerformanceMixin:
+    # generate_dummy_data options and number of orders of the scale
+    SCALE = {}
+    ORDERS = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(17)
+        options = [f"--{name}={value}" for name, value in cls.SCALE.items()]
+        # Seeding must not overwrite the Locust credentials file
+        with mock.patch.object(GenerateDummyData, "_save_test_user_credentials"):
+            call_command("generate_dummy_data", *options, stdout=StringIO())
+        call_command("generate_analytics_data", f"--orders={cls.ORDERS}", stdout=StringIO())
+        refresh_rollup("waste")
+
+        cls.admin = User.objects.create_superuser(
+            "perfadmin", "perfadmin@example.com", "password123", user_type="ADMIN"
+        )
+        # The busiest factory, buyer and design give the most rows per page
+        cls.factory_user = (
+            FactoryPartner.objects.annotate(items=Count("waste_items")).order_by("-items").first().user
+        )
+        cls.buyer_user = Buyer.objects.annotate(orders=Count("order")).order_by("-orders").first().user
+        cls.designer_user = (
+            Designer.objects.filter(is_approved=True)
+            .annotate(design_total=Count("designs"))
+            .order_by("-design_total")
+            .first()
+            .user
+        )
+        cls.design = (
+            Design.objects.filter(status="PUBLISHED")
+            .annotate(materials=Count("required_materials"))
+            .order_by("-materials")
+            .first()
+        )
+
+    def assertWithinBudget(self, user, url, max_queries, p95_ms, method="get", data=None,
+                           status=200):
+        """Request a view and check its query count, and its p95 response time if enabled"""
+        if user:
+            self.client.force_login(user)
+        send = getattr(self.client, method)
+        send(url, data)
+
+        timings = []
+        for _ in range(PERF_SAMPLES if PERF_BUDGET_FACTOR else 1):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = send(url, data)
+                timings.append(time.perf_counter() - started)
+            self.assertEqual(response.status_code, status)
+            self.assertLessEqual(
+                len(queries),
+                max_queries,
+                f"{url} ran {len(queries)} queries, the ceiling is {max_queries}:\n"
+                + "\n".join(query["sql"] for query in queries.captured_queries),
+            )
+
+        if not PERF_BUDGET_FACTOR:
+            return
+        timings.sort()
+        p95 = timings[math.ceil(0.95 * len(timings)) - 1] * 1000
+        budget = p95_ms * PERF_BUDGET_FACTOR
+        self.assertLessEqual(p95, budget, f"{url} p95 is {p95:.1f} ms, the budget is {budget:.0f} ms")
+
+    def test_inventory_dashboard(self):
+        self.assertWithinBudget(self.factory_user, reverse("inventory:dashboard"), 6, 300)
+
+    def test_inventory_analytics(self):
+        url = reverse("inventory:analytics")
+        self.assertWithinBudget(self.factory_user, url, 24, 500)
+        self.assertWithinBudget(self.admin, url, 21, 500)
+
+    def test_admin_analytics(self):
+        self.assertWithinBudget(self.admin, reverse("accounts:admin_analytics"), 7, 500)
+
+    def test_admin_sustainability(self):
+        self.assertWithinBudget(self.admin, reverse("accounts:admin_sustainability"), 6, 500)
+
+    def test_admin_designers(self):
+        self.assertWithinBudget(self.admin, reverse("accounts:admin_designers"), 3, 300)
+
+    def test_design_list(self):
+        url = reverse("designs:design_list")
+        # The page, its two prefetches and the two facet queries
+        self.assertWithinBudget(None, url, 5, 300)
+        self.assertWithinBudget(None, url, 5, 300, data={"search": "dress", "price": "50-100"})
+        self.assertWithinBudget(self.buyer_user, url, 8, 300)
+
+    def test_design_detail(self):
+        url = reverse("designs:design_detail", args=[self.design.design_id])
+        self.assertWithinBudget(self.buyer_user, url, 10, 300)
+
+    def test_designer_waste_discovery(self):
+        self.assertWithinBudget(
+            self.designer_user, reverse("inventory:designer_waste_list"), 6, 300
+        )
+        self.assertWithinBudget(
+            self.designer_user,
+            reverse("inventory:designer_waste_search"),
+            5,
+            200,
+            data={"material": "Cotton", "min_quantity": 1},
+        )
+
+    def test_order_list(self):
+        url = reverse("orders:order_list")
+        self.assertWithinBudget(self.buyer_user, url, 4, 300)
+        self.assertWithinBudget(self.admin, url, 5, 300)
+
+    def test_create_order(self):
+        url = reverse("orders:create_order", args=[self.design.design_id])
+        self.assertWithinBudget(self.buyer_user, url, 11, 300)
+        self.assertWithinBudget(
+            self.buyer_user,
+            url,
+            18,
+            300,
+            method="post",
+            data={"design": self.design.id, "quantity": 1, "customizations": '{"note": "perf"}'},
+            status=302,
+        )
+
+    def test_inventory_api(self):
+        for name, factory_queries, admin_queries in [
+            ("inventory:api_metrics", 14, 12),
+            ("inventory:api_storage_efficiency", 11, 7),
+            ("inventory:api_expiring_soon", 4, 4),
+            ("inventory:api_activities", 5, 5),
+        ]:
+            with self.subTest(name):
+                self.assertWithinBudget(self.factory_user, reverse(name), factory_queries, 200)
+                self.assertWithinBudget(self.admin, reverse(name), admin_queries, 200)
+
+        # Impact and trend metrics are only served to users with the analytics permission
+        self.assertWithinBudget(self.admin, reverse("inventory:api_impact_metrics"), 5, 200)
+        self.assertWithinBudget(self.admin, reverse("inventory:api_trend_metrics"), 6, 200)
+
+
+class SmallScalePerformanceTest(HotViewPerformanceMixin, TestCase):
+    SCALE = {"factories": 2, "designers": 2, "buyers": 2, "waste-items": 20, "designs": 5}
+    ORDERS = 10
+
+
+class MediumScalePerformanceTest(HotViewPerformanceMixin, TestCase):
+    SCALE = {"factories": 3, "designers": 6, "buyers": 4, "waste-items": 80, "designs": 20}
+    ORDERS = 50
+
+
+class LargeScalePerformanceTest(HotViewPerformanceMixin, TestCase):
+    SCALE = {"factories": 4, "designers": 12, "buyers": 6, "waste-items": 200, "designs": 40}
+    ORDERS = 120
@@ -0,0 +1,602 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
+from io import BytesIO, StringIO
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from PIL import Image
+
+from accounts.models import User
+from designs.models import Design
+from designs.utils.image_recognition import DesignImageRecognition
+from inventory.models import TextileWaste
+from inventory.tests import InventoryTestMixin
+from inventory.utils.image_recognition import WasteImageRecognition
+from .exports import iter_export_rows
+from . import duplicates, images
+from .middleware import QueryRecorder, RequestMetricsMiddleware, request_metrics
+from .pagination import decode_cursor, paginate_keyset
+from .models import ImageFeatures, RollupDirtyDay, RollupWatermark, WasteDailyRollup
+from .rollups import query_rollup, refresh_rollup
+from .timeseries import add_periods, get_time_series, truncate_date
+
+
+class AnalyticsRollupTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.create_waste(self.factory, "WST-1", 100)
+        self.create_waste(self.factory, "WST-2", 50, material="Linen")
+        self.create_waste(self.factory, "WST-3", 30, status="USED")
+        self.today = timezone.localdate()
+
+    def test_refresh_builds_daily_rows(self):
+        result = refresh_rollup("waste")
+
+        self.assertEqual(result, {"days": 1, "rows": 3})
+        self.assertEqual(query_rollup("waste")["total_quantity"], 180)
+        self.assertEqual(
+            query_rollup("waste", ["status"]),
+            [
+                {"status": "AVAILABLE", "item_count": 2, "total_quantity": 150, "score_total": 0},
+                {"status": "USED", "item_count": 1, "total_quantity": 30, "score_total": 0},
+            ],
+        )
+        self.assertEqual(
+            query_rollup("waste", start_date=self.today + timedelta(days=1))["item_count"], 0
+        )
+
+    def test_incremental_refresh_only_rebuilds_touched_days(self):
+        refresh_rollup("waste")
+        old = self.create_waste(self.factory, "WST-4", 20)
+        TextileWaste.objects.filter(pk=old.pk).update(
+            date_added=timezone.now() - timedelta(days=40)
+        )
+
+        # Days whose rows were not touched since the watermark are left alone
+        RollupWatermark.objects.filter(name="waste").update(processed_until=timezone.now())
+        TextileWaste.objects.exclude(pk=old.pk).update(
+            last_updated=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(refresh_rollup("waste"), {"days": 1, "rows": 1})
+        self.assertEqual(query_rollup("waste")["total_quantity"], 200)
+
+        waste = TextileWaste.objects.get(waste_id="WST-1")
+        waste.status = "USED"
+        waste.save()
+        refresh_rollup("waste")
+        self.assertEqual(
+            query_rollup("waste", status="USED", start_date=self.today)["total_quantity"], 130
+        )
+
+    def test_refresh_rebuilds_days_of_deleted_rows(self):
+        refresh_rollup("waste")
+        TextileWaste.objects.filter(waste_id="WST-2").delete()
+        self.assertEqual(RollupDirtyDay.objects.filter(name="waste").count(), 1)
+
+        # The remaining rows were not touched since the watermark
+        TextileWaste.objects.update(last_updated=timezone.now() - timedelta(days=1))
+        self.assertEqual(refresh_rollup("waste"), {"days": 1, "rows": 2})
+        self.assertEqual(query_rollup("waste")["total_quantity"], 130)
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+        # A day whose rows are all gone loses its rollup rows
+        TextileWaste.objects.all().delete()
+        self.assertEqual(refresh_rollup("waste"), {"days": 1, "rows": 0})
+        self.assertFalse(WasteDailyRollup.objects.exists())
+
+    def test_failed_full_rebuild_keeps_the_table(self):
+        refresh_rollup("waste")
+        processed_until = RollupWatermark.objects.get(name="waste").processed_until
+
+        with mock.patch("common.rollups.rebuild_rollup_days", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                refresh_rollup("waste", full=True)
+        self.assertEqual(query_rollup("waste")["total_quantity"], 180)
+        self.assertEqual(RollupWatermark.objects.get(name="waste").processed_until, processed_until)
+
+    def test_command_full_rebuild(self):
+        WasteDailyRollup.objects.create(
+            date=self.today - timedelta(days=3),
+            factory=self.factory,
+            material="Stale",
+            quality_grade="GOOD",
+            status="AVAILABLE",
+            item_count=1,
+            total_quantity=999,
+        )
+        out = StringIO()
+        call_command("rollup_analytics", "--full", stdout=out)
+
+        self.assertIn("waste: rebuilt 1 days", out.getvalue())
+        self.assertFalse(WasteDailyRollup.objects.filter(material="Stale").exists())
+        self.assertEqual(query_rollup("orders")["order_count"], 0)
+
+
+class TimeSeriesTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+
+    def add_waste(self, waste_id, quantity, date_added):
+        waste = self.create_waste(self.factory, waste_id, quantity)
+        TextileWaste.objects.filter(pk=waste.pk).update(date_added=date_added)
+
+    def test_calendar_helpers(self):
+        self.assertEqual(truncate_date(date(2024, 5, 31)), date(2024, 5, 1))
+        self.assertEqual(truncate_date(date(2024, 5, 31), "week"), date(2024, 5, 27))
+        self.assertEqual(truncate_date(date(2024, 5, 31), "quarter"), date(2024, 4, 1))
+        self.assertEqual(add_periods(date(2024, 1, 1), "month", -2), date(2023, 11, 1))
+        self.assertEqual(add_periods(date(2024, 11, 1), "quarter"), date(2025, 2, 1))
+
+    def test_monthly_series_fills_empty_months(self):
+        utc = ZoneInfo("UTC")
+        self.add_waste("WST-1", 10, datetime(2024, 1, 31, 23, 0, tzinfo=utc))
+        self.add_waste("WST-2", 20, datetime(2024, 3, 1, 0, 30, tzinfo=utc))
+        self.add_waste("WST-3", 5, datetime(2024, 3, 15, tzinfo=utc))
+
+        with self.assertNumQueries(1):
+            series = get_time_series(
+                TextileWaste.objects.all(),
+                "date_added",
+                {"count": Count("id"), "quantity": Sum("quantity")},
+                end=date(2024, 4, 10),
+                periods=4,
+                tz=utc,
+            )
+
+        self.assertEqual(
+            series,
+            [
+                {"period": date(2024, 1, 1), "count": 1, "quantity": 10},
+                {"period": date(2024, 2, 1), "count": 0, "quantity": 0},
+                {"period": date(2024, 3, 1), "count": 2, "quantity": 25},
+                {"period": date(2024, 4, 1), "count": 0, "quantity": 0},
+            ],
+        )
+
+    def test_buckets_follow_time_zone(self):
+        self.add_waste("WST-1", 10, datetime(2024, 1, 31, 23, 0, tzinfo=ZoneInfo("UTC")))
+
+        series = get_time_series(
+            TextileWaste.objects.all(),
+            "date_added",
+            {"count": Count("id")},
+            start=date(2024, 1, 1),
+            end=date(2024, 2, 1),
+            tz=ZoneInfo("Asia/Dhaka"),
+        )
+        self.assertEqual([month["count"] for month in series], [0, 1])
+
+
+class BulkExportTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.other_factory = self.create_factory("otherfactory")
+        for i in range(5):
+            self.create_waste(self.factory, f"WST-{i}", 10 + i, status="USED" if i == 4 else "AVAILABLE")
+        self.create_waste(self.other_factory, "WST-OTHER", 99)
+        self.admin = self.create_factory("siteadmin").user
+        self.admin.user_type = "ADMIN"
+        self.admin.save()
+
+    def test_rows_are_read_in_keyset_pages(self):
+        with mock.patch("common.exports.EXPORT_PAGE_SIZE", 2):
+            # Three full pages of two, then an empty one
+            with self.assertNumQueries(4):
+                rows = list(iter_export_rows("waste"))
+
+        self.assertEqual(
+            [row["waste_id"] for row in rows],
+            ["WST-0", "WST-1", "WST-2", "WST-3", "WST-4", "WST-OTHER"],
+        )
+        self.assertEqual(rows[0]["factory"], "factoryuser Factory")
+
+    def test_filters(self):
+        today = timezone.localdate()
+        rows = list(
+            iter_export_rows(
+                "waste", start_date=today, end_date=today, status="AVAILABLE", factory_id=self.factory.id
+            )
+        )
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(list(iter_export_rows("waste", end_date=today - timedelta(days=1))), [])
+
+    def test_csv_and_ndjson_endpoints_stream(self):
+        self.client.force_login(self.admin)
+        url = reverse("accounts:admin_export", args=["waste"])
+
+        response = self.client.get(url, {"format": "csv", "status": "USED"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith("waste_id,factory,type,material"))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("WST-4,"))
+
+        response = self.client.get(url, {"format": "ndjson", "factory": self.other_factory.id})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["waste_id"] for row in rows], ["WST-OTHER"])
+
+        self.assertEqual(self.client.get(url, {"start_date": "yesterday"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse("accounts:admin_export", args=["users"])).status_code, 404
+        )
+
+
+class KeysetPaginationTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        factory = self.create_factory()
+        now = timezone.now()
+        for i in range(25):
+            waste = self.create_waste(factory, f"WST-{i:02d}", 10)
+            # Pairs of items share a timestamp, so the id has to break ties
+            TextileWaste.objects.filter(pk=waste.pk).update(date_added=now - timedelta(minutes=i // 2))
+        self.expected = list(
+            TextileWaste.objects.order_by("-date_added", "-id").values_list("waste_id", flat=True)
+        )
+        self.requests = RequestFactory()
+
+    def page(self, query=""):
+        request = self.requests.get(f"/inventory/waste/?{query}")
+        return paginate_keyset(request, TextileWaste.objects.all(), 10, ("-date_added", "-id"))
+
+    def test_pages_walk_forward_and_back(self):
+        seen = []
+        page = self.page("status=AVAILABLE")
+        self.assertFalse(page.has_previous)
+        while True:
+            seen.extend(item.waste_id for item in page)
+            if not page.has_next:
+                break
+            self.assertIn("status=AVAILABLE", page.next_query)
+            # Every page costs a single LIMIT query, without COUNT or OFFSET
+            with self.assertNumQueries(1):
+                page = self.page(page.next_query)
+                list(page)
+        self.assertEqual(seen, self.expected)
+
+        page = self.page(page.previous_query)
+        self.assertEqual([item.waste_id for item in page], self.expected[10:20])
+        page = self.page(page.previous_query)
+        self.assertEqual([item.waste_id for item in page], self.expected[:10])
+        self.assertFalse(page.has_previous)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        page = self.page("cursor=not-a-cursor")
+        self.assertEqual([item.waste_id for item in page], self.expected[:10])
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_estimated_count(self):
+        self.assertGreaterEqual(self.page().estimated_count, 1)
+
+
+class IndexBenchmarkTest(InventoryTestMixin, TestCase):
+    def test_benchmark_compares_plans_and_rolls_back(self):
+        factory = self.create_factory()
+        self.create_waste(factory, "WST-1", 10)
+
+        out = StringIO()
+        call_command("benchmark_indexes", "--waste", "200", "--orders", "0", "--repeat", "1", stdout=out)
+
+        self.assertIn("Available waste page\n  before", out.getvalue())
+        self.assertIn("Seq Scan on inventory_textilewaste", out.getvalue())
+        # The generated rows and the dropped indexes are both rolled back
+        self.assertEqual(TextileWaste.objects.count(), 1)
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, TextileWaste._meta.db_table)
+        self.assertIn("waste_factory_status", indexes)
+
+
+class RequestMetricsTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        request_metrics.reset()
+        self.factory = self.create_factory()
+        self.create_waste(self.factory, "WST-1", 10)
+        self.admin = self.create_factory("siteadmin").user
+        self.admin.user_type = "ADMIN"
+        self.admin.save()
+
+    def test_recorder_counts_duplicate_queries(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            list(TextileWaste.objects.filter(waste_id="WST-1"))
+            list(TextileWaste.objects.filter(waste_id="WST-1"))
+            list(TextileWaste.objects.filter(waste_id="WST-2"))
+
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.duplicates, 1)
+        self.assertGreater(recorder.duration, 0)
+
+    def test_requests_are_timed_and_summarised(self):
+        self.client.force_login(self.factory.user)
+        response = self.client.get(reverse("inventory:api_metrics"))
+
+        # Only admins see the timings, but every request is recorded
+        self.assertNotIn("Server-Timing", response)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("inventory:api_metrics"))
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ duplicates", app;dur=')
+
+        views = {entry["view"]: entry for entry in request_metrics.snapshot()["views"]}
+        self.assertEqual(views["inventory:api_metrics"]["count"], 2)
+        self.assertGreater(views["inventory:api_metrics"]["avg_queries"], 0)
+        self.assertEqual(sum(views["inventory:api_metrics"]["histogram"]), 2)
+
+    @override_settings(REQUEST_METRICS_SLOW_MS=0)
+    def test_slow_requests_are_logged(self):
+        self.client.force_login(self.factory.user)
+        with self.assertLogs("common.middleware", "WARNING") as logs:
+            self.client.get(reverse("inventory:api_metrics"))
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry["view"], "inventory:api_metrics")
+        self.assertEqual(entry["user_id"], self.factory.user.id)
+
+        with override_settings(REQUEST_METRICS_SAMPLE_RATE=0):
+            with self.assertNoLogs("common.middleware", "WARNING"):
+                self.client.get(reverse("inventory:api_metrics"))
+
+    def test_user_is_not_loaded_for_the_header(self):
+        request = RequestFactory().get("/")
+        request.user = SimpleLazyObject(mock.Mock(side_effect=AssertionError("request.user was loaded")))
+        response = RequestMetricsMiddleware(lambda request: HttpResponse("ok"))(request)
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(request_metrics.snapshot()["views"][0]["view"], "unresolved")
+
+    def test_metrics_endpoint_is_admin_only(self):
+        url = reverse("accounts:admin_request_metrics")
+        self.client.force_login(self.factory.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The denied request above was recorded too
+        views = [entry["view"] for entry in response.json()["views"]]
+        self.assertIn("accounts:admin_request_metrics", views)
+
+
+class ImageFeaturesTest(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+        noise = np.random.default_rng(7).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+        self.noise = self.save_image(noise, "noise.jpg")
+        self.noise_small = self.save_image(
+            np.asarray(Image.fromarray(noise).resize((200, 150))), "noise_small.png"
+        )
+        # Red fabric with a black stain in the middle
+        stained = np.zeros((200, 200, 3), dtype=np.uint8)
+        stained[..., 0] = 255
+        stained[80:120, 80:120] = 0
+        self.stained = self.save_image(stained, "stained.png")
+
+    def save_image(self, pixels, name):
+        path = os.path.join(self.folder, name)
+        Image.fromarray(pixels).save(path)
+        return path
+
+    def test_batch_features(self):
+        results = images.analyze_images([self.noise, self.noise_small, self.stained, "missing.png"])
+        self.assertIsNone(results["missing.png"])
+
+        stained = results[self.stained]
+        self.assertEqual((stained.width, stained.height), (200, 200))
+        self.assertEqual(stained.features["dominant_colors"][0]["color"], "#ff0000")
+        self.assertGreater(stained.features["dominant_colors"][0]["share"], 0.9)
+        self.assertEqual(
+            {(defect["row"], defect["column"]) for defect in stained.features["defects"]},
+            {(3, 3), (3, 4), (4, 3), (4, 4)},
+        )
+        self.assertAlmostEqual(sum(stained.features["color_histogram"]["r"]), 1, places=3)
+
+        # Resizing and recompressing barely moves the perceptual hash
+        def distance(first, second):
+            return bin(int(first.features["phash"], 16) ^ int(second.features["phash"], 16)).count("1")
+
+        self.assertLessEqual(distance(results[self.noise], results[self.noise_small]), 8)
+        self.assertGreater(distance(results[self.noise], stained), 16)
+        self.assertEqual(results[self.noise].phash & 0xFFFF, int(results[self.noise].features["phash"][-4:], 16))
+
+    def test_features_are_stored_per_file_content(self):
+        images.analyze_images([self.stained])
+        copy = os.path.join(self.folder, "copy.png")
+        shutil.copy(self.stained, copy)
+
+        with mock.patch.object(images, "load_image") as load_image:
+            results = images.analyze_images([self.stained, copy])
+        load_image.assert_not_called()
+        self.assertEqual(results[self.stained].pk, results[copy].pk)
+        self.assertEqual(ImageFeatures.objects.count(), 1)
+
+        # Analysing, grading and checking an upload decodes it once
+        with mock.patch.object(images, "load_image", wraps=images.load_image) as load_image:
+            WasteImageRecognition.analyze_waste(self.noise)
+            quality = WasteImageRecognition.assess_quality(self.noise)
+            defects = WasteImageRecognition.detect_defects(self.stained)
+        self.assertEqual(load_image.call_count, 1)
+        self.assertIn(quality["estimated_quality"], {"EXCELLENT", "GOOD", "FAIR", "POOR"})
+        self.assertEqual(defects["defect_types"], ["stain"] * 4)
+
+        call_command("analyze_images", path=self.folder, stdout=StringIO())
+        self.assertEqual(ImageFeatures.objects.count(), 3)
+        design = DesignImageRecognition.analyze_design(self.noise_small)
+        self.assertEqual(len(design["dominant_colors"]), len(design["color_shares"]))
+
+
+class DesignImageTestMixin:
+    """Designs uploading JPEGs into a temporary MEDIA_ROOT, with derivatives rendered inline"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = User.objects.create_user(
+            username="imagedesigner", email="imagedesigner@example.com", user_type="DESIGNER"
+        )
+        self.designer = user.designer
+
+    def create_design(self, design_id, pixels, size=None, quality=75):
+        image = Image.fromarray(np.ascontiguousarray(pixels))
+        if size:
+            image = image.resize(size)
+        upload = BytesIO()
+        image.save(upload, "JPEG", quality=quality)
+        return Design.objects.create(
+            design_id=design_id, name=design_id, description="Pattern", designer=self.designer, price=10,
+            image=SimpleUploadedFile(f"{design_id}.jpg", upload.getvalue(), content_type="image/jpeg"),
+        )
+
+
+class ImageDerivativeTest(DesignImageTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.noise = np.random.default_rng(3).integers(0, 256, (600, 800, 3), dtype=np.uint8)
+
+    def test_upload_renders_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            design = self.create_design("DSG-PHOTO", self.noise, quality=95)
+        design.refresh_from_db()
+
+        derivatives = design.image_derivatives
+        self.assertEqual(derivatives["source"], design.image.name)
+        self.assertEqual(
+            [(item["width"], item["format"]) for item in derivatives["items"]],
+            [(160, "jpg"), (160, "webp"), (320, "jpg"), (320, "webp"), (640, "jpg"), (640, "webp"), (800, "webp")],
+        )
+        self.assertEqual(derivatives["items"][2]["height"], 240)
+        for item in derivatives["items"]:
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, item["name"])))
+        self.assertLess(derivatives["items"][2]["size"] * 4, design.image.size)
+
+        html = Template(
+            '{% load images %}{% responsive_image design.image design.image_derivatives 300 alt="Photo" %}'
+        ).render(Context({"design": design}))
+        self.assertIn('src="/media/designs/DSG-PHOTO.320w.jpg"', html)
+        self.assertIn("/media/designs/DSG-PHOTO.640w.webp 640w", html)
+
+        # A replaced image is served as is until its own derivatives are recorded
+        design.image_derivatives = {**derivatives, "source": "designs/older.jpg"}
+        html = Template(
+            "{% load images %}{% responsive_image design.image design.image_derivatives 300 %}"
+        ).render(Context({"design": design}))
+        self.assertIn(f'src="{design.image.url}"', html)
+
+    def test_command_backfills_missing_derivatives(self):
+        # The on-commit rendering never runs inside the test transaction
+        design = self.create_design("DSG-OLD", self.noise, quality=95)
+        self.assertEqual(Design.objects.get(pk=design.pk).image_derivatives, {})
+
+        output = StringIO()
+        call_command("generate_image_derivatives", workers=1, stdout=output)
+        self.assertIn("Rendered 1 images, 0 failed.", output.getvalue())
+        self.assertEqual(Design.objects.get(pk=design.pk).image_derivatives["source"], design.image.name)
+
+        output = StringIO()
+        call_command("generate_image_derivatives", stdout=output)
+        self.assertIn("already has its derivatives", output.getvalue())
+
+
+class DuplicateImagesTest(DesignImageTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Blotches of colour, structured as photos are rather than pixel noise
+        coarse = np.random.default_rng(5).integers(0, 256, (12, 16, 3), dtype=np.uint8)
+        self.pattern = np.asarray(Image.fromarray(coarse).resize((640, 480), Image.Resampling.BICUBIC))
+
+    def test_index_lookups_match_brute_force(self):
+        rng = np.random.default_rng(11)
+        hashes = [int(value) for value in rng.integers(0, 1 << 63, 300, dtype=np.int64)]
+        # Near variants of the first hash, up to 8 bits away
+        hashes += [
+            hashes[0] ^ sum(1 << int(bit) for bit in rng.choice(64, flips, replace=False))
+            for flips in range(9)
+        ]
+        ImageFeatures.objects.bulk_create(
+            ImageFeatures(
+                digest=f"{index:064x}", version=images.FEATURES_VERSION, width=1, height=1,
+                phash=images._signed(value), phash_chunks=duplicates.hash_chunks(value), features={},
+            )
+            for index, value in enumerate(hashes)
+        )
+        tree = duplicates.BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(value, f"{index:064x}")
+
+        for distance in (0, 3, 6):
+            expected = sorted(
+                (f"{index:064x}", duplicates.hamming_distance(hashes[0], value))
+                for index, value in enumerate(hashes)
+                if duplicates.hamming_distance(hashes[0], value) <= distance
+            )
+            with self.assertNumQueries(1):
+                found = duplicates.find_similar_hashes(hashes[0], distance)
+            self.assertEqual(sorted(found), expected)
+            self.assertEqual(sorted(tree.search(hashes[0], distance)), expected)
+        self.assertEqual(len(expected), 8)
+
+    def test_upload_flags_duplicates(self):
+        original = self.create_design("DSG-ORIGINAL", self.pattern)
+        self.assertIsNone(original.duplicate_of)
+        self.assertEqual(len(original.image_digest), 64)
+
+        copy = self.create_design("DSG-COPY", self.pattern, size=(320, 240))
+        self.assertEqual(copy.duplicate_of, original)
+        other = self.create_design("DSG-OTHER", self.pattern[::-1, ::-1])
+        self.assertIsNone(other.duplicate_of)
+
+        # Saving again without a new image keeps the flag without analysing or reindexing anything
+        copy = Design.objects.get(pk=copy.pk)
+        with self.assertNumQueries(1):
+            copy.save()
+        self.assertEqual(Design.objects.get(pk=copy.pk).duplicate_of, original)
+
+    def test_unchanged_images_are_not_analysed_again(self):
+        broken = Design.objects.create(
+            design_id="DSG-BROKEN", name="Broken", description="Pattern", designer=self.designer, price=10,
+            image=SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg"),
+        )
+        self.assertEqual(broken.image_digest, "")
+
+        with mock.patch("common.duplicates.find_duplicates", return_value=(None, [])) as find_duplicates:
+            Design.objects.get(pk=broken.pk).save()
+            find_duplicates.assert_not_called()
+
+            design = Design.objects.get(pk=broken.pk)
+            design.image = "designs/other.jpg"
+            design.save()
+            find_duplicates.assert_called_once()
+
+    def test_command_sweeps_media(self):
+        original = self.create_design("DSG-ORIGINAL", self.pattern)
+        copy = self.create_design("DSG-COPY", self.pattern, size=(320, 240))
+        self.create_design("DSG-OTHER", self.pattern[::-1, ::-1])
+        Design.objects.update(image_digest="", duplicate_of=None)
+
+        output = StringIO()
+        call_command("find_duplicate_images", stdout=output)
+        self.assertIn("2 near-duplicate images:", output.getvalue())
+        self.assertNotIn("DSG-OTHER", output.getvalue().split("Found")[0])
+        self.assertIn("Found 1 groups of near-duplicate images among 3 images, 1 designs flagged.", output.getvalue())
+        self.assertEqual(Design.objects.get(pk=copy.pk).duplicate_of, original)
+        self.assertEqual(Design.objects.get(pk=original.pk).image_digest, original.image_digest)
@@ -0,0 +1,103 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+GRANULARITIES = ["day", "week", "month", "quarter", "year"]
+
+# Months spanned by one bucket of the month-based granularities
+MONTHS_PER_PERIOD = {"month": 1, "quarter": 3, "year": 12}
+
+
+def truncate_date(value, granularity="month"):
+    """Get the first day of the bucket a date falls in"""
+    if granularity == "day":
+        return value
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    months = MONTHS_PER_PERIOD[granularity]
+    return value.replace(month=(value.month - 1) // months * months + 1, day=1)
+
+
+def add_periods(value, granularity="month", count=1):
+    """Move a bucket start date forwards (or backwards) by whole buckets"""
+    if granularity == "day":
+        return value + timedelta(days=count)
+    if granularity == "week":
+        return value + timedelta(weeks=count)
+    month_index = value.year * 12 + value.month - 1 + count * MONTHS_PER_PERIOD[granularity]
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def _local_date(value, tz):
+    """Convert a date or datetime to a date in the given time zone"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = value.astimezone(tz)
+        return value.date()
+    return value
+
+
+def get_time_series(
+    queryset,
+    date_field,
+    measures,
+    start=None,
+    end=None,
+    periods=None,
+    granularity="month",
+    tz=None,
+):
+    """Aggregate a queryset into calendar buckets with a single GROUP BY query.
+
+    ``measures`` maps output names to aggregates. The series covers the
+    buckets from ``start`` up to the one containing ``end`` (default now), or
+    the last ``periods`` buckets, and buckets without rows are filled with
+    zeros. Datetime fields are bucketed in ``tz`` (default the current time
+    zone); date fields are used as stored.
+
+    Returns a list of dicts holding the bucket's first day as ``period`` and
+    one value per measure, oldest first.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    tz = tz or timezone.get_current_timezone()
+    first = truncate_date(_local_date(end or timezone.now(), tz), granularity)
+    last = first
+    if periods:
+        first = add_periods(last, granularity, 1 - periods)
+    elif start:
+        first = truncate_date(_local_date(start, tz), granularity)
+
+    range_end = add_periods(last, granularity)
+    is_datetime = isinstance(
+        queryset.model._meta.get_field(date_field), models.DateTimeField
+    )
+    if is_datetime:
+        lower = timezone.make_aware(datetime.combine(first, time.min), tz)
+        upper = timezone.make_aware(datetime.combine(range_end, time.min), tz)
+        period = Trunc(date_field, granularity, tzinfo=tz)
+    else:
+        lower, upper = first, range_end
+        period = Trunc(date_field, granularity)
+
+    rows = (
+        queryset.filter(**{f"{date_field}__gte": lower, f"{date_field}__lt": upper})
+        .annotate(period=period)
+        .order_by()
+        .values("period")
+        .annotate(**measures)
+    )
+    buckets = {_local_date(row.pop("period"), tz): row for row in rows}
+
+    series = []
+    bucket = first
+    while bucket < range_end:
+        row = buckets.get(bucket, {})
+        series.append(
+            {"period": bucket, **{name: row.get(name) or 0 for name in measures}}
+        )
+        bucket = add_periods(bucket, granularity)
+    return series
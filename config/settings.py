@@ -14,6 +14,8 @@ from pathlib import Path
 import logging
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -51,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware
+    "common.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -173,9 +177,19 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+# Resized and WebP copies of uploaded images are rendered by this many
+# worker processes after the upload, or inline when async is off
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVES_ASYNC = True
+
 # Custom user model
 AUTH_USER_MODEL = "accounts.User"
 
+# Requests slower than this many milliseconds go to logs/slow_requests.log,
+# keeping only the given fraction of them
+REQUEST_METRICS_SLOW_MS = 500
+REQUEST_METRICS_SAMPLE_RATE = 1.0
+
 # Logging Configuration
 LOGGING = {
     "version": 1,
@@ -189,6 +203,10 @@ LOGGING = {
             "format": "{levelname} {asctime} {message}",
             "style": "{",
         },
+        "json_line": {
+            "format": "{message}",
+            "style": "{",
+        },
     },
     "handlers": {
         "console": {
@@ -205,6 +223,11 @@ LOGGING = {
             "filename": "logs/websocket.log",
             "formatter": "verbose",
         },
+        "slow_requests_file": {
+            "class": "logging.FileHandler",
+            "filename": "logs/slow_requests.log",
+            "formatter": "json_line",
+        },
     },
     "loggers": {
         "common.utils": {
@@ -227,6 +250,11 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": False,
         },
+        "common.middleware": {
+            "handlers": ["slow_requests_file"],
+            "level": "WARNING",
+            "propagate": False,
+        },
     },
 }
 
@@ -245,22 +273,28 @@ except OSError as e:
 
 # Channels Configuration
 ASGI_APPLICATION = "config.asgi.application"
-CHANNEL_LAYERS = {
-    "default": {
+# Channel layer backend, set with the CHANNEL_LAYER_BACKEND environment variable.
+# "postgres" (the default) needs nothing but the project database: group
+# messages go through LISTEN/NOTIFY, so they reach sockets in every ASGI worker
+# process and run_notification_worker can deliver to them. "redis" uses
+# channels_redis for deployments that already run Redis.
+CHANNEL_LAYER_BACKENDS = {
+    "postgres": {
+        "BACKEND": "notifications.layers.PostgresChannelLayer",
+    },
+    "redis": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [os.environ.get("CHANNEL_REDIS_URL", "redis://127.0.0.1:6379")],
         },
     },
 }
-
-# Use in-memory channel layer in development to avoid Redis dependency
-if DEBUG:
-    CHANNEL_LAYERS = {
-        "default": {
-            "BACKEND": "channels.layers.InMemoryChannelLayer",
-        }
-    }
+CHANNEL_LAYER_BACKEND = os.environ.get("CHANNEL_LAYER_BACKEND", "postgres")
+if CHANNEL_LAYER_BACKEND not in CHANNEL_LAYER_BACKENDS:
+    raise ImproperlyConfigured(
+        f"CHANNEL_LAYER_BACKEND must be one of {', '.join(CHANNEL_LAYER_BACKENDS)}"
+    )
+CHANNEL_LAYERS = {"default": CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER_BACKEND]}
 
 # Email configuration for notifications
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
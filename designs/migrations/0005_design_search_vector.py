@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:51
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_search_vectors(apps, schema_editor):
+    Design = apps.get_model('designs', 'Design')
+    Designer = apps.get_model('accounts', 'Designer')
+    username = Designer.objects.filter(pk=OuterRef('designer_id')).values('user__username')[:1]
+    Design.objects.update(
+        search_vector=SearchVector('name', weight='A', config='english')
+        + SearchVector('description', weight='B', config='english')
+        + SearchVector(Subquery(username), weight='C', config='english')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+        ('designs', '0004_rename_date_updated_design_last_modified'),
+        ('inventory', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='design',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='design',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='design_search_vector'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('designs', '0006_design_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='design',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='designs.design'),
+        ),
+        migrations.AddField(
+            model_name='design',
+            name='image_digest',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
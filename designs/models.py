@@ -1,5 +1,14 @@
+import logging
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+logger = logging.getLogger(__name__)
+
+# Fields the stored search vector is built from, the designer standing for their username
+SEARCH_FIELDS = ("name", "description", "designer_id")
+
 
 class Image(models.Model):
     image_id = models.CharField(max_length=100, unique=True)
@@ -37,14 +46,42 @@ class Design(models.Model):
     # The actual database column is 'last_modified', not 'date_updated'
     last_modified = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to="designs/", null=True, blank=True)
+    # Resized and WebP copies of the image, recorded by common.derivatives
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # SHA-256 of the image file and the oldest design with a near-identical image
+    image_digest = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="duplicates",
+    )
     specifications = models.JSONField(default=dict, blank=True)
     estimated_delivery_days = models.IntegerField(default=7)
+    # Weighted name, description and designer username, kept up to date by save()
+    # and, for designer renames, by accounts.signals
+    search_vector = SearchVectorField(null=True, editable=False)
 
     @property
     def date_updated(self):
         """Property to maintain compatibility with code that expects date_updated"""
         return self.last_modified
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # save() compares against it to tell whether the image changed
+        if "image" in field_names:
+            instance._loaded_image_name = instance.image.name if instance.image else ""
+        if all(field in field_names for field in SEARCH_FIELDS):
+            instance._loaded_search_fields = instance._search_fields()
+        return instance
+
+    def _search_fields(self):
+        return tuple(getattr(self, field) for field in SEARCH_FIELDS)
+
     def calculate_material_cost(self):
         total_cost = 0
         for material in self.required_materials.all():
@@ -53,37 +90,98 @@ class Design(models.Model):
         return total_cost
 
     def is_customizable(self):
-        return self.customization_options.exists()    
+        # List views prefetch the options, so reuse them instead of querying per design
+        if "customization_options" in getattr(self, "_prefetched_objects_cache", {}):
+            return bool(self.customization_options.all())
+        return self.customization_options.exists()
+
     def get_available_quantity(self):
         """
         Calculate maximum available quantity based on required materials.
-        Returns the minimum available quantity across all required materials.
+        Returns the minimum, across the required materials in stock, of the
+        units each can make given its consumption in ``specifications``.
+        """
+        # Designs loaded through annotate_material_availability carry the result
+        if hasattr(self, "available_quantity"):
+            return self.available_quantity
+
+        from .utils import get_available_quantities
+
+        return get_available_quantities([self])[self.pk]
+
+    def save(self, *args, **kwargs):
+        from common.derivatives import schedule_derivatives
+
+        from .search import update_search_vectors
+
+        # Only a newly uploaded file, or another stored one, is checked for duplicates;
+        # older images are backfilled by the find_duplicate_images command
+        image_name = self.image.name if self.image else ""
+        new_image = bool(image_name) and (
+            not self.image._committed
+            or image_name != getattr(self, "_loaded_image_name", image_name)
+        )
+
+        # The stored vector is only written by update_search_vectors, never from memory
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "search_vector" and field.attname not in deferred
+            ]
+
+        super().save(*args, **kwargs)
+        # The vector only changes with the indexed fields; designer renames are handled by a signal
+        if getattr(self, "_loaded_search_fields", None) != self._search_fields():
+            update_search_vectors(Design.objects.filter(pk=self.pk))
+            self._loaded_search_fields = self._search_fields()
+
+        if new_image:
+            self.flag_duplicate_image()
+        elif not self.image and self.image_digest:
+            self.image_digest, self.duplicate_of = "", None
+            Design.objects.filter(pk=self.pk).update(image_digest="", duplicate_of=None)
+        self._loaded_image_name = self.image.name if self.image else ""
+
+        # Render the resized copies of a new image once, however often it is saved
+        image_name = self._loaded_image_name
+        if (
+            image_name
+            and self.image_derivatives.get("source") != image_name
+            and getattr(self, "_derivatives_scheduled_for", None) != image_name
+        ):
+            self._derivatives_scheduled_for = image_name
+            schedule_derivatives(self)
+
+    def flag_duplicate_image(self):
+        """Record the image's digest and the oldest other design whose image nearly duplicates it.
+
+        Returns that design, or None.
         """
-        available_quantities = []
-        
-        # Consider these statuses as indicating material is available
-        available_statuses = ["AVAILABLE", "PENDING_REVIEW", "RESERVED"]
-        
-        # Include all materials that have any usable status
-        for material in self.required_materials.filter(status__in=available_statuses).all():
-            # For each material, calculate how many designs can be made
-            # based on material quantity available
-            if material.quantity > 0:
-                available_quantities.append(int(material.quantity))
-        
-        # If we have no materials or no available quantities, return 12 as default
-        # You can adjust this default value as needed for your application
-        if not available_quantities:
-            return 12
-        
-        # Return the minimum available quantity (the limiting factor)
-        return min(available_quantities)
+        from common.duplicates import find_duplicates
+
+        features, similar = find_duplicates(self.image.path)
+        if features is None:
+            return None
+        duplicate = (
+            Design.objects.filter(image_digest__in=[digest for digest, _ in similar])
+            .exclude(pk=self.pk)
+            .order_by("pk")
+            .first()
+        )
+        if duplicate:
+            logger.warning(f"Design {self.design_id} image duplicates that of {duplicate.design_id}")
+        self.image_digest, self.duplicate_of = features.digest, duplicate
+        Design.objects.filter(pk=self.pk).update(image_digest=features.digest, duplicate_of=duplicate)
+        return duplicate
 
     def __str__(self):
         return f"{self.name} ({self.design_id})"
 
     class Meta:
         ordering = ["-date_created"]
+        indexes = [GinIndex(fields=["search_vector"], name="design_search_vector")]
 
 
 class CustomizationOption(models.Model):
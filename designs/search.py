@@ -0,0 +1,131 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Count, Exists, F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast
+
+from accounts.models import Designer
+
+from .models import CustomizationOption, Design
+
+# Text search configuration of both the stored vectors and the queries
+SEARCH_CONFIG = "english"
+
+# Slug, label and [low, high) bounds of the price facet
+PRICE_BANDS = [
+    ("under-50", "Under $50", None, 50),
+    ("50-100", "$50 - $100", 50, 100),
+    ("100-200", "$100 - $200", 100, 200),
+    ("200-plus", "$200 and over", 200, None),
+]
+
+# Designs offered by the autocomplete endpoint
+SUGGESTION_LIMIT = 8
+
+
+def design_search_vector():
+    """Weighted search document of a design: name, then description, then designer"""
+    username = Designer.objects.filter(pk=OuterRef("designer_id")).values("user__username")[:1]
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(Subquery(username), weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(designs):
+    """Recompute the stored search vector of the given designs in one UPDATE"""
+    return designs.update(search_vector=design_search_vector())
+
+
+def parse_search_query(text):
+    """Turn free text into a prefix query matching designs containing every word.
+
+    Each word matches as a prefix, so "sum dre" finds "Summer Dress" while
+    it is still being typed. Returns None when the text has no words.
+    """
+    words = re.findall(r"[^\W_]+", text)
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words), search_type="raw", config=SEARCH_CONFIG
+    )
+
+
+def search_designs(designs, text):
+    """Filter designs to those matching the text and annotate their ``rank``"""
+    query = parse_search_query(text)
+    if query is None:
+        return designs.none().annotate(rank=Value(0.0, output_field=FloatField()))
+    # ts_rank returns a real; as double precision it round-trips through page cursors exactly
+    return designs.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+
+
+def filter_designs(designs, material=None, price=None, customizable=False):
+    """Narrow designs down to the selected facet values; unknown values are ignored"""
+    if material:
+        designs = designs.filter(
+            Exists(
+                Design.required_materials.through.objects.filter(
+                    design_id=OuterRef("pk"), textilewaste__material=material
+                )
+            )
+        )
+    for slug, _, low, high in PRICE_BANDS:
+        if price == slug:
+            if low is not None:
+                designs = designs.filter(price__gte=low)
+            if high is not None:
+                designs = designs.filter(price__lt=high)
+    if customizable:
+        designs = designs.filter(
+            Exists(CustomizationOption.objects.filter(design_id=OuterRef("pk")))
+        )
+    return designs
+
+
+def get_design_facets(designs):
+    """Count the designs of every material, price band and customizability.
+
+    Takes two queries whatever the number of designs: one grouping the
+    required materials, one aggregating the price bands and customizable
+    designs.
+    """
+    designs = designs.order_by()
+    materials = (
+        Design.required_materials.through.objects.filter(design_id__in=designs.values("pk"))
+        .values("textilewaste__material")
+        .annotate(count=Count("design_id", distinct=True))
+        .order_by("-count", "textilewaste__material")
+    )
+
+    bands = {}
+    for slug, _, low, high in PRICE_BANDS:
+        band = Q()
+        if low is not None:
+            band &= Q(price__gte=low)
+        if high is not None:
+            band &= Q(price__lt=high)
+        bands[slug] = Count("pk", filter=band)
+    totals = designs.annotate(
+        has_options=Exists(CustomizationOption.objects.filter(design_id=OuterRef("pk")))
+    ).aggregate(customizable=Count("pk", filter=Q(has_options=True)), **bands)
+
+    return {
+        "materials": [
+            {"value": row["textilewaste__material"], "count": row["count"]} for row in materials
+        ],
+        "prices": [
+            {"value": slug, "label": label, "count": totals[slug]}
+            for slug, label, _, _ in PRICE_BANDS
+        ],
+        "customizable": totals["customizable"],
+    }
+
+
+def suggest_designs(text, limit=SUGGESTION_LIMIT):
+    """Get the best matching published designs for autocompleting the search box"""
+    designs = search_designs(Design.objects.filter(status="PUBLISHED"), text)
+    return list(designs.order_by("-rank", "-id").values("design_id", "name")[:limit])
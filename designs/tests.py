@@ -1,4 +1,6 @@
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from decimal import Decimal
@@ -299,6 +301,53 @@ class DesignModelUnitTest(TestCase):
         
         # Should return default value (12) when no materials
         self.assertEqual(design_without_materials.get_available_quantity(), 12)
+    
+    def test_available_quantity_uses_material_consumption(self):
+        """Test per-unit consumption from specifications limits the buildable quantity"""
+        # 100 / 30 = 3 units from material1, 50 / 2.5 = 20 from material2
+        self.design.specifications = {
+            "material_consumption": {"WST-A": 30, "WST-B": 2.5, "WST-X": "lots"}
+        }
+        self.design.save()
+        self.assertEqual(self.design.get_available_quantity(), 3)
+        
+        # Invalid and non-positive values fall back to one unit of material
+        self.design.specifications = {"material_consumption": {"WST-A": -1, "WST-B": "two"}}
+        self.design.save()
+        self.assertEqual(self.design.get_available_quantity(), 50)
+    
+    def test_batch_availability(self):
+        """Test availability of many designs is computed without a query per design"""
+        from .utils import annotate_material_availability, get_available_quantities
+        
+        designs = [self.design]
+        for i in range(3):
+            design = Design.objects.create(
+                design_id=f"DSG-BATCH-{i}",
+                name=f"Batch {i}",
+                description="Batch design",
+                designer=self.designer,
+                price=Decimal('100.00'),
+                status="PUBLISHED",
+                specifications={"material_consumption": {"WST-A": i + 1}},
+            )
+            design.required_materials.add(self.material1)
+            designs.append(design)
+        
+        with self.assertNumQueries(1):
+            quantities = get_available_quantities(designs)
+        self.assertEqual(quantities, {designs[0].pk: 50, designs[1].pk: 100, designs[2].pk: 50, designs[3].pk: 33})
+        
+        self.material1.status = "USED"
+        self.material1.save()
+        with self.assertNumQueries(1):
+            annotated = {
+                design.pk: design
+                for design in annotate_material_availability(Design.objects.filter(design_id__startswith="DSG-"))
+            }
+        self.assertEqual(annotated[designs[0].pk].get_available_quantity(), 50)
+        self.assertFalse(annotated[designs[0].pk].materials_available)
+        self.assertEqual(annotated[designs[1].pk].available_quantity, 12)
 
 
 class CustomizationOptionModelUnitTest(TestCase):
@@ -643,3 +692,104 @@ class DesignViewsModuleTest(TestCase):
         self.client.login(username='regular', password='regularpass')
         response = self.client.get(reverse('designs:design_customize', kwargs={'design_id': self.draft_design.design_id}))
         self.assertEqual(response.status_code, 404)  # Draft design not found
+    
+    def test_design_list_search_ranks_prefix_matches(self):
+        """Test search matches word prefixes and ranks name matches first"""
+        tote = Design.objects.create(
+            design_id="TEST-PUB-002",
+            name="Linen Tote",
+            description="Pairs with the published range",
+            designer=self.designer,
+            price=Decimal('40.00'),
+            status="PUBLISHED"
+        )
+        response = self.client.get(reverse('designs:design_list'), {'search': 'publ'})
+        self.assertEqual(list(response.context['designs']), [self.published_design, tote])
+        
+        # The designer's username is searchable too, and renaming a design reindexes it
+        tote.name = "Canvas Tote"
+        tote.save()
+        response = self.client.get(reverse('designs:design_list'), {'search': 'canvas designer'})
+        self.assertEqual(list(response.context['designs']), [tote])
+    
+    def test_search_vector_follows_indexed_fields(self):
+        """Test saves only reindex a design when its indexed fields or designer's username change"""
+        design = Design.objects.get(pk=self.published_design.pk)
+        design.price = Decimal('55.00')
+        with CaptureQueriesContext(connection) as queries:
+            design.save()
+        self.assertFalse(any('to_tsvector' in query['sql'] for query in queries))
+        
+        # Saving a freshly created design again keeps the vector computed on creation
+        tote = Design.objects.create(
+            design_id="TEST-PUB-003", name="Linen Tote", description="Market bag",
+            designer=self.designer, price=Decimal('40.00'), status="PUBLISHED"
+        )
+        tote.price = Decimal('45.00')
+        tote.save()
+        response = self.client.get(reverse('designs:design_list'), {'search': 'linen'})
+        self.assertEqual(list(response.context['designs']), [tote])
+        
+        self.designer_user.username = 'atelier'
+        self.designer_user.save()
+        response = self.client.get(reverse('designs:design_list'), {'search': 'atelier'})
+        self.assertCountEqual(response.context['designs'], [self.published_design, tote])
+    
+    def test_design_list_search_pages_through_tied_ranks(self):
+        """Test search result pages neither repeat nor skip designs ranked the same"""
+        for number in range(15):
+            Design.objects.create(
+                design_id=f"TEST-TIE-{number:03d}",
+                name="Patchwork Quilt",
+                description="Quilted from offcuts",
+                designer=self.designer,
+                price=Decimal('60.00'),
+                status="PUBLISHED"
+            )
+        response = self.client.get(reverse('designs:design_list'), {'search': 'patchwork'})
+        first_page = response.context['designs']
+        self.assertTrue(first_page.has_next)
+        response = self.client.get(f"{reverse('designs:design_list')}?{first_page.next_query}")
+        second_page = response.context['designs']
+        
+        design_ids = [design.design_id for design in [*first_page, *second_page]]
+        self.assertEqual(len(design_ids), 15)
+        self.assertEqual(len(set(design_ids)), 15)
+        self.assertFalse(second_page.has_next)
+    
+    def test_design_list_facets(self):
+        """Test facet counts and filtering by material, price band and customizability"""
+        Design.objects.create(
+            design_id="TEST-PUB-002",
+            name="Linen Tote",
+            description="Plain tote",
+            designer=self.designer,
+            price=Decimal('40.00'),
+            status="PUBLISHED"
+        )
+        response = self.client.get(reverse('designs:design_list'))
+        facets = response.context['facets']
+        self.assertEqual(facets['materials'], [{'value': 'Cotton', 'count': 1}])
+        self.assertEqual(
+            {band['value']: band['count'] for band in facets['prices']},
+            {'under-50': 1, '50-100': 0, '100-200': 1, '200-plus': 0}
+        )
+        self.assertEqual(facets['customizable'], 1)
+        
+        for params in ({'material': 'Cotton'}, {'price': '100-200'}, {'customizable': '1'}):
+            response = self.client.get(reverse('designs:design_list'), params)
+            self.assertEqual(list(response.context['designs']), [self.published_design])
+    
+    def test_design_suggest(self):
+        """Test the autocomplete endpoint suggests published designs by prefix"""
+        response = self.client.get(reverse('designs:design_suggest'), {'q': 'Desi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'],
+            [{
+                'design_id': self.published_design.design_id,
+                'name': self.published_design.name,
+                'url': reverse('designs:design_detail', args=[self.published_design.design_id]),
+            }]
+        )
+        self.assertEqual(self.client.get(reverse('designs:design_suggest'), {'q': '!'}).json()['results'], [])
@@ -8,6 +8,7 @@ urlpatterns = [
     path("", views.design_list, name="design_list"),
     path("dashboard/", views.designer_dashboard, name="designer_dashboard"),
     path("create/", views.design_create, name="design_create"),
+    path("suggest/", views.design_suggest, name="design_suggest"),
     path("<str:design_id>/", views.design_detail, name="design_detail"),
     path("<str:design_id>/customize/", views.design_customize, name="design_customize"),
     path("<str:design_id>/edit/", views.design_edit, name="design_edit"),
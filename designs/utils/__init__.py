@@ -0,0 +1,157 @@
+import uuid
+
+from django.db.models import (
+    Avg,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    Min,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce, Floor
+
+from ..models import Design
+
+# Material statuses counted as stock a design can still be made from
+AVAILABLE_MATERIAL_STATUSES = ["AVAILABLE", "PENDING_REVIEW", "RESERVED"]
+
+# Quantity offered for designs without any material in stock
+DEFAULT_AVAILABLE_QUANTITY = 12
+
+
+class MaterialConsumption(Func):
+    """Material used per design unit, read from the design's specifications.
+
+    Designs may set ``specifications["material_consumption"]`` to a mapping
+    of waste ids to the quantity of that waste one unit of the design uses.
+    Missing, non-numeric and non-positive values count as 1.
+    """
+
+    arity = 2
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection):
+        specifications, waste_id = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        value = f"(({specifications[0]}) -> 'material_consumption' -> ({waste_id[0]}))"
+        sql = (
+            f"CASE WHEN jsonb_typeof({value}) = 'number' AND ({value})::text::float > 0 "
+            f"THEN ({value})::text::float ELSE 1 END"
+        )
+        return sql, (*specifications[1], *waste_id[1]) * 3
+
+
+def _buildable_quantities(specifications):
+    """Group required materials in stock by design with the units each can still make"""
+    through = Design.required_materials.through
+    return (
+        through.objects.filter(
+            textilewaste__status__in=AVAILABLE_MATERIAL_STATUSES,
+            textilewaste__quantity__gt=0,
+        )
+        .values("design_id")
+        .annotate(
+            buildable=Cast(
+                Min(
+                    Floor(
+                        F("textilewaste__quantity")
+                        / MaterialConsumption(specifications, F("textilewaste__waste_id"))
+                    )
+                ),
+                IntegerField(),
+            )
+        )
+    )
+
+
+def get_available_quantities(designs):
+    """Get the maximum buildable quantity of every given design in one query.
+
+    The quantity of a design is limited by its scarcest material in stock,
+    divided by what one unit consumes of it. Accepts designs or their ids
+    and returns a dict keyed by design id.
+    """
+    ids = [getattr(design, "pk", design) for design in designs]
+    quantities = dict.fromkeys(ids, DEFAULT_AVAILABLE_QUANTITY)
+    rows = _buildable_quantities(F("design__specifications")).filter(design_id__in=ids)
+    quantities.update(rows.values_list("design_id", "buildable"))
+    return quantities
+
+
+def annotate_material_availability(designs):
+    """Annotate designs with ``available_quantity`` and ``materials_available``.
+
+    ``available_quantity`` is what ``get_available_quantities`` computes,
+    and ``materials_available`` is whether every required material is
+    available and not used up. Both are subqueries of the designs query,
+    so listing a page of designs costs no query per design.
+    """
+    through = Design.required_materials.through
+    buildable = _buildable_quantities(OuterRef("specifications")).filter(design_id=OuterRef("pk"))
+    unavailable = through.objects.filter(design_id=OuterRef("pk")).exclude(
+        textilewaste__status="AVAILABLE", textilewaste__quantity__gt=0
+    )
+    return designs.annotate(
+        available_quantity=Coalesce(
+            Subquery(buildable.values("buildable")), Value(DEFAULT_AVAILABLE_QUANTITY)
+        ),
+        materials_available=~Exists(unavailable),
+    )
+
+
+def generate_design_id():
+    """Generate a unique design ID"""
+    return f"DSG-{uuid.uuid4().hex[:8].upper()}"
+
+
+def get_designer_statistics(designer):
+    """Get statistics about a designer's portfolio"""
+    designs = Design.objects.filter(designer=designer)
+    return {
+        "total_designs": designs.count(),
+        "published_designs": designs.filter(status="PUBLISHED").count(),
+        "average_price": designs.filter(status="PUBLISHED").aggregate(Avg("price"))[
+            "price__avg"
+        ]
+        or 0,
+        "designs_by_material": designs.values("required_materials__material").annotate(
+            count=Count("id")
+        ),
+        "customizable_designs": designs.filter(customization_options__isnull=False)
+        .distinct()
+        .count(),
+    }
+
+
+def check_material_requirements(design_id):
+    """Check if all required materials for a design are available"""
+    available = (
+        annotate_material_availability(Design.objects.filter(design_id=design_id))
+        .values_list("materials_available", flat=True)
+        .first()
+    )
+    return bool(available)
+
+
+def calculate_customization_price(design_id, customizations):
+    """Calculate total price including customizations"""
+    try:
+        design = Design.objects.get(design_id=design_id)
+        total_price = design.price
+
+        for option, choice in customizations.items():
+            option_obj = design.customization_options.get(name=option)
+            if option_obj and choice in option_obj.price_impact:
+                total_price += option_obj.price_impact[choice]
+
+        return total_price
+    except Design.DoesNotExist:
+        return None
+    except Exception:
+        return None
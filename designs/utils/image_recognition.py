@@ -1,63 +1,66 @@
-import os
-from pathlib import Path
-import numpy as np
-from PIL import Image
+from common.images import analyze_image, analyze_images
+
+# Mean gradient, on a 0-1 brightness scale, of the busiest patterns
+COMPLEXITY_GRADIENT = 0.15
+
 
 class DesignImageRecognition:
+    """Analysis of design images.
+
+    Both methods read the features ``common.images`` computes once per
+    file. Use ``analyze_batch`` for many images at once.
+    """
+
     @staticmethod
-    def preprocess_image(image_path):
-        """Preprocess image for recognition model"""
-        try:
-            img = Image.open(image_path)
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            # Resize to standard size
-            img = img.resize((224, 224))
-            # Convert to numpy array and normalize
-            img_array = np.array(img) / 255.0
-            return img_array
-        except Exception as e:
-            print(f"Error preprocessing image: {e}")
-            return None
+    def _analysis(features):
+        return {
+            'dominant_colors': [color["color"] for color in features["dominant_colors"]],
+            'color_shares': [color["share"] for color in features["dominant_colors"]],
+            'complexity_score': round(
+                min(1.0, features["texture"]["mean_gradient"] / COMPLEXITY_GRADIENT), 4
+            ),
+            'phash': features["phash"],
+        }
+
+    @staticmethod
+    def _features(features):
+        texture = features["texture"]
+        return {
+            'color_histogram': features["color_histogram"],
+            'edge_features': {
+                'edge_density': texture["edge_density"],
+                'mean_gradient': texture["mean_gradient"],
+            },
+            'texture_features': {
+                'contrast': texture["contrast"],
+                'sharpness': texture["sharpness"],
+                'entropy': texture["entropy"],
+            },
+        }
 
     @staticmethod
     def analyze_design(image_path):
-        """Analyze design image for pattern recognition"""
-        try:
-            processed_img = DesignImageRecognition.preprocess_image(image_path)
-            if processed_img is None:
-                return None
-            
-            # Placeholder for actual model prediction
-            # Will implement actual model inference here
-            results = {
-                'pattern_type': 'geometric',
-                'dominant_colors': ['#ffffff', '#000000'],
-                'complexity_score': 0.75,
-                'similarity_score': 0.0
-            }
-            return results
-        except Exception as e:
-            print(f"Error analyzing design: {e}")
+        """Analyze design image colours and pattern complexity"""
+        analysed = analyze_image(image_path)
+        if analysed is None:
             return None
+        return DesignImageRecognition._analysis(analysed.features)
 
     @staticmethod
     def extract_features(image_path):
         """Extract features from design image"""
-        try:
-            processed_img = DesignImageRecognition.preprocess_image(image_path)
-            if processed_img is None:
-                return None
-            
-            # Placeholder for feature extraction
-            # Will implement actual feature extraction here
-            features = {
-                'color_histogram': [],
-                'edge_features': [],
-                'texture_features': []
+        analysed = analyze_image(image_path)
+        if analysed is None:
+            return None
+        return DesignImageRecognition._features(analysed.features)
+
+    @staticmethod
+    def analyze_batch(image_paths):
+        """Analyse and extract the features of many design images at once, keyed by path"""
+        return {
+            path: None if analysed is None else {
+                **DesignImageRecognition._analysis(analysed.features),
+                **DesignImageRecognition._features(analysed.features),
             }
-            return features
-        except Exception as e:
-            print(f"Error extracting features: {e}")
-            return None
\ No newline at end of file
+            for path, analysed in analyze_images(image_paths).items()
+        }
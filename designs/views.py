@@ -1,16 +1,19 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django import forms
 from django.forms import inlineformset_factory
-from django.db import models  # Add this import for Q objects
 import uuid
 
+from common.pagination import paginate_keyset
 from inventory.models import TextileWaste, Dimensions
 from .decorators import approved_designer_required, can_manage_design
 from .forms import CustomizationOptionForm, DesignForm, MaterialRequirementForm
 from .models import Design, CustomizationOption
+from .search import filter_designs, get_design_facets, search_designs, suggest_designs
+from .utils import annotate_material_availability
 
 
 def design_list(request):
@@ -24,30 +27,60 @@ def design_list(request):
         return redirect("accounts:profile_setup")
     # Start with base query for published designs
     designs_query = Design.objects.filter(status="PUBLISHED")
-    
-    # Handle search functionality
-    search_query = request.GET.get('search', '')
+    ordering = ("-date_created", "-id")
+
+    # Full-text search over the indexed name, description and designer, best matches first
+    search_query = request.GET.get('search', '').strip()
     if search_query:
-        # Search in name, description, and designer's username
-        designs_query = designs_query.filter(
-            models.Q(name__icontains=search_query) | 
-            models.Q(description__icontains=search_query) | 
-            models.Q(designer__user__username__icontains=search_query)
+        designs_query = search_designs(designs_query, search_query)
+        ordering = ("-rank", "-id")
+
+    designs_query = filter_designs(
+        designs_query,
+        material=request.GET.get('material'),
+        price=request.GET.get('price'),
+        customizable=bool(request.GET.get('customizable')),
+    )
+    facets = get_design_facets(designs_query)
+
+    designs_query = annotate_material_availability(
+        designs_query.select_related("designer__user").prefetch_related(
+            "required_materials", "customization_options"
         )
-    
+    )
+
     # Paginate results
-    paginator = Paginator(designs_query, 12)  # Show 12 designs per page
-    page = request.GET.get("page")
-    designs = paginator.get_page(page)
-    
-    return render(request, "designs/design_list.html", {"designs": designs})
+    designs = paginate_keyset(request, designs_query, 12, ordering)  # Show 12 designs per page
+
+    return render(
+        request,
+        "designs/design_list.html",
+        {"designs": designs, "facets": facets, "search_query": search_query},
+    )
+
+
+def design_suggest(request):
+    """Autocomplete the design search box with the best matching design names"""
+    suggestions = suggest_designs(request.GET.get('q', ''))
+    return JsonResponse({
+        "results": [
+            {
+                "design_id": suggestion["design_id"],
+                "name": suggestion["name"],
+                "url": reverse("designs:design_detail", args=[suggestion["design_id"]]),
+            }
+            for suggestion in suggestions
+        ]
+    })
 
 
 def design_detail(request, design_id):
     # Get the design with all related data - use select_related for designer too
-    design_query = Design.objects.select_related('designer').prefetch_related(
-        'required_materials__dimensions',  # Prefetch dimensions to avoid N+1 queries
-        'customization_options'
+    design_query = annotate_material_availability(
+        Design.objects.select_related('designer').prefetch_related(
+            'required_materials__dimensions',  # Prefetch dimensions to avoid N+1 queries
+            'customization_options'
+        )
     )
     
     # Handle view permissions
@@ -211,6 +244,12 @@ def design_create(request):
                         options_formset.save()
                 
                 messages.success(request, "Design created successfully!", extra_tags='success swal')
+                if design.duplicate_of:
+                    messages.warning(
+                        request,
+                        f"This image looks like a duplicate of the image of {design.duplicate_of.name}.",
+                        extra_tags='warning swal'
+                    )
                 return redirect("designs:design_detail", design_id=design.design_id)
                 
             except Exception as e:
@@ -339,6 +378,10 @@ def design_edit(request, design_id):
                 design.customization_options.all().delete()
                 
             messages.success(request, "Design updated successfully!")
+            if design.duplicate_of:
+                messages.warning(
+                    request, f"This image looks like a duplicate of the image of {design.duplicate_of.name}."
+                )
             return redirect("designs:design_detail", design_id=design.design_id)
     else:
         form = DesignForm(instance=design)
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from .models import Dimensions, TextileWaste, WasteHistory
+from .models import CapacityLedger, Dimensions, ReportJob, TextileWaste, WasteHistory
 
 
 class WasteHistoryInline(admin.TabularInline):
@@ -94,3 +94,19 @@ class WasteHistoryAdmin(admin.ModelAdmin):
     search_fields = ("waste_item__waste_id", "notes")
     readonly_fields = ("waste_item", "status", "changed_by", "timestamp")
     ordering = ("-timestamp",)
+
+
+@admin.register(CapacityLedger)
+class CapacityLedgerAdmin(admin.ModelAdmin):
+    list_display = ("factory", "status", "total_quantity", "item_count", "last_updated")
+    list_filter = ("status", "factory")
+    readonly_fields = ("factory", "status", "total_quantity", "item_count", "last_updated")
+    ordering = ("factory", "status")
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "requested_by", "factory", "export_format", "start_date", "end_date", "status", "created_at", "finished_at")
+    list_filter = ("status", "export_format")
+    readonly_fields = ("cache_key", "artifact", "error", "created_at", "started_at", "finished_at")
+    ordering = ("-created_at",)
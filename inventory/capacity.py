@@ -0,0 +1,166 @@
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import CapacityLedger, TextileWaste
+
+logger = logging.getLogger(__name__)
+
+# Statuses that occupy storage space and count against a factory's capacity
+ACTIVE_STATUSES = ["AVAILABLE", "PENDING_REVIEW", "RESERVED"]
+
+
+def apply_capacity_delta(factory_id, status, quantity_delta, count_delta=0):
+    """Add a quantity/count delta to the ledger entry for a factory and status"""
+    if not factory_id or (not quantity_delta and not count_delta):
+        return
+
+    changes = {
+        "total_quantity": F("total_quantity") + quantity_delta,
+        "item_count": F("item_count") + count_delta,
+        "last_updated": timezone.now(),
+    }
+    entries = CapacityLedger.objects.filter(factory_id=factory_id, status=status)
+    if entries.update(**changes):
+        return
+
+    # Removals never create entries: a missing entry means there is nothing
+    # to subtract from (or the factory itself is being deleted).
+    if quantity_delta < 0 or count_delta < 0:
+        return
+
+    with transaction.atomic():
+        entry, created = CapacityLedger.objects.get_or_create(
+            factory_id=factory_id,
+            status=status,
+            defaults={"total_quantity": quantity_delta, "item_count": count_delta},
+        )
+        if not created:
+            CapacityLedger.objects.filter(pk=entry.pk).update(**changes)
+
+
+def record_waste_change(previous, current):
+    """Apply the ledger deltas for a waste row moving from one state to another.
+
+    ``previous`` and ``current`` are ``(factory_id, status, quantity)`` tuples,
+    or ``None`` when the row is being created or deleted respectively.
+    """
+    record_waste_changes([(previous, current)])
+
+
+def record_waste_changes(changes):
+    """Apply the combined ledger deltas for a batch of waste row changes.
+
+    ``changes`` is an iterable of ``(previous, current)`` pairs as accepted by
+    ``record_waste_change``; each ledger entry is touched at most once.
+    """
+    deltas = defaultdict(lambda: [0.0, 0])
+    for previous, current in changes:
+        if previous:
+            factory_id, status, quantity = previous
+            deltas[(factory_id, status)][0] -= quantity or 0
+            deltas[(factory_id, status)][1] -= 1
+        if current:
+            factory_id, status, quantity = current
+            deltas[(factory_id, status)][0] += quantity or 0
+            deltas[(factory_id, status)][1] += 1
+
+    # Touch entries in a stable order so concurrent writers cannot deadlock
+    for (factory_id, status), (quantity_delta, count_delta) in sorted(
+        deltas.items(), key=lambda item: (item[0][0] or 0, item[0][1] or "")
+    ):
+        apply_capacity_delta(factory_id, status, quantity_delta, count_delta)
+
+
+def get_capacity_usage(factory, statuses=ACTIVE_STATUSES):
+    """Get the stored quantity a factory holds across the given statuses"""
+    return (
+        CapacityLedger.objects.filter(factory=factory, status__in=statuses).aggregate(
+            total=Sum("total_quantity")
+        )["total"]
+        or 0
+    )
+
+
+def get_capacity_breakdown(factory):
+    """Get the ledger entries of a factory keyed by status"""
+    return {
+        entry["status"]: {"count": entry["item_count"], "total": entry["total_quantity"]}
+        for entry in CapacityLedger.objects.filter(
+            factory=factory, item_count__gt=0
+        ).values("status", "item_count", "total_quantity")
+    }
+
+
+def reconcile_capacity_ledger(factory=None, apply=True, tolerance=1e-6):
+    """Rebuild ledger entries from the waste table and report any drift.
+
+    Returns a list of dicts describing every entry whose stored totals did not
+    match the waste rows. When ``apply`` is true the entries are corrected.
+    """
+    with transaction.atomic():
+        ledger = CapacityLedger.objects.all()
+        waste = TextileWaste.objects.all()
+        if factory:
+            ledger = ledger.filter(factory=factory)
+            waste = waste.filter(factory=factory)
+
+        # Lock existing entries so concurrent deltas wait for the rebuild
+        stored = {
+            (entry.factory_id, entry.status): entry
+            for entry in ledger.select_for_update()
+        }
+        actual = {
+            (row["factory_id"], row["status"]): (row["total"] or 0, row["count"])
+            for row in waste.order_by()
+            .values("factory_id", "status")
+            .annotate(total=Sum("quantity"), count=Count("id"))
+        }
+
+        drift = []
+        for key in sorted(set(stored) | set(actual), key=lambda k: (k[0], k[1])):
+            entry = stored.get(key)
+            expected_total, expected_count = actual.get(key, (0, 0))
+            stored_total = entry.total_quantity if entry else 0
+            stored_count = entry.item_count if entry else 0
+
+            if (
+                abs(stored_total - expected_total) <= tolerance
+                and stored_count == expected_count
+            ):
+                continue
+
+            drift.append(
+                {
+                    "factory_id": key[0],
+                    "status": key[1],
+                    "stored_total": stored_total,
+                    "actual_total": expected_total,
+                    "stored_count": stored_count,
+                    "actual_count": expected_count,
+                }
+            )
+
+            if not apply:
+                continue
+            if entry:
+                entry.total_quantity = expected_total
+                entry.item_count = expected_count
+                entry.save(update_fields=["total_quantity", "item_count", "last_updated"])
+            else:
+                CapacityLedger.objects.create(
+                    factory_id=key[0],
+                    status=key[1],
+                    total_quantity=expected_total,
+                    item_count=expected_count,
+                )
+
+    if drift:
+        logger.warning(
+            f"Capacity ledger drift found in {len(drift)} entries"
+            f"{' (corrected)' if apply else ''}"
+        )
+    return drift
@@ -0,0 +1,168 @@
+"""Search over the available waste designers can build from.
+
+Designers narrow the available inventory down by facet values (material,
+type, colour and quality) and by quantity and dimension ranges. Facet
+counts are disjunctive: each facet is counted with every filter except its
+own applied, so the other values of a selected facet stay visible.
+"""
+from django.db.models import (
+    Case,
+    CharField,
+    Count,
+    F,
+    FloatField,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Abs, Cast, Greatest, Least
+
+from .models import TextileWaste
+
+# Request parameter and model field of every facet
+WASTE_FACETS = {
+    "material": "material",
+    "type": "type",
+    "color": "color",
+    "quality": "quality_grade",
+}
+
+# Request parameter prefix and model field of every range filter
+WASTE_RANGES = {
+    "quantity": "quantity",
+    "length": "dimensions__length",
+    "width": "dimensions__width",
+}
+
+QUALITY_RANKS = {"EXCELLENT": 3, "GOOD": 2, "FAIR": 1, "POOR": 0}
+
+# Score of each way a waste item can match a requirement; a perfect match scores 10
+MATCH_WEIGHTS = {
+    "material": 4.0,
+    "type": 2.0,
+    "color": 1.0,
+    "quality": 1.0,
+    "quantity": 1.0,
+    "size": 1.0,
+}
+
+
+def parse_waste_filters(params):
+    """Read facet values and ranges from a QueryDict, ignoring invalid bounds.
+
+    Facets take several values (``?material=Cotton&material=Linen``) and
+    ranges are given as ``min_<name>`` and ``max_<name>``.
+    """
+    filters = {"facets": {}, "ranges": {}}
+    for param in WASTE_FACETS:
+        values = [value for value in params.getlist(param) if value]
+        if values:
+            filters["facets"][param] = values
+    for name in WASTE_RANGES:
+        bounds = []
+        for bound in (params.get(f"min_{name}"), params.get(f"max_{name}")):
+            try:
+                bounds.append(float(bound) if bound not in (None, "") else None)
+            except ValueError:
+                bounds.append(None)
+        if bounds != [None, None]:
+            filters["ranges"][name] = tuple(bounds)
+    return filters
+
+
+def filter_available_waste(filters, exclude_facet=None):
+    """Get the available waste matching the filters, optionally leaving one facet out"""
+    queryset = TextileWaste.objects.filter(status="AVAILABLE")
+    for param, values in filters["facets"].items():
+        if param != exclude_facet:
+            queryset = queryset.filter(**{f"{WASTE_FACETS[param]}__in": values})
+    for name, (low, high) in filters["ranges"].items():
+        if low is not None:
+            queryset = queryset.filter(**{f"{WASTE_RANGES[name]}__gte": low})
+        if high is not None:
+            queryset = queryset.filter(**{f"{WASTE_RANGES[name]}__lte": high})
+    return queryset
+
+
+def get_waste_facets(filters):
+    """Count the available waste of every facet value in a single UNION query"""
+    branches = [
+        filter_available_waste(filters, exclude_facet=param)
+        .order_by()
+        .values(facet=Value(param, output_field=CharField()), value=F(field))
+        .annotate(count=Count("id"))
+        for param, field in WASTE_FACETS.items()
+    ]
+    facets = {param: [] for param in WASTE_FACETS}
+    for row in branches[0].union(*branches[1:], all=True):
+        facets[row["facet"]].append({"value": row["value"], "count": row["count"]})
+    for values in facets.values():
+        values.sort(key=lambda entry: (-entry["count"], entry["value"]))
+    return facets
+
+
+def _quality_rank(field="quality_grade"):
+    return Case(
+        *[When(**{field: grade}, then=Value(rank)) for grade, rank in QUALITY_RANKS.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _weight_if(condition, name):
+    return Case(When(condition, then=Value(MATCH_WEIGHTS[name])), default=Value(0.0))
+
+
+def closest_waste_matches(requirement, limit=5, quantity=None):
+    """Rank available waste by how closely it matches a required waste item.
+
+    Items sharing the requirement's material or type are candidates. Each
+    is scored on its material, type and colour matching, its quality grade
+    being close, its quantity covering ``quantity`` (the requirement's own
+    by default) and its area being close, and the best ``limit`` are
+    returned with their ``match_score``.
+    """
+    needed = max(quantity or requirement.quantity, 1e-9)
+    required_area = requirement.dimensions.length * requirement.dimensions.width
+    area = F("dimensions__length") * F("dimensions__width")
+    quality_gap = Abs(_quality_rank() - QUALITY_RANKS.get(requirement.quality_grade, 0))
+
+    score = (
+        _weight_if(Q(material=requirement.material), "material")
+        + _weight_if(Q(type=requirement.type), "type")
+        + _weight_if(Q(color__iexact=requirement.color), "color")
+        + MATCH_WEIGHTS["quality"] * (1 - Cast(quality_gap, FloatField()) / 3)
+        + MATCH_WEIGHTS["quantity"] * Least(F("quantity") / needed, Value(1.0))
+        + MATCH_WEIGHTS["size"]
+        * Least(area, Value(required_area))
+        / Greatest(area, Value(required_area), Value(1e-9))
+    )
+    return (
+        TextileWaste.objects.filter(status="AVAILABLE")
+        .filter(Q(material=requirement.material) | Q(type=requirement.type))
+        .exclude(pk=requirement.pk)
+        .select_related("dimensions", "factory__factory_details")
+        .annotate(match_score=Cast(score, FloatField()))
+        .order_by("-match_score", "-date_added", "-id")[:limit]
+    )
+
+
+def match_design_materials(design, limit=5):
+    """Get the closest available alternatives to each material a design requires.
+
+    Alternatives are scored on covering what one unit of the design consumes
+    of the material, as set in ``specifications["material_consumption"]``,
+    or the required item's whole quantity when no consumption is set.
+    """
+    consumption = (design.specifications or {}).get("material_consumption") or {}
+    matches = []
+    for material in design.required_materials.select_related("dimensions"):
+        quantity = consumption.get(material.waste_id)
+        if not isinstance(quantity, (int, float)) or quantity <= 0:
+            quantity = None
+        matches.append({
+            "requirement": material,
+            "matches": list(closest_waste_matches(material, limit, quantity=quantity)),
+        })
+    return matches
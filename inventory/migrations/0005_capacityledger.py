@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_capacity_ledger(apps, schema_editor):
+    TextileWaste = apps.get_model('inventory', 'TextileWaste')
+    CapacityLedger = apps.get_model('inventory', 'CapacityLedger')
+
+    totals = (
+        TextileWaste.objects.order_by()
+        .values('factory_id', 'status')
+        .annotate(total=Sum('quantity'), count=Count('id'))
+    )
+    CapacityLedger.objects.bulk_create([
+        CapacityLedger(
+            factory_id=row['factory_id'],
+            status=row['status'],
+            total_quantity=row['total'] or 0,
+            item_count=row['count'],
+        )
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+        ('inventory', '0004_alter_textilewaste_status_alter_wastehistory_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapacityLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('RESERVED', 'Reserved'), ('USED', 'Used'), ('RECYCLED', 'Recycled'), ('EXPIRED', 'Expired'), ('PENDING_REVIEW', 'Pending Review')], max_length=20)),
+                ('total_quantity', models.FloatField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_ledger', to='accounts.factorypartner')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('factory', 'status'), name='unique_capacity_ledger_entry')],
+            },
+        ),
+        migrations.RunPython(populate_capacity_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:21
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+        ('inventory', '0006_reportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(fields=['factory', 'status'], include=('quantity',), name='waste_factory_status'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(fields=['factory', '-date_added', '-id'], name='waste_factory_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(fields=['status', 'date_added'], name='waste_status_date_added'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(fields=['material', 'type', 'status'], name='waste_material_type_status'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(condition=models.Q(('status', 'AVAILABLE')), fields=['-date_added', '-id'], name='waste_available_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(condition=models.Q(('expiry_date__isnull', False), ('status', 'AVAILABLE')), fields=['expiry_date'], name='waste_available_expiry'),
+        ),
+        AddIndexConcurrently(
+            model_name='wastehistory',
+            index=models.Index(fields=['waste_item', '-timestamp'], name='waste_history_item_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='wastehistory',
+            index=models.Index(fields=['-timestamp'], name='waste_history_recent'),
+        ),
+    ]
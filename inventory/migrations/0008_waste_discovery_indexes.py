@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+        ('inventory', '0007_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(condition=models.Q(('status', 'AVAILABLE')), fields=['material', 'quantity'], include=('type', 'color', 'quality_grade'), name='waste_available_material'),
+        ),
+        AddIndexConcurrently(
+            model_name='textilewaste',
+            index=models.Index(condition=models.Q(('status', 'AVAILABLE')), fields=['type'], name='waste_available_type'),
+        ),
+    ]
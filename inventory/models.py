@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 
@@ -91,6 +91,16 @@ class TextileWaste(models.Model):
         self.sustainability_score = recycle_score * time_factor
         self.save()
 
+    def save(self, *args, **kwargs):
+        # Run inside a transaction so the capacity ledger update made by the
+        # save signals commits or rolls back together with the row itself.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.waste_id} - {self.material} ({self.status})"
 
@@ -101,6 +111,39 @@ class TextileWaste(models.Model):
             ("can_manage_inventory", "Can manage inventory"),
             ("can_view_analytics", "Can view inventory analytics"),
         ]
+        indexes = [
+            # Factory inventory by status; quantity is covered for capacity sums
+            models.Index(
+                fields=["factory", "status"], include=["quantity"], name="waste_factory_status"
+            ),
+            # Factory history and waste list pages, newest first
+            models.Index(fields=["factory", "-date_added", "-id"], name="waste_factory_recent"),
+            models.Index(fields=["status", "date_added"], name="waste_status_date_added"),
+            models.Index(fields=["material", "type", "status"], name="waste_material_type_status"),
+            # Only available waste is browsed by designers and checked for expiry
+            models.Index(
+                fields=["-date_added", "-id"],
+                condition=models.Q(status="AVAILABLE"),
+                name="waste_available_recent",
+            ),
+            models.Index(
+                fields=["expiry_date"],
+                condition=models.Q(status="AVAILABLE", expiry_date__isnull=False),
+                name="waste_available_expiry",
+            ),
+            # Waste discovery facets and closest matches, which pick candidates by material or type
+            models.Index(
+                fields=["material", "quantity"],
+                include=["type", "color", "quality_grade"],
+                condition=models.Q(status="AVAILABLE"),
+                name="waste_available_material",
+            ),
+            models.Index(
+                fields=["type"],
+                condition=models.Q(status="AVAILABLE"),
+                name="waste_available_type",
+            ),
+        ]
 
 
 class WasteHistory(models.Model):
@@ -117,3 +160,90 @@ class WasteHistory(models.Model):
     class Meta:
         ordering = ["-timestamp"]
         verbose_name_plural = "Waste histories"
+        indexes = [
+            models.Index(fields=["waste_item", "-timestamp"], name="waste_history_item_recent"),
+            # Factory activity feeds walk the newest entries and join to their waste items
+            models.Index(fields=["-timestamp"], name="waste_history_recent"),
+        ]
+
+
+class CapacityLedger(models.Model):
+    """Running totals of waste quantity held by a factory, per status.
+
+    Kept in step with ``TextileWaste`` by the signal handlers in
+    ``inventory.signals`` so capacity checks read a handful of rows instead
+    of summing the whole inventory.
+    """
+
+    factory = models.ForeignKey(
+        "accounts.FactoryPartner",
+        on_delete=models.CASCADE,
+        related_name="capacity_ledger",
+    )
+    status = models.CharField(max_length=20, choices=TextileWaste.WASTE_STATUS_CHOICES)
+    total_quantity = models.FloatField(default=0)
+    item_count = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.factory} - {self.status}: {self.total_quantity}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["factory", "status"], name="unique_capacity_ledger_entry"
+            )
+        ]
+
+
+class ReportJob(models.Model):
+    """A queued inventory report export, built by the ``run_report_worker`` command.
+
+    Jobs asking for the same factory, period and format over unchanged data
+    share a ``cache_key``, so the artifact is built once and reused.
+    """
+
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    ]
+    FORMAT_CHOICES = [
+        ("pdf", "PDF"),
+        ("excel", "Excel"),
+    ]
+
+    requested_by = models.ForeignKey(
+        "accounts.User", on_delete=models.CASCADE, related_name="report_jobs"
+    )
+    factory = models.ForeignKey(
+        "accounts.FactoryPartner",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="report_jobs",
+    )
+    start_date = models.DateField()
+    end_date = models.DateField()
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    cache_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    artifact = models.FileField(upload_to="reports/", blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Report {self.id} ({self.export_format}, {self.start_date} - {self.end_date}): {self.status}"
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"],
+                name="report_job_pending",
+                condition=models.Q(status="PENDING"),
+            )
+        ]
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from common.models import RollupWatermark
+from notifications.utils import send_notification
+
+from .models import ReportJob, TextileWaste
+from .utils import (
+    calculate_sustainability_impact,
+    export_report_as_excel,
+    export_report_as_pdf,
+    generate_waste_report,
+    get_trends_analysis,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_EXTENSIONS = {"pdf": "pdf", "excel": "xlsx"}
+
+# Running jobs not finished within this time are assumed lost and run again
+REPORT_JOB_TIMEOUT = timedelta(minutes=30)
+
+
+def get_report_watermark(factory=None):
+    """Describe the state of the data a report reads, changing whenever that data does"""
+    waste = TextileWaste.objects.all()
+    if factory:
+        waste = waste.filter(factory=factory)
+    state = waste.aggregate(items=Count("id"), last_updated=Max("last_updated"))
+    # Trends are read from the waste rollup, so its refreshes count too
+    rollup = RollupWatermark.objects.filter(name="waste").values_list("processed_until", flat=True).first()
+    return f"{state['items']}:{state['last_updated']}:{rollup}"
+
+
+def get_report_cache_key(factory, start_date, end_date, export_format):
+    """Build the content address of a report artifact"""
+    parts = [
+        str(factory.id if factory else "all"),
+        start_date.isoformat(),
+        end_date.isoformat(),
+        export_format,
+        get_report_watermark(factory),
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def request_report(user, factory, start_date, end_date, export_format):
+    """Queue a report export and return its job.
+
+    When a report over the same data was already built, the job is completed
+    straight away with that artifact and the worker is skipped.
+    """
+    cache_key = get_report_cache_key(factory, start_date, end_date, export_format)
+    job = ReportJob(
+        requested_by=user,
+        factory=factory,
+        start_date=start_date,
+        end_date=end_date,
+        export_format=export_format,
+        cache_key=cache_key,
+    )
+
+    cached = _find_cached_artifact(cache_key)
+    if cached:
+        job.artifact = cached
+        job.status = "DONE"
+        job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def _find_cached_artifact(cache_key):
+    """Get the name of an already built artifact for a cache key, if it still exists"""
+    name = (
+        ReportJob.objects.filter(cache_key=cache_key, status="DONE")
+        .exclude(artifact="")
+        .values_list("artifact", flat=True)
+        .first()
+    )
+    if name and default_storage.exists(name):
+        return name
+    return None
+
+
+def claim_report_job():
+    """Claim the oldest pending report job for this worker, or return None"""
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status="PENDING")
+                | Q(status="RUNNING", started_at__lt=timezone.now() - REPORT_JOB_TIMEOUT)
+            )
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = "RUNNING"
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def build_report_artifact(job):
+    """Render a job's report and store it under its cache key"""
+    start = timezone.make_aware(datetime.combine(job.start_date, time.min))
+    end = timezone.make_aware(datetime.combine(job.end_date, time.max))
+
+    report_data = generate_waste_report(start, end, job.factory)
+    report_data["environmental_impact"] = calculate_sustainability_impact(report_data)
+    report_data["trends"] = get_trends_analysis(start, end, job.factory)
+
+    name = f"reports/{job.cache_key}.{REPORT_EXTENSIONS[job.export_format]}"
+    if job.export_format == "pdf":
+        content = ContentFile(export_report_as_pdf(report_data))
+    else:
+        content = File(export_report_as_excel(report_data))
+    try:
+        # Storage may pick a new name when a concurrent worker got there first
+        return default_storage.save(name, content)
+    finally:
+        content.close()
+
+
+def run_report_job(job):
+    """Build a claimed job's artifact, reusing a cached one, and notify the requester"""
+    try:
+        job.artifact = _find_cached_artifact(job.cache_key) or build_report_artifact(job)
+        job.status = "DONE"
+        job.error = ""
+    except Exception as e:
+        logger.exception(f"Report job {job.id} failed")
+        job.status = "FAILED"
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["artifact", "status", "error", "finished_at"])
+
+    period = f"{job.start_date:%b %d, %Y} - {job.end_date:%b %d, %Y}"
+    if job.status == "DONE":
+        url = reverse("inventory:report_job_download", args=[job.id])
+        send_notification(
+            job.requested_by,
+            f"Your {job.get_export_format_display()} report for {period} is ready: {url}",
+            "success",
+        )
+    else:
+        send_notification(
+            job.requested_by,
+            f"Your {job.get_export_format_display()} report for {period} could not be generated.",
+            "error",
+        )
+    return job
+
+
+def run_pending_report_jobs(limit=None):
+    """Run pending report jobs one at a time and return how many were run"""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_report_job()
+        if job is None:
+            break
+        run_report_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,185 @@
+import logging
+import uuid
+from collections import OrderedDict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .capacity import get_capacity_usage, record_waste_changes
+from .models import Dimensions, TextileWaste, WasteHistory
+
+logger = logging.getLogger(__name__)
+
+
+def generate_reservation_id(waste_id):
+    """Generate a unique waste ID for a reserved portion of a waste lot"""
+    return f"{waste_id[:80]}_R{uuid.uuid4().hex[:12].upper()}"
+
+
+def _reservation_error(waste_id, requested, available, message):
+    return {
+        "waste_id": waste_id,
+        "requested": requested,
+        "available": available,
+        "message": message,
+    }
+
+
+def reserve_waste_batch(items, reserved_by=None):
+    """Reserve quantities from several waste lots in one all-or-nothing transaction.
+
+    ``items`` is an iterable of ``(waste_id, quantity)`` pairs; repeated waste
+    IDs are merged. The requested lots are locked with ``SELECT ... FOR UPDATE``
+    (in primary key order, so concurrent batches cannot deadlock) and nothing
+    is written unless every lot can cover its quantity.
+
+    Returns a dict with ``success``, ``message``, the created ``reservations``
+    and, on failure, the per-lot ``errors``.
+    """
+    requested = OrderedDict()
+    errors = []
+    for waste_id, quantity in items:
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            errors.append(
+                _reservation_error(waste_id, quantity, None, "Quantity must be positive")
+            )
+            continue
+        requested[waste_id] = requested.get(waste_id, 0) + quantity
+
+    if errors or not requested:
+        return {
+            "success": False,
+            "message": "Invalid reservation request" if errors else "Nothing to reserve",
+            "reservations": [],
+            "errors": errors,
+        }
+
+    with transaction.atomic():
+        wastes = {
+            waste.waste_id: waste
+            for waste in TextileWaste.objects.select_for_update(of=("self",))
+            .select_related("dimensions", "factory__factory_details")
+            .filter(waste_id__in=list(requested), status="AVAILABLE")
+            .order_by("id")
+        }
+
+        # Capacity is checked once per factory against the stored ledger
+        over_capacity = set()
+        for factory in {waste.factory for waste in wastes.values()}:
+            capacity = factory.factory_details.production_capacity
+            if capacity and get_capacity_usage(factory) > capacity:
+                over_capacity.add(factory.id)
+
+        for waste_id, quantity in requested.items():
+            waste = wastes.get(waste_id)
+            if waste is None:
+                errors.append(
+                    _reservation_error(waste_id, quantity, 0, "Waste lot is not available")
+                )
+            elif waste.factory_id in over_capacity:
+                errors.append(
+                    _reservation_error(
+                        waste_id, quantity, waste.quantity, "Factory is over capacity"
+                    )
+                )
+            elif waste.quantity < quantity:
+                errors.append(
+                    _reservation_error(
+                        waste_id,
+                        quantity,
+                        waste.quantity,
+                        f"Only {waste.quantity:.2f}{waste.unit} available",
+                    )
+                )
+
+        if errors:
+            return {
+                "success": False,
+                "message": f"{len(errors)} of {len(requested)} lots could not be reserved",
+                "reservations": [],
+                "errors": errors,
+            }
+
+        now = timezone.now()
+        dimensions = Dimensions.objects.bulk_create(
+            [
+                Dimensions(
+                    length=wastes[waste_id].dimensions.length,
+                    width=wastes[waste_id].dimensions.width,
+                    unit=wastes[waste_id].dimensions.unit,
+                )
+                for waste_id in requested
+            ]
+        )
+
+        reserved_items = []
+        ledger_changes = []
+        for (waste_id, quantity), reserved_dimensions in zip(requested.items(), dimensions):
+            waste = wastes[waste_id]
+            reserved_items.append(
+                TextileWaste(
+                    waste_id=generate_reservation_id(waste_id),
+                    type=waste.type,
+                    material=waste.material,
+                    quantity=quantity,
+                    unit=waste.unit,
+                    color=waste.color,
+                    dimensions=reserved_dimensions,
+                    quality_grade=waste.quality_grade,
+                    factory_id=waste.factory_id,
+                    status="RESERVED",
+                    sustainability_score=waste.sustainability_score,
+                    storage_location=waste.storage_location,
+                    batch_number=waste.batch_number,
+                )
+            )
+
+            previous = (waste.factory_id, waste.status, waste.quantity)
+            waste.quantity -= quantity
+            if waste.quantity <= 0:
+                waste.quantity = 0
+                waste.status = "USED"
+            waste.last_updated = now
+            ledger_changes.append((previous, (waste.factory_id, waste.status, waste.quantity)))
+            ledger_changes.append((None, (waste.factory_id, "RESERVED", quantity)))
+
+        # Bulk writes skip the save signals, so the ledger is updated explicitly
+        reserved_items = TextileWaste.objects.bulk_create(reserved_items)
+        TextileWaste.objects.bulk_update(
+            [wastes[waste_id] for waste_id in requested],
+            ["quantity", "status", "last_updated"],
+        )
+        record_waste_changes(ledger_changes)
+
+        WasteHistory.objects.bulk_create(
+            [
+                WasteHistory(
+                    waste_item=reserved,
+                    status="RESERVED",
+                    changed_by=reserved_by,
+                    notes=f"Reserved {reserved.quantity}{reserved.unit} from {waste_id}",
+                )
+                for waste_id, reserved in zip(requested, reserved_items)
+            ]
+        )
+
+    reservations = [
+        {
+            "waste_id": waste_id,
+            "reservation_id": reserved.waste_id,
+            "quantity": reserved.quantity,
+            "remaining": wastes[waste_id].quantity,
+        }
+        for waste_id, reserved in zip(requested, reserved_items)
+    ]
+    logger.info(f"Reserved {len(reservations)} waste lots: {[r['reservation_id'] for r in reservations]}")
+    return {
+        "success": True,
+        "message": f"Reserved {len(reservations)} waste lots",
+        "reservations": reservations,
+        "errors": [],
+    }
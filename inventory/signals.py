@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .capacity import record_waste_change
+from .models import TextileWaste
+
+
+@receiver(pre_save, sender=TextileWaste)
+def capture_previous_capacity_state(sender, instance, raw=False, **kwargs):
+    """Remember the stored factory/status/quantity before a waste row changes"""
+    instance._capacity_previous = None
+    if raw or instance.pk is None:
+        return
+
+    # Lock the row so concurrent saves compute their deltas one after another
+    instance._capacity_previous = (
+        sender.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values_list("factory_id", "status", "quantity")
+        .first()
+    )
+
+
+@receiver(post_save, sender=TextileWaste)
+def update_capacity_ledger(sender, instance, created, raw=False, **kwargs):
+    """Apply capacity ledger deltas for created or updated waste"""
+    if raw:
+        return
+    record_waste_change(
+        getattr(instance, "_capacity_previous", None),
+        (instance.factory_id, instance.status, instance.quantity),
+    )
+    instance._capacity_previous = None
+
+
+@receiver(post_delete, sender=TextileWaste)
+def release_capacity(sender, instance, **kwargs):
+    """Remove deleted waste from the capacity ledger"""
+    record_waste_change(
+        (instance.factory_id, instance.status, instance.quantity), None
+    )
@@ -1,3 +1,365 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import FactoryDetails, FactoryPartner
+from designs.models import Design
+from .capacity import get_capacity_usage, reconcile_capacity_ledger
+from .discovery import (
+    MATCH_WEIGHTS,
+    closest_waste_matches,
+    filter_available_waste,
+    get_waste_facets,
+    parse_waste_filters,
+)
+from notifications.models import Notification
+from .models import CapacityLedger, Dimensions, ReportJob, TextileWaste
+from .report_jobs import request_report, run_pending_report_jobs
+from .reservations import reserve_waste_batch
+from .utils import (
+    calculate_sustainability_impact,
+    export_report_as_excel,
+    generate_waste_report,
+    get_similar_waste_items,
+    reserve_waste,
+)
+
+User = get_user_model()
+
+
+class InventoryTestMixin:
+    def create_factory(self, username="factoryuser", capacity=1000):
+        user = User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="testpass123"
+        )
+        factory_details = FactoryDetails.objects.create(
+            factory_name=f"{username} Factory",
+            location="Test City",
+            production_capacity=capacity
+        )
+        return FactoryPartner.objects.create(user=user, factory_details=factory_details)
+
+    def create_waste(self, factory, waste_id, quantity, status="AVAILABLE", material="Cotton"):
+        return TextileWaste.objects.create(
+            waste_id=waste_id,
+            type="Fabric",
+            material=material,
+            quantity=quantity,
+            unit="kg",
+            color="White",
+            dimensions=Dimensions.objects.create(length=1.0, width=1.0, unit="m"),
+            quality_grade="GOOD",
+            status=status,
+            factory=factory
+        )
+
+
+class CapacityLedgerTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.details = self.factory.factory_details
+
+    def ledger_total(self, status):
+        entry = CapacityLedger.objects.filter(factory=self.factory, status=status).first()
+        return entry.total_quantity if entry else 0
+
+    def test_create_adds_to_ledger(self):
+        self.create_waste(self.factory, "WST-1", 100)
+        self.create_waste(self.factory, "WST-2", 50, status="PENDING_REVIEW")
+        self.create_waste(self.factory, "WST-3", 30, status="USED")
+
+        self.assertEqual(self.details.get_current_capacity_usage(), 150)
+        self.assertEqual(self.ledger_total("USED"), 30)
+        self.assertEqual(self.details.get_capacity_breakdown()["AVAILABLE"], {"count": 1, "total": 100})
+
+    def test_status_and_quantity_changes_move_totals(self):
+        waste = self.create_waste(self.factory, "WST-1", 100)
+
+        waste.quantity = 80
+        waste.save()
+        self.assertEqual(self.ledger_total("AVAILABLE"), 80)
+
+        waste.status = "USED"
+        waste.save()
+        self.assertEqual(self.ledger_total("AVAILABLE"), 0)
+        self.assertEqual(self.ledger_total("USED"), 80)
+        self.assertEqual(get_capacity_usage(self.factory), 0)
+
+    def test_delete_releases_capacity(self):
+        waste = self.create_waste(self.factory, "WST-1", 100)
+        waste.delete()
+        self.assertEqual(self.details.get_current_capacity_usage(), 0)
+        self.assertTrue(self.details.has_available_capacity(1000))
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.create_waste(self.factory, "WST-1", 100)
+        # Bulk updates bypass the signals and leave the ledger stale
+        TextileWaste.objects.filter(waste_id="WST-1").update(quantity=40)
+
+        drift = reconcile_capacity_ledger(apply=False)
+        self.assertEqual(len(drift), 1)
+        self.assertEqual(drift[0]["stored_total"], 100)
+        self.assertEqual(drift[0]["actual_total"], 40)
+        self.assertEqual(self.ledger_total("AVAILABLE"), 100)
+
+        reconcile_capacity_ledger()
+        self.assertEqual(self.ledger_total("AVAILABLE"), 40)
+        self.assertEqual(reconcile_capacity_ledger(), [])
+
+
+class WasteReservationTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.cotton = self.create_waste(self.factory, "WST-1", 100)
+        self.linen = self.create_waste(self.factory, "WST-2", 20, material="Linen")
+
+    def test_batch_reserves_all_lots(self):
+        result = reserve_waste_batch([("WST-1", 30), ("WST-2", 20), ("WST-1", 10)])
+
+        self.assertTrue(result["success"])
+        self.assertEqual(len(result["reservations"]), 2)
+        self.cotton.refresh_from_db()
+        self.linen.refresh_from_db()
+        self.assertEqual(self.cotton.quantity, 60)
+        self.assertEqual(self.linen.status, "USED")
+
+        reserved = TextileWaste.objects.filter(status="RESERVED")
+        self.assertEqual(sorted(w.quantity for w in reserved), [20, 40])
+        self.assertEqual(
+            {r["reservation_id"] for r in result["reservations"]},
+            set(reserved.values_list("waste_id", flat=True)),
+        )
+        self.assertEqual(reconcile_capacity_ledger(apply=False), [])
+
+    def test_batch_is_all_or_nothing(self):
+        result = reserve_waste_batch([("WST-1", 30), ("WST-2", 25)])
+
+        self.assertFalse(result["success"])
+        self.assertEqual([e["waste_id"] for e in result["errors"]], ["WST-2"])
+        self.cotton.refresh_from_db()
+        self.assertEqual(self.cotton.quantity, 100)
+        self.assertFalse(TextileWaste.objects.filter(status="RESERVED").exists())
+
+    def test_repeated_reservations_get_unique_ids(self):
+        self.assertTrue(reserve_waste("WST-1", 10))
+        self.assertTrue(reserve_waste("WST-1", 10))
+        self.assertFalse(reserve_waste("WST-3", 10))
+        self.assertEqual(TextileWaste.objects.filter(status="RESERVED").count(), 2)
+
+
+class WasteReportTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.create_waste(self.factory, "WST-1", 100)
+        self.create_waste(self.factory, "WST-2", 50, material="Linen")
+        self.create_waste(self.factory, "WST-3", 30, status="USED")
+        TextileWaste.objects.filter(waste_id="WST-1").update(sustainability_score=90)
+        TextileWaste.objects.filter(waste_id="WST-2").update(sustainability_score=60)
+        TextileWaste.objects.filter(waste_id="WST-3").update(sustainability_score=20)
+        self.start = timezone.now() - timedelta(days=1)
+        self.end = timezone.now() + timedelta(days=1)
+
+    def test_report_uses_two_queries(self):
+        with self.assertNumQueries(2):
+            report = generate_waste_report(self.start, self.end, self.factory)
+
+        self.assertEqual(report["total_items"], 3)
+        self.assertEqual(report["total_quantity"], 180)
+        self.assertEqual(report["total_weight"], 180)
+        self.assertEqual(report["avg_daily_intake"], 180)
+        self.assertEqual(
+            report["sustainability_metrics"],
+            {"average_score": 170 / 3, "high_impact": 1, "medium_impact": 1, "low_impact": 1},
+        )
+
+    def test_breakdowns_are_rolled_up(self):
+        report = generate_waste_report(self.start, self.end)
+
+        self.assertEqual(
+            report["status_breakdown"],
+            [
+                {"status": "AVAILABLE", "count": 2, "quantity": 150},
+                {"status": "USED", "count": 1, "quantity": 30},
+            ],
+        )
+        self.assertEqual(
+            report["material_breakdown"],
+            [
+                {"name": "Cotton", "quantity": 130, "items": 2, "avg_score": 55},
+                {"name": "Linen", "quantity": 50, "items": 1, "avg_score": 60},
+            ],
+        )
+        self.assertEqual(
+            report["quality_breakdown"], [{"quality_grade": "GOOD", "count": 3, "quantity": 180}]
+        )
+        self.assertEqual(report["waste_by_type"], [{"type": "Fabric", "total": 180}])
+        self.assertEqual(report["items"]().count(), 3)
+
+    def test_excel_export_streams_item_rows(self):
+        report = generate_waste_report(self.start, self.end, self.factory)
+        report["environmental_impact"] = calculate_sustainability_impact(report)
+
+        with export_report_as_excel(report) as output:
+            output.seek(0)
+            with zipfile.ZipFile(output) as workbook:
+                sheets = workbook.read("xl/workbook.xml").decode()
+                items = workbook.read("xl/worksheets/sheet6.xml").decode()
+
+        for name in ["Summary", "Status Breakdown", "Quality Analysis", "Items"]:
+            self.assertIn(f'name="{name}"', sheets)
+        # Constant-memory workbooks write strings inline in row order
+        self.assertLess(items.index("WST-1"), items.index("WST-2"))
+        self.assertLess(items.index("WST-2"), items.index("WST-3"))
+
+    def test_empty_period(self):
+        report = generate_waste_report(self.end, self.end + timedelta(days=1))
+
+        self.assertEqual(report["total_items"], 0)
+        self.assertEqual(report["total_quantity"], 0)
+        self.assertEqual(report["avg_daily_intake"], 0)
+        self.assertEqual(report["status_breakdown"], [])
+
+
+class ReportJobTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.factory = self.create_factory()
+        self.create_waste(self.factory, "WST-1", 100)
+        self.user = self.factory.user
+        self.today = timezone.localdate()
+
+    def test_worker_builds_artifact_and_notifies(self):
+        job = request_report(self.user, self.factory, self.today, self.today, "excel")
+        self.assertEqual(job.status, "PENDING")
+
+        self.assertEqual(run_pending_report_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "DONE")
+        self.assertEqual(job.artifact.name, f"reports/{job.cache_key}.xlsx")
+        with job.artifact.open("rb") as artifact:
+            self.assertEqual(artifact.read(2), b"PK")
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.notification_type, "success")
+        self.assertIn(reverse("inventory:report_job_download", args=[job.id]), notification.message)
+
+    def test_identical_requests_reuse_the_artifact(self):
+        first = request_report(self.user, self.factory, self.today, self.today, "pdf")
+        run_pending_report_jobs()
+
+        second = request_report(self.user, self.factory, self.today, self.today, "pdf")
+        self.assertEqual(second.status, "DONE")
+        self.assertEqual(second.artifact.name, ReportJob.objects.get(id=first.id).artifact.name)
+
+        # New data gives the report a new address
+        self.create_waste(self.factory, "WST-2", 20)
+        third = request_report(self.user, self.factory, self.today, self.today, "pdf")
+        self.assertEqual(third.status, "PENDING")
+        self.assertNotEqual(third.cache_key, first.cache_key)
+
+    def test_export_returns_a_job_immediately(self):
+        admin = User.objects.create_superuser(
+            username="reportadmin", email="reportadmin@example.com", password="testpass123"
+        )
+        self.client.force_login(admin)
+        params = {"start_date": self.today.isoformat(), "end_date": self.today.isoformat(), "format": "pdf"}
+
+        response = self.client.get(
+            reverse("inventory:export_report"), params, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(response.json()["status"], "PENDING")
+
+        run_pending_report_jobs()
+        status = self.client.get(reverse("inventory:report_job_status", args=[job_id])).json()
+        self.assertEqual(status["status"], "DONE")
+
+        download = self.client.get(status["download_url"])
+        self.assertEqual(b"".join(download.streaming_content)[:4], b"%PDF")
+
+        # Jobs are private to whoever asked for them
+        self.client.force_login(self.user)
+        self.assertEqual(
+            self.client.get(reverse("inventory:report_job_status", args=[job_id])).status_code, 404
+        )
+
+
+class WasteDiscoveryTest(InventoryTestMixin, TestCase):
+    def setUp(self):
+        self.factory = self.create_factory()
+        self.required = self.create_waste(self.factory, "WST-REQ", 10, status="USED")
+        self.exact = self.create_waste(self.factory, "WST-EXACT", 12)
+        self.small = self.create_waste(self.factory, "WST-SMALL", 2)
+        self.other_color = self.create_waste(self.factory, "WST-BLUE", 12)
+        TextileWaste.objects.filter(pk=self.other_color.pk).update(color="Blue", quality_grade="POOR")
+        self.linen = self.create_waste(self.factory, "WST-LINEN", 30, material="Linen")
+        self.create_waste(self.factory, "WST-GONE", 50, status="RECYCLED")
+
+    def test_facet_counts_leave_their_own_selection_out(self):
+        filters = parse_waste_filters(QueryDict("material=Linen&min_quantity=5&max_length=oops"))
+        self.assertEqual(filters, {"facets": {"material": ["Linen"]}, "ranges": {"quantity": (5.0, None)}})
+        self.assertEqual(list(filter_available_waste(filters)), [self.linen])
+
+        with self.assertNumQueries(1):
+            facets = get_waste_facets(filters)
+        # Materials are counted as if no material was selected, the rest within Linen
+        self.assertEqual(
+            facets["material"], [{"value": "Cotton", "count": 2}, {"value": "Linen", "count": 1}]
+        )
+        self.assertEqual(facets["color"], [{"value": "White", "count": 1}])
+        self.assertEqual(facets["quality"], [{"value": "GOOD", "count": 1}])
+
+    def test_closest_matches_are_ranked(self):
+        matches = list(closest_waste_matches(self.required))
+        # A short lot of the right colour and grade beats a full lot of neither
+        self.assertEqual(matches, [self.exact, self.small, self.other_color, self.linen])
+        self.assertAlmostEqual(matches[0].match_score, sum(MATCH_WEIGHTS.values()))
+        self.assertEqual(list(get_similar_waste_items(self.required, limit=1)), [self.exact])
+
+        # Needing less of the material makes the small lot cover it
+        small_first = closest_waste_matches(self.required, quantity=2)
+        self.assertEqual(small_first[0].match_score, small_first[1].match_score)
+
+    def test_designer_endpoints(self):
+        designer_user = User.objects.create_user(
+            username="wastedesigner", email="wastedesigner@example.com", user_type="DESIGNER"
+        )
+        designer_user.designer.is_approved = True
+        designer_user.designer.save()
+        design = Design.objects.create(
+            design_id="DSG-MATCH", name="Match", description="Match", designer=designer_user.designer,
+            price=10,
+        )
+        design.required_materials.add(self.required)
+        self.client.force_login(designer_user)
+
+        response = self.client.get(reverse("inventory:designer_waste_search"), {"material": "Cotton"})
+        data = response.json()
+        self.assertEqual({result["id"] for result in data["results"]}, {"WST-EXACT", "WST-SMALL", "WST-BLUE"})
+        self.assertEqual(len(data["facets"]["material"]), 2)
+        self.assertIsNone(data["next_cursor"])
+
+        response = self.client.get(reverse("inventory:designer_waste_matches", args=["DSG-MATCH"]), {"limit": 2})
+        materials = response.json()["materials"]
+        self.assertEqual(materials[0]["requirement"]["id"], "WST-REQ")
+        self.assertEqual([match["id"] for match in materials[0]["matches"]], ["WST-EXACT", "WST-SMALL"])
+
+        response = self.client.get(reverse("inventory:designer_waste_list"), {"design": "DSG-MATCH", "quality": "GOOD"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["waste_items"]), 3)
+        self.assertEqual(response.context["material_matches"][0]["matches"][0], self.exact)
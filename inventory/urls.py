@@ -22,6 +22,8 @@ urlpatterns = [
     path("reports/", views.inventory_reports, name="reports"),
     # Removed the non-existent generate_report view
     path("reports/export/", views.export_report, name="export_report"),
+    path("reports/jobs/<int:job_id>/", views.report_job_status, name="report_job_status"),
+    path("reports/jobs/<int:job_id>/download/", views.report_job_download, name="report_job_download"),
     # Factory Views
     path("factory/inventory/", views.factory_inventory, name="factory_inventory"),
     path("factory/history/", views.factory_history, name="factory_history"),
@@ -36,4 +38,10 @@ urlpatterns = [
     # Designer views
     path("designer/waste-list/", views.designer_waste_list, name="designer_waste_list"),
     path("designer/waste/", views.designer_waste_list, name="designer_waste_list"),
+    path("designer/waste/search/", views.designer_waste_search, name="designer_waste_search"),
+    path(
+        "designer/waste/matches/<str:design_id>/",
+        views.designer_waste_matches,
+        name="designer_waste_matches",
+    ),
 ]
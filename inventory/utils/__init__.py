@@ -1,12 +1,16 @@
 from datetime import timedelta
 from io import BytesIO
 
-import pandas as pd
-from django.db.models import Avg, Count, Sum
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from reportlab.pdfgen import canvas
 
-from .models import TextileWaste
+from common.exports import EXPORT_CHUNK_SIZE, open_streaming_workbook, write_sheet_rows
+
+from ..discovery import closest_waste_matches
+from ..models import TextileWaste
+from ..reservations import reserve_waste_batch
 
 
 def get_available_waste_stats():
@@ -36,41 +40,9 @@ def check_waste_availability(waste_id, required_quantity):
         return False
 
 
-def reserve_waste(waste_id, quantity):
+def reserve_waste(waste_id, quantity, reserved_by=None):
     """Reserve a specific quantity of waste for an order"""
-    try:
-        waste = TextileWaste.objects.get(waste_id=waste_id, status="AVAILABLE")
-        factory = waste.factory
-
-        # Check factory capacity
-        if not factory.factory_details.has_available_capacity():
-            return False
-
-        if waste.quantity >= quantity:
-            # Create new waste entry for reserved portion
-            reserved_waste = TextileWaste.objects.create(
-                waste_id=f"{waste_id}_R{timezone.now().strftime('%Y%m%d%H%M')}",
-                type=waste.type,
-                material=waste.material,
-                quantity=quantity,
-                unit=waste.unit,
-                color=waste.color,
-                dimensions=waste.dimensions,
-                quality_grade=waste.quality_grade,
-                factory=factory,
-                status="RESERVED",
-            )
-
-            # Update original waste quantity
-            waste.quantity -= quantity
-            if waste.quantity == 0:
-                waste.status = "USED"
-            waste.save()
-
-            return True
-    except TextileWaste.DoesNotExist:
-        pass
-    return False
+    return reserve_waste_batch([(waste_id, quantity)], reserved_by=reserved_by)["success"]
 
 
 def calculate_storage_efficiency(factory=None):
@@ -192,63 +164,99 @@ def get_expiring_inventory(days=30, factory=None):
     return queryset.order_by("expiry_date")
 
 
+# Scalar report metrics, all computed by a single conditional-aggregation query
+REPORT_AGGREGATES = {
+    "total_items": Count("id"),
+    "total_quantity": Sum("quantity"),
+    "active_days": Count(TruncDate("date_added"), distinct=True),
+    "average_score": Avg("sustainability_score"),
+    "high_impact": Count("id", filter=Q(sustainability_score__gte=80)),
+    "medium_impact": Count("id", filter=Q(sustainability_score__range=[50, 79])),
+    "low_impact": Count("id", filter=Q(sustainability_score__lt=50)),
+}
+
+# Dimensions the report is broken down by, rolled up from one GROUP BY query
+REPORT_DIMENSIONS = ["status", "material", "quality_grade", "type"]
+
+
+def _rollup_report_groups(groups, dimension):
+    """Fold fine-grained report groups into totals for a single dimension"""
+    totals = {}
+    for group in groups:
+        entry = totals.setdefault(
+            group[dimension], {"count": 0, "quantity": 0, "score_total": 0}
+        )
+        entry["count"] += group["count"]
+        entry["quantity"] += group["quantity"] or 0
+        entry["score_total"] += group["score_total"] or 0
+    return sorted(totals.items(), key=lambda item: str(item[0]))
+
+
 def generate_waste_report(start_date, end_date, factory=None):
-    """Generate a comprehensive waste report for the given period"""
+    """Generate a comprehensive waste report for the given period.
+
+    Scalar metrics come from one aggregate query and every breakdown from one
+    GROUP BY over ``REPORT_DIMENSIONS``. ``items`` is a callable returning the
+    item queryset, so rows are only fetched by renderers that need them.
+    """
     queryset = TextileWaste.objects.filter(date_added__range=[start_date, end_date])
     if factory:
         queryset = queryset.filter(factory=factory)
 
-    # Material breakdown as a list of dicts for template rendering
-    material_breakdown = []
-    for entry in queryset.values("material").annotate(
-        quantity=Sum("quantity"),
-        items=Count("id"),
-        avg_score=Avg("sustainability_score")
-    ):
-        material_breakdown.append({
-            "name": entry["material"],
-            "quantity": entry["quantity"],
-            "items": entry["items"],
-            "avg_score": entry["avg_score"],
-        })
-
-    report = {
+    totals = queryset.aggregate(**REPORT_AGGREGATES)
+    groups = list(
+        queryset.order_by()
+        .values(*REPORT_DIMENSIONS)
+        .annotate(
+            count=Count("id"),
+            quantity=Sum("quantity"),
+            score_total=Sum("sustainability_score"),
+        )
+    )
+
+    total_quantity = totals["total_quantity"] or 0
+    return {
         "period": {"start": start_date, "end": end_date},
-        "total_items": queryset.count(),
-        "total_quantity": queryset.aggregate(total=Sum("quantity"))["total"] or 0,
-        "total_weight": queryset.aggregate(total=Sum("quantity"))["total"] or 0,  # For compatibility
-        "avg_daily_intake": queryset.values("date_added__date")
-            .annotate(daily_total=Sum("quantity"))
-            .aggregate(Avg("daily_total"))["daily_total__avg"] or 0,
-        "status_breakdown": list(queryset.values("status").annotate(
-            count=Count("id"), quantity=Sum("quantity")
-        )),
-        "material_breakdown": material_breakdown,
-        "quality_breakdown": list(queryset.values("quality_grade").annotate(
-            count=Count("id"), quantity=Sum("quantity")
-        )),
+        "total_items": totals["total_items"],
+        "total_quantity": total_quantity,
+        "total_weight": total_quantity,  # For compatibility
+        "avg_daily_intake": total_quantity / totals["active_days"]
+        if totals["active_days"]
+        else 0,
+        "status_breakdown": [
+            {"status": status, "count": entry["count"], "quantity": entry["quantity"]}
+            for status, entry in _rollup_report_groups(groups, "status")
+        ],
+        "material_breakdown": [
+            {
+                "name": material,
+                "quantity": entry["quantity"],
+                "items": entry["count"],
+                "avg_score": entry["score_total"] / entry["count"],
+            }
+            for material, entry in _rollup_report_groups(groups, "material")
+        ],
+        "quality_breakdown": [
+            {"quality_grade": grade, "count": entry["count"], "quantity": entry["quantity"]}
+            for grade, entry in _rollup_report_groups(groups, "quality_grade")
+        ],
         "sustainability_metrics": {
-            "average_score": queryset.aggregate(avg=Avg("sustainability_score"))["avg"] or 0,
-            "high_impact": queryset.filter(sustainability_score__gte=80).count(),
-            "medium_impact": queryset.filter(sustainability_score__range=[50, 79]).count(),
-            "low_impact": queryset.filter(sustainability_score__lt=50).count(),
+            "average_score": totals["average_score"] or 0,
+            "high_impact": totals["high_impact"],
+            "medium_impact": totals["medium_impact"],
+            "low_impact": totals["low_impact"],
         },
-        "items": queryset,
-        "waste_by_type": list(queryset.values("type").annotate(total=Sum("quantity"))),
+        "items": lambda: queryset.select_related("factory__factory_details", "dimensions"),
+        "waste_by_type": [
+            {"type": waste_type, "total": entry["quantity"]}
+            for waste_type, entry in _rollup_report_groups(groups, "type")
+        ],
     }
 
-    return report
-
 
 def get_similar_waste_items(waste_item, limit=5):
-    """Find similar waste items based on material and type"""
-    return (
-        TextileWaste.objects.filter(
-            status="AVAILABLE", material=waste_item.material, type=waste_item.type
-        )
-        .exclude(id=waste_item.id)
-        .order_by("-sustainability_score")[:limit]
-    )
+    """Find the available waste items closest to a waste item, best match first"""
+    return closest_waste_matches(waste_item, limit)
 
 
 def export_report_as_pdf(report_data):
@@ -346,104 +354,85 @@ def make_timezone_naive(data):
     return result
 
 
+# Columns of the item-level sheet and the fields they are read from
+REPORT_ITEM_COLUMNS = [
+    ("Waste ID", "waste_id"),
+    ("Factory", "factory__factory_details__factory_name"),
+    ("Type", "type"),
+    ("Material", "material"),
+    ("Quality Grade", "quality_grade"),
+    ("Quantity", "quantity"),
+    ("Unit", "unit"),
+    ("Status", "status"),
+    ("Sustainability Score", "sustainability_score"),
+    ("Date Added", "date_added"),
+]
+
+
 def export_report_as_excel(report_data):
-    """Generate Excel report"""
-    from io import BytesIO
-    import pandas as pd
-    import copy
-    import datetime
+    """Generate Excel report.
+
+    The workbook is written in constant-memory mode to a temporary file and
+    item rows are streamed from the database in chunks, so memory stays
+    bounded however long the period is. Returns the closed file, which the
+    caller sends with ``excel_file_response``.
+    """
+    workbook, output = open_streaming_workbook()
+    header_format = workbook.add_format({"bold": True})
+
+    def add_sheet(name, headers, rows):
+        worksheet = workbook.add_worksheet(name)
+        worksheet.set_column(0, 20, 15)  # Set width for all columns
+        worksheet.freeze_panes(1, 0)  # Freeze the first row
+        worksheet.write_row(0, 0, headers, header_format)
+        write_sheet_rows(worksheet, 1, rows)
+        return worksheet
+
+    add_sheet(
+        "Summary",
+        ["Metric", "Value"],
+        [
+            ["Total Items", report_data["total_items"]],
+            ["Total Weight (kg)", report_data["total_weight"]],
+            ["Avg Daily Intake (kg)", report_data["avg_daily_intake"]],
+        ],
+    )
 
-    # Create Excel writer
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        workbook = writer.book
-
-        # Summary sheet
-        summary_data = {
-            "Metric": ["Total Items", "Total Weight (kg)", "Avg Daily Intake (kg)"],
-            "Value": [
-                report_data["total_items"],
-                report_data["total_weight"],
-                report_data["avg_daily_intake"],
-            ],
-        }
-        summary_df = pd.DataFrame(summary_data)
-        summary_df.to_excel(writer, sheet_name="Summary", index=False)
-
-        # Environmental Impact sheet
-        impact = report_data["environmental_impact"]
-        impact_data = {
-            "Metric": [
-                "CO2 Saved (kg)",
-                "Water Saved (L)",
-                "Landfill Space Reduced (m³)",
-            ],
-            "Value": [
-                impact["co2_saved"],
-                impact["water_saved"],
-                impact["landfill_reduced"],
-            ],
-        }
-        pd.DataFrame(impact_data).to_excel(
-            writer, sheet_name="Environmental Impact", index=False
+    impact = report_data["environmental_impact"]
+    add_sheet(
+        "Environmental Impact",
+        ["Metric", "Value"],
+        [
+            ["CO2 Saved (kg)", impact["co2_saved"]],
+            ["Water Saved (L)", impact["water_saved"]],
+            ["Landfill Space Reduced (m³)", impact["landfill_reduced"]],
+        ],
+    )
+
+    breakdown_sheets = [
+        ("status_breakdown", "Status Breakdown"),
+        ("material_breakdown", "Material Breakdown"),
+        ("quality_breakdown", "Quality Analysis"),
+    ]
+    for key, name in breakdown_sheets:
+        if key in report_data:
+            breakdown = list(report_data[key])
+            headers = list(breakdown[0]) if breakdown else []
+            add_sheet(name, headers, ([row[h] for h in headers] for row in breakdown))
+
+    # Item rows go straight from a server-side cursor into the sheet
+    if "items" in report_data:
+        items = report_data["items"]()
+        add_sheet(
+            "Items",
+            [header for header, _ in REPORT_ITEM_COLUMNS],
+            items.order_by("date_added", "id")
+            .values_list(*[field for _, field in REPORT_ITEM_COLUMNS])
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE),
         )
 
-        # Status breakdown sheet
-        if "status_breakdown" in report_data:
-            # Convert QuerySet to list of dicts and handle datetime objects
-            status_data = []
-            for item in report_data["status_breakdown"]:
-                row = {}
-                for key, value in item.items():
-                    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
-                        row[key] = value.replace(tzinfo=None)
-                    else:
-                        row[key] = value
-                status_data.append(row)
-            
-            status_df = pd.DataFrame(status_data)
-            status_df.to_excel(writer, sheet_name="Status Breakdown", index=False)
-
-        # Material breakdown sheet
-        if "material_breakdown" in report_data:
-            # Convert QuerySet to list of dicts and handle datetime objects
-            material_data = []
-            for item in report_data["material_breakdown"]:
-                row = {}
-                for key, value in item.items():
-                    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
-                        row[key] = value.replace(tzinfo=None)
-                    else:
-                        row[key] = value
-                material_data.append(row)
-                
-            material_df = pd.DataFrame(material_data)
-            material_df.to_excel(writer, sheet_name="Material Breakdown", index=False)
-
-        # Quality breakdown sheet
-        if "quality_breakdown" in report_data:
-            # Convert QuerySet to list of dicts and handle datetime objects
-            quality_data = []
-            for item in report_data["quality_breakdown"]:
-                row = {}
-                for key, value in item.items():
-                    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
-                        row[key] = value.replace(tzinfo=None)
-                    else:
-                        row[key] = value
-                quality_data.append(row)
-                
-            quality_df = pd.DataFrame(quality_data)
-            quality_df.to_excel(writer, sheet_name="Quality Analysis", index=False)
-
-        # Format workbook - using a simpler approach
-        # Just set column width and freeze the headers
-        for sheet in writer.sheets:
-            worksheet = writer.sheets[sheet]
-            worksheet.set_column(0, 20, 15)  # Set width for all columns
-            worksheet.freeze_panes(1, 0)  # Freeze the first row
-
-    return output.getvalue()
+    workbook.close()
+    return output
 
 
 def calculate_sustainability_impact(report_data):
@@ -478,38 +467,34 @@ def calculate_sustainability_impact(report_data):
 
 def get_trends_analysis(start_date, end_date, factory=None):
     """Analyze trends in waste management over time"""
-    from django.db.models import Avg, Count
+    from django.db.models import Sum
     from django.db.models.functions import TruncWeek
 
-    from .models import TextileWaste
+    from common.rollups import rollup_queryset
 
-    queryset = TextileWaste.objects.filter(date_added__range=[start_date, end_date])
+    queryset = rollup_queryset("waste", start_date, end_date)
 
     if factory:
         queryset = queryset.filter(factory=factory)
 
+    avg_sustainability = Sum("score_total") / Sum("item_count")
+
     weekly_trends = (
-        queryset.annotate(week=TruncWeek("date_added"))
+        queryset.annotate(week=TruncWeek("date"))
         .values("week")
-        .annotate(
-            items_count=Count("id"), avg_sustainability=Avg("sustainability_score")
-        )
+        .annotate(items_count=Sum("item_count"), avg_sustainability=avg_sustainability)
         .order_by("week")
     )
 
     material_trends = (
         queryset.values("material")
-        .annotate(
-            total_items=Count("id"), avg_sustainability=Avg("sustainability_score")
-        )
+        .annotate(total_items=Sum("item_count"), avg_sustainability=avg_sustainability)
         .order_by("-total_items")
     )
 
     quality_trends = (
         queryset.values("quality_grade")
-        .annotate(
-            total_items=Count("id"), avg_sustainability=Avg("sustainability_score")
-        )
+        .annotate(total_items=Sum("item_count"), avg_sustainability=avg_sustainability)
         .order_by("quality_grade")
     )
 
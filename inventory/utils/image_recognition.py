@@ -1,85 +1,85 @@
-import os
-from pathlib import Path
-import numpy as np
-from PIL import Image
+from common.images import DEFECT_GRID, analyze_image, analyze_images
+
+# Lowest quality score of each grade, best grade first
+QUALITY_GRADE_THRESHOLDS = [("EXCELLENT", 0.85), ("GOOD", 0.7), ("FAIR", 0.5), ("POOR", 0.0)]
+
 
 class WasteImageRecognition:
+    """Analysis of textile waste photos.
+
+    Every method reads the features ``common.images`` computes once per
+    file, so analysing, grading and checking an upload for defects decodes
+    it a single time. Use ``analyze_batch`` for many photos at once.
+    """
+
     @staticmethod
-    def preprocess_image(image_path):
-        """Preprocess textile waste image for recognition model"""
-        try:
-            img = Image.open(image_path)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            # Standardize size for waste analysis
-            img = img.resize((299, 299))  # Using larger size for waste analysis
-            # Normalize the image
-            img_array = np.array(img) / 255.0
-            return img_array
-        except Exception as e:
-            print(f"Error preprocessing waste image: {e}")
-            return None
+    def _quality(features):
+        damage_score = len(features["defects"]) / DEFECT_GRID ** 2
+        quality_score = (features["color_consistency"] + (1 - damage_score)) / 2
+        return {
+            'color_consistency': features["color_consistency"],
+            'damage_score': round(damage_score, 4),
+            'sharpness': features["texture"]["sharpness"],
+            'quality_score': round(quality_score, 4),
+            'estimated_quality': next(
+                grade for grade, threshold in QUALITY_GRADE_THRESHOLDS if quality_score >= threshold
+            ),
+        }
+
+    @staticmethod
+    def _defects(features):
+        return {
+            'has_defects': bool(features["defects"]),
+            # Darker patches are stains or holes against the fabric, lighter ones fading
+            'defect_types': [
+                'stain' if defect["deviation"] < 0 else 'discoloration' for defect in features["defects"]
+            ],
+            'defect_locations': [(defect["row"], defect["column"]) for defect in features["defects"]],
+            'severity_scores': [abs(defect["deviation"]) for defect in features["defects"]],
+        }
+
+    @staticmethod
+    def _analysis(features):
+        return {
+            'dominant_colors': features["dominant_colors"],
+            'color_histogram': features["color_histogram"],
+            'texture': features["texture"],
+            'phash': features["phash"],
+            'estimated_quality': WasteImageRecognition._quality(features)['estimated_quality'],
+        }
 
     @staticmethod
     def analyze_waste(image_path):
-        """Analyze textile waste image for material classification"""
-        try:
-            processed_img = WasteImageRecognition.preprocess_image(image_path)
-            if processed_img is None:
-                return None
-            
-            # Placeholder for waste classification model
-            # Will implement actual model inference here
-            results = {
-                'material_type': 'cotton',
-                'condition_score': 0.85,
-                'reusability_score': 0.75,
-                'contamination_detected': False,
-                'estimated_quality': 'good'
-            }
-            return results
-        except Exception as e:
-            print(f"Error analyzing waste: {e}")
+        """Analyze textile waste image colours, texture and likely quality grade"""
+        analysed = analyze_image(image_path)
+        if analysed is None:
             return None
+        return WasteImageRecognition._analysis(analysed.features)
 
     @staticmethod
     def assess_quality(image_path):
         """Assess textile waste quality through image analysis"""
-        try:
-            processed_img = WasteImageRecognition.preprocess_image(image_path)
-            if processed_img is None:
-                return None
-            
-            # Placeholder for quality assessment
-            # Will implement actual quality analysis here
-            quality_metrics = {
-                'fiber_integrity': 0.9,
-                'color_consistency': 0.85,
-                'damage_score': 0.1,
-                'cleanliness_score': 0.95
-            }
-            return quality_metrics
-        except Exception as e:
-            print(f"Error assessing quality: {e}")
+        analysed = analyze_image(image_path)
+        if analysed is None:
             return None
+        return WasteImageRecognition._quality(analysed.features)
 
     @staticmethod
     def detect_defects(image_path):
         """Detect defects in textile waste materials"""
-        try:
-            processed_img = WasteImageRecognition.preprocess_image(image_path)
-            if processed_img is None:
-                return None
-            
-            # Placeholder for defect detection
-            # Will implement actual defect detection here
-            defects = {
-                'has_defects': False,
-                'defect_types': [],
-                'defect_locations': [],
-                'severity_scores': []
+        analysed = analyze_image(image_path)
+        if analysed is None:
+            return None
+        return WasteImageRecognition._defects(analysed.features)
+
+    @staticmethod
+    def analyze_batch(image_paths):
+        """Analyse, grade and check many waste images at once, keyed by path"""
+        return {
+            path: None if analysed is None else {
+                'analysis': WasteImageRecognition._analysis(analysed.features),
+                'quality': WasteImageRecognition._quality(analysed.features),
+                'defects': WasteImageRecognition._defects(analysed.features),
             }
-            return defects
-        except Exception as e:
-            print(f"Error detecting defects: {e}")
-            return None
\ No newline at end of file
+            for path, analysed in analyze_images(image_paths).items()
+        }
@@ -2,26 +2,34 @@ from datetime import datetime, timedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
-from django.core.paginator import Paginator
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count, Sum, Avg
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 
 from .decorators import factory_required, inventory_manager_required
+from .discovery import (
+    filter_available_waste,
+    get_waste_facets,
+    match_design_materials,
+    parse_waste_filters,
+)
 from .forms import DimensionsForm, TextileWasteForm, WasteReviewForm
-from .models import TextileWaste, WasteHistory
+from .models import ReportJob, TextileWaste, WasteHistory
+from .report_jobs import REPORT_EXTENSIONS, request_report
 from .utils import (
     calculate_storage_efficiency,
     calculate_sustainability_impact,
-    export_report_as_excel,
-    export_report_as_pdf,
     generate_waste_report,
     get_expiring_inventory,
     get_inventory_metrics,
     get_trends_analysis,
 )
+from common.pagination import paginate_keyset
+from common.rollups import query_rollup, rollup_queryset
+from common.timeseries import get_time_series
 from designs.decorators import approved_designer_required
 
 
@@ -39,9 +47,7 @@ def waste_list(request):
         waste_items = waste_items.filter(factory=request.user.factorypartner)
 
     # Pagination
-    paginator = Paginator(waste_items, 10)
-    page = request.GET.get("page")
-    waste_items = paginator.get_page(page)
+    waste_items = paginate_keyset(request, waste_items, 10, ("-date_added", "-id"))
 
     return render(
         request,
@@ -115,30 +121,33 @@ def upload_waste(request):
             # Track old usage for logging
             old_usage = validation["current_usage"]
 
-            waste = waste_form.save(commit=False)
-            dimensions = dimensions_form.save()
-            waste.dimensions = dimensions
-            waste.factory = factory
+            from notifications.utils import send_notification
+            from django.contrib.auth import get_user_model
 
-            # Auto-calculate sustainability score
-            waste.sustainability_score = waste.calculate_recycle_potential()
-            waste.save()
+            # Save the waste and queue the admin notification in one transaction
+            with transaction.atomic():
+                waste = waste_form.save(commit=False)
+                dimensions = dimensions_form.save()
+                waste.dimensions = dimensions
+                waste.factory = factory
+
+                # Auto-calculate sustainability score
+                waste.sustainability_score = waste.calculate_recycle_potential()
+                waste.save()
+
+                # Send notification to admin when waste is uploaded
+                admin_user = get_user_model().objects.filter(is_superuser=True).first()
+                if admin_user:
+                    send_notification(
+                        admin_user,
+                        f"New waste item '{waste.material}' uploaded by {request.user.username}.",
+                        notification_type='info'
+                    )
 
             # Log capacity change
             new_usage = factory.factory_details.get_current_capacity_usage()
             log_capacity_change(factory, old_usage, new_usage, "waste_upload")
 
-            # Send notification to admin when waste is uploaded
-            from notifications.utils import send_notification
-            from django.contrib.auth import get_user_model
-            admin_user = get_user_model().objects.filter(is_superuser=True).first()
-            if admin_user:
-                send_notification(
-                    admin_user,
-                    f"New waste item '{waste.material}' uploaded by {request.user.username}.",
-                    notification_type='info'
-                )
-
             # Format user message based on new capacity
             capacity_msg = format_capacity_message(
                 new_usage,
@@ -312,9 +321,7 @@ def factory_history(request):
         messages.error(request, "Access denied. Factory partner only.")
         return redirect("home")
 
-    waste_items = TextileWaste.objects.filter(
-        factory=request.user.factorypartner
-    ).order_by("-date_added")
+    waste_items = TextileWaste.objects.filter(factory=request.user.factorypartner)
 
     # Filtering
     status = request.GET.get("status")
@@ -322,9 +329,7 @@ def factory_history(request):
         waste_items = waste_items.filter(status=status)
 
     # Pagination
-    paginator = Paginator(waste_items, 10)
-    page = request.GET.get("page")
-    waste_items = paginator.get_page(page)
+    waste_items = paginate_keyset(request, waste_items, 10, ("-date_added", "-id"))
 
     return render(
         request,
@@ -357,47 +362,36 @@ def inventory_analytics(request):
             days=30, factory=request.user.factorypartner
         )
         
-        # Calculate average sustainability score
-        base_query = TextileWaste.objects.filter(factory=request.user.factorypartner)
-        sustainability_data = base_query.aggregate(
-            avg=models.Avg("sustainability_score"),
-            count=models.Count("id")
-        )
+        # Calculate average sustainability score from the daily rollups
+        factory = request.user.factorypartner
+        sustainability_data = query_rollup("waste", factory=factory)
         
-        avg_sustainability = sustainability_data["avg"] or 0
+        avg_sustainability = (
+            sustainability_data["score_total"] / sustainability_data["item_count"]
+            if sustainability_data["item_count"]
+            else 0
+        )
         
         # Convert from 0-100 scale to 0-10 scale for display
         metrics["avg_sustainability"] = avg_sustainability / 10
         
         # Get status distribution for the chart
-        status_distribution = base_query.values("status").annotate(
-            count=models.Count("id")
-        ).order_by("status")
+        status_distribution = query_rollup("waste", ["status"], factory=factory)
         
         # Format for JSON use in template
         import json
         status_labels = [item["status"] for item in status_distribution]
-        status_values = [item["count"] for item in status_distribution]
-        
-        # Get monthly trend data for the chart
-        monthly_data = []
-        monthly_labels = []
-        
-        # Get data for the last 6 months
-        for i in range(6):
-            month_end = end_date - timedelta(days=30 * i)
-            month_start = month_end - timedelta(days=30)
-            month_count = base_query.filter(date_added__range=[month_start, month_end]).count()
-            
-            # Format month for display
-            month_label = month_start.strftime("%b %Y")
-            
-            monthly_data.append(month_count)
-            monthly_labels.append(month_label)
+        status_values = [item["item_count"] for item in status_distribution]
         
-        # Reverse to show oldest to newest
-        monthly_data.reverse()
-        monthly_labels.reverse()
+        # Get monthly trend data for the last 6 calendar months
+        monthly_series = get_time_series(
+            rollup_queryset("waste", factory=factory),
+            "date",
+            {"count": Sum("item_count")},
+            periods=6,
+        )
+        monthly_data = [month["count"] for month in monthly_series]
+        monthly_labels = [month["period"].strftime("%b %Y") for month in monthly_series]
 
         return render(
             request,
@@ -420,51 +414,36 @@ def inventory_analytics(request):
         efficiency_metrics = calculate_storage_efficiency()
         
         # Calculate average sustainability score for all items
-        base_query = TextileWaste.objects.all()
-        sustainability_data = base_query.aggregate(
-            avg=models.Avg("sustainability_score"),
-            count=models.Count("id")
-        )
+        sustainability_data = query_rollup("waste")
         
-        avg_sustainability = sustainability_data["avg"] or 0
+        avg_sustainability = (
+            sustainability_data["score_total"] / sustainability_data["item_count"]
+            if sustainability_data["item_count"]
+            else 0
+        )
         
         # Convert from 0-100 scale to 0-10 scale for display
         metrics["avg_sustainability"] = avg_sustainability / 10
         
         # Get status distribution for the chart
-        status_distribution = base_query.values("status").annotate(
-            count=models.Count("id")
-        ).order_by("status")
+        status_distribution = query_rollup("waste", ["status"])
         
         # Format for JSON use in template
         import json
         status_labels = [item["status"] for item in status_distribution]
-        status_values = [item["count"] for item in status_distribution]
+        status_values = [item["item_count"] for item in status_distribution]
         
         # Get monthly trend data
         end_date = timezone.now()
         start_date = end_date - timedelta(days=90)
         trends_data = get_trends_analysis(start_date, end_date)
         
-        # Get monthly trend data for the chart
-        monthly_data = []
-        monthly_labels = []
-        
-        # Get data for the last 6 months
-        for i in range(6):
-            month_end = end_date - timedelta(days=30 * i)
-            month_start = month_end - timedelta(days=30)
-            month_count = base_query.filter(date_added__range=[month_start, month_end]).count()
-            
-            # Format month for display
-            month_label = month_start.strftime("%b %Y")
-            
-            monthly_data.append(month_count)
-            monthly_labels.append(month_label)
-        
-        # Reverse to show oldest to newest
-        monthly_data.reverse()
-        monthly_labels.reverse()
+        # Get monthly trend data for the last 6 calendar months
+        monthly_series = get_time_series(
+            rollup_queryset("waste"), "date", {"count": Sum("item_count")}, periods=6
+        )
+        monthly_data = [month["count"] for month in monthly_series]
+        monthly_labels = [month["period"].strftime("%b %Y") for month in monthly_series]
 
         return render(
             request,
@@ -558,38 +537,25 @@ def inventory_reports(request):
                 # Generate report data specific to this factory
                 # Use naive datetime objects for the query
                 factory = request.user.factorypartner
-                report_data = generate_waste_report(start_date, end_date, factory)
-
-                # Add sustainability impact data
-                impact_data = calculate_sustainability_impact(report_data)
-                report_data["environmental_impact"] = impact_data
-
-                # Add trends analysis
-                trends_data = get_trends_analysis(start_date, end_date, factory)
-                report_data["trends"] = trends_data
 
                 if export_format == "excel":
-                    try:
-                        excel_data = export_report_as_excel(report_data)
-                        response = HttpResponse(
-                            excel_data,
-                            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        )
-                        response["Content-Disposition"] = (
-                            f'attachment; filename="factory_report_{start_date.strftime("%Y%m%d")}.xlsx"'
-                        )
-                        return response
-                    except Exception as e:
-                        import traceback
-
-                        error_details = traceback.format_exc()
-                        print(f"Excel Export Error: {error_details}")
-                        messages.error(
-                            request, f"Error generating Excel report: {str(e)}"
-                        )
-                        return render(request, "inventory/reports.html", context)
+                    # Built by the report worker; the factory is notified when ready
+                    job = request_report(
+                        request.user, factory, start_date.date(), end_date.date(), "excel"
+                    )
+                    return report_job_response(request, job)
 
                 else:  # HTML preview
+                    report_data = generate_waste_report(start_date, end_date, factory)
+
+                    # Add sustainability impact data
+                    impact_data = calculate_sustainability_impact(report_data)
+                    report_data["environmental_impact"] = impact_data
+
+                    # Add trends analysis
+                    trends_data = get_trends_analysis(start_date, end_date, factory)
+                    report_data["trends"] = trends_data
+
                     context["report"] = report_data
                     context["start_date"] = start_date
                     context["end_date"] = end_date
@@ -632,29 +598,14 @@ def factory_reports(request):
         total_quantity=Sum('quantity')
     ).order_by('status')
     
-    # Generate monthly trend data for the past 12 months
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=365)  # Past year
-    
-    # Get monthly data
-    monthly_data = []
-    monthly_labels = []
-    
-    # Create a list of the past 12 months
-    for i in range(12):
-        month_end = end_date - timedelta(days=30 * i)
-        month_start = month_end - timedelta(days=30)
-        month_count = factory_waste.filter(date_added__range=[month_start, month_end]).count()
-        
-        # Format month for display (e.g., "Jan 2025")
-        month_label = month_start.strftime("%b %Y")
-        
-        monthly_data.append(month_count)
-        monthly_labels.append(month_label)
+    # Generate monthly trend data for the past 12 calendar months
+    monthly_series = get_time_series(
+        factory_waste, "date_added", {"count": Count("id")}, periods=12
+    )
     
-    # Reverse the lists to show oldest to newest
-    monthly_data.reverse()
-    monthly_labels.reverse()
+    # Format months for display (e.g., "Jan 2025"), oldest to newest
+    monthly_data = [month["count"] for month in monthly_series]
+    monthly_labels = [month["period"].strftime("%b %Y") for month in monthly_series]
     
     # Convert data to JSON strings for direct use in JavaScript
     import json
@@ -688,6 +639,14 @@ def export_report(request):
     factory = (
         request.user.factorypartner if hasattr(request.user, "factorypartner") else None
     )
+
+    if export_format in ("pdf", "excel"):
+        # Files are built by the report worker; the requester is notified when ready
+        job = request_report(
+            request.user, factory, start_date.date(), end_date.date(), export_format
+        )
+        return report_job_response(request, job)
+
     report_data = generate_waste_report(start_date, end_date, factory)
 
     # Add sustainability impact data
@@ -698,27 +657,53 @@ def export_report(request):
     trends_data = get_trends_analysis(start_date, end_date, factory)
     report_data["trends"] = trends_data
 
-    if export_format == "pdf":
-        pdf_data = export_report_as_pdf(report_data)
-        response = HttpResponse(pdf_data, content_type="application/pdf")
-        response["Content-Disposition"] = (
-            f'attachment; filename="inventory_report_{start_date.strftime("%Y%m%d")}.pdf"'
-        )
-        return response
+    # HTML format
+    return render(request, "inventory/report_result.html", {"report": report_data})
+
+
+def report_job_response(request, job):
+    """Answer a report export request with its queued or cached job"""
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return JsonResponse(report_job_payload(job), status=202 if job.status != "DONE" else 200)
+    if job.status == "DONE":
+        return redirect("inventory:report_job_download", job_id=job.id)
+    messages.info(
+        request,
+        "Your report is being generated. You will be notified when it is ready to download.",
+    )
+    return redirect("inventory:reports")
 
-    elif export_format == "excel":
-        excel_data = export_report_as_excel(report_data)
-        response = HttpResponse(
-            excel_data,
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-        response["Content-Disposition"] = (
-            f'attachment; filename="inventory_report_{start_date.strftime("%Y%m%d")}.xlsx"'
-        )
-        return response
 
-    else:  # HTML format
-        return render(request, "inventory/report_result.html", {"report": report_data})
+def report_job_payload(job):
+    payload = {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": reverse("inventory:report_job_status", args=[job.id]),
+    }
+    if job.status == "DONE":
+        payload["download_url"] = reverse("inventory:report_job_download", args=[job.id])
+    elif job.status == "FAILED":
+        payload["error"] = job.error
+    return payload
+
+
+@login_required
+def report_job_status(request, job_id):
+    """API endpoint for polling a report export job"""
+    job = get_object_or_404(ReportJob, id=job_id, requested_by=request.user)
+    return JsonResponse(report_job_payload(job))
+
+
+@login_required
+def report_job_download(request, job_id):
+    """Download the artifact of a finished report export job"""
+    job = get_object_or_404(ReportJob, id=job_id, requested_by=request.user, status="DONE")
+    extension = REPORT_EXTENSIONS[job.export_format]
+    return FileResponse(
+        job.artifact.open("rb"),
+        as_attachment=True,
+        filename=f'inventory_report_{job.start_date.strftime("%Y%m%d")}.{extension}',
+    )
 
 
 @login_required
@@ -993,18 +978,94 @@ def designer_waste_list(request):
         messages.error(request, "Access denied. Designer privileges required.")
         return redirect("home")
 
-    # Get only approved/available waste items
-    waste_items = TextileWaste.objects.filter(status="AVAILABLE").order_by("-date_added")
+    # Get only approved/available waste items, narrowed down by the selected facets and ranges
+    filters = parse_waste_filters(request.GET)
+    waste_items = filter_available_waste(filters).select_related("factory__factory_details")
 
     # Pagination
-    paginator = Paginator(waste_items, 10)
-    page = request.GET.get("page")
-    waste_items = paginator.get_page(page)
+    waste_items = paginate_keyset(request, waste_items, 10, ("-date_added", "-id"))
+
+    # Closest available alternatives to the materials of one of the designer's designs
+    designs = request.user.designer.designs.exclude(status="DELETED")
+    selected_design = None
+    material_matches = []
+    if request.GET.get("design"):
+        selected_design = designs.filter(design_id=request.GET["design"]).first()
+        if selected_design:
+            material_matches = match_design_materials(selected_design)
+
+    facets = get_waste_facets(filters)
+    for param, values in facets.items():
+        for entry in values:
+            entry["selected"] = entry["value"] in filters["facets"].get(param, [])
 
     return render(
         request,
         "inventory/designer_waste_list.html",
         {
             "waste_items": waste_items,
+            "facets": facets,
+            "designs": designs,
+            "selected_design": selected_design,
+            "material_matches": material_matches,
         },
     )
+
+
+def _waste_search_result(waste):
+    result = {
+        "id": waste.waste_id,
+        "type": waste.type,
+        "material": waste.material,
+        "quantity": waste.quantity,
+        "unit": waste.unit,
+        "color": waste.color,
+        "quality": waste.quality_grade,
+        "length": waste.dimensions.length,
+        "width": waste.dimensions.width,
+        "dimension_unit": waste.dimensions.unit,
+        "factory": waste.factory.factory_details.factory_name,
+        "url": reverse("inventory:waste_detail", args=[waste.waste_id]),
+    }
+    if hasattr(waste, "match_score"):
+        result["match_score"] = round(waste.match_score, 2)
+    return result
+
+
+@login_required
+@approved_designer_required
+def designer_waste_search(request):
+    """API endpoint returning a page of available waste together with its facet counts"""
+    filters = parse_waste_filters(request.GET)
+    waste_items = paginate_keyset(
+        request,
+        filter_available_waste(filters).select_related("dimensions", "factory__factory_details"),
+        20,
+        ("-date_added", "-id"),
+    )
+    return JsonResponse({
+        "results": [_waste_search_result(waste) for waste in waste_items],
+        "facets": get_waste_facets(filters),
+        "next_cursor": waste_items.next_cursor if waste_items.has_next else None,
+    })
+
+
+@login_required
+@approved_designer_required
+def designer_waste_matches(request, design_id):
+    """API endpoint ranking the available waste closest to each material of a design"""
+    design = get_object_or_404(request.user.designer.designs, design_id=design_id)
+    try:
+        limit = min(max(int(request.GET.get("limit", 5)), 1), 20)
+    except ValueError:
+        limit = 5
+    return JsonResponse({
+        "design_id": design.design_id,
+        "materials": [
+            {
+                "requirement": _waste_search_result(entry["requirement"]),
+                "matches": [_waste_search_result(waste) for waste in entry["matches"]],
+            }
+            for entry in match_design_materials(design, limit)
+        ],
+    })
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Notification
+from .models import Notification, NotificationOutbox
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -8,3 +8,11 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('user__username', 'message')
     ordering = ('-created_at',)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('notification', 'status', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = ('notification', 'attempts', 'last_error', 'created_at', 'sent_at')
+    ordering = ('-created_at',)
@@ -1,12 +1,53 @@
+import asyncio
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Notification
 from django.contrib.auth import get_user_model
+from .utils import (
+    build_notification_event,
+    build_unread_count_event,
+    get_latest_notification_id,
+    get_notifications_after,
+    get_unread_count,
+    mark_notifications_as_read,
+)
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+# Read acknowledgements arriving within this many seconds share one UPDATE
+READ_ACK_WINDOW = 0.05
+
+# Largest id list accepted per message, and pending ids that force an early flush
+READ_ACK_MAX_IDS = 500
+
+# Missed notifications are replayed in pages of this size, up to the cap
+REPLAY_PAGE_SIZE = 100
+REPLAY_MAX_NOTIFICATIONS = 1000
+
+
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Delivers a user's notifications and unread count over a WebSocket.
+
+    Clients acknowledge read notifications with ``mark_read`` messages
+    carrying a ``notification_id``, a list of ``notification_ids`` and/or
+    ``up_to`` (every notification with an id up to it). Acknowledgements are
+    coalesced for ``READ_ACK_WINDOW`` seconds and applied with one UPDATE,
+    after which the new unread count is sent back.
+
+    The first message carries the unread count and the ``last_id`` of the
+    user's newest notification, which a client with no notification list on
+    its page resumes from. A reconnecting client sends ``resume`` with the
+    ``last_id`` it has seen.
+    The notifications it missed are replayed oldest first, marked
+    ``replayed``, followed by ``resume_complete``; past
+    ``REPLAY_MAX_NOTIFICATIONS`` the reply is ``truncated`` and the client
+    should reload its list instead.
+    """
+
     async def connect(self):
         if self.scope["user"].is_anonymous:
             await self.close()
@@ -14,6 +55,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
         self.user = self.scope["user"]
         self.room_group_name = f"user_{self.user.id}_notifications"
+        self.pending_read_ids = set()
+        self.pending_read_up_to = None
+        self.read_ack_task = None
+        self.replayed_up_to = 0
 
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -21,19 +66,125 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         )
         await self.accept()
 
+        # The badge starts from the cached count and is kept current by pushes
+        count = await database_sync_to_async(get_unread_count)(self.user)
+        last_id = await database_sync_to_async(get_latest_notification_id)(self.user)
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'count': count, 'last_id': last_id}))
+
     async def disconnect(self, close_code):
         # Check if room_group_name exists before trying to use it
         if hasattr(self, 'room_group_name'):
+            # Acknowledgements still waiting for the window are applied, not lost
+            if self.read_ack_task is not None:
+                self.read_ack_task.cancel()
+            await self.flush_read_acks(reply=False)
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            await self.send_error('Invalid JSON')
+            return
+        if not isinstance(data, dict):
+            await self.send_error('Messages must be JSON objects')
+            return
+
         if data.get('type') == 'mark_read':
-            notification_id = data.get('notification_id')
-            await self.mark_notification_read(notification_id)
+            await self.queue_read_ack(data)
+        elif data.get('type') == 'resume':
+            await self.replay_missed(data.get('last_id'))
+
+    async def replay_missed(self, last_id):
+        if type(last_id) is not int or last_id < 0:
+            await self.send_error('last_id must be a notification id')
+            return
+
+        # Live messages queue up behind this handler and skip what was replayed
+        cursor, replayed, truncated = last_id, 0, False
+        while True:
+            page = await database_sync_to_async(get_notifications_after)(
+                self.user, cursor, REPLAY_PAGE_SIZE
+            )
+            for notification in page:
+                if replayed == REPLAY_MAX_NOTIFICATIONS:
+                    truncated = True
+                    break
+                message = build_notification_event(notification)['message']
+                message.update(replayed=True, created_at=notification.created_at.isoformat())
+                await self.send(text_data=json.dumps(message))
+                cursor, replayed = notification.id, replayed + 1
+            if truncated or len(page) < REPLAY_PAGE_SIZE:
+                break
+
+        self.replayed_up_to = max(self.replayed_up_to, cursor)
+        await self.send(text_data=json.dumps({
+            'type': 'resume_complete',
+            'last_id': cursor,
+            'count': replayed,
+            'truncated': truncated,
+        }))
+
+    async def queue_read_ack(self, data):
+        ids = data.get('notification_ids', [])
+        up_to = data.get('up_to')
+        if isinstance(ids, list) and 'notification_id' in data:
+            ids = ids + [data['notification_id']]
+
+        if not isinstance(ids, list) or not all(self.is_valid_id(i) for i in ids):
+            await self.send_error('notification_ids must be a list of notification ids')
+            return
+        if len(ids) > READ_ACK_MAX_IDS:
+            await self.send_error(f'At most {READ_ACK_MAX_IDS} notification ids per message')
+            return
+        if up_to is not None and not self.is_valid_id(up_to):
+            await self.send_error('up_to must be a notification id')
+            return
+
+        self.pending_read_ids.update(ids)
+        if up_to is not None:
+            self.pending_read_up_to = max(up_to, self.pending_read_up_to or 0)
+
+        if len(self.pending_read_ids) >= READ_ACK_MAX_IDS:
+            if self.read_ack_task is not None:
+                self.read_ack_task.cancel()
+            await self.flush_read_acks()
+        elif self.read_ack_task is None:
+            self.read_ack_task = asyncio.create_task(self.flush_read_acks_later())
+
+    async def flush_read_acks_later(self):
+        await asyncio.sleep(READ_ACK_WINDOW)
+        try:
+            await self.flush_read_acks()
+        except Exception as e:
+            logger.error(f"Failed to apply read acknowledgements for user {self.user.id}: {e}")
+
+    async def flush_read_acks(self, reply=True):
+        """Apply the pending acknowledgements and send the new unread count"""
+        ids, up_to = self.pending_read_ids, self.pending_read_up_to
+        self.pending_read_ids, self.pending_read_up_to = set(), None
+        self.read_ack_task = None
+        if not ids and up_to is None:
+            return
+
+        updated, count = await self.apply_read_acks(ids, up_to)
+        if updated:
+            # Every socket of the user, this one included, gets the new count
+            await self.channel_layer.group_send(
+                self.room_group_name, build_unread_count_event(count)
+            )
+        elif reply:
+            await self.send(text_data=json.dumps({'type': 'unread_count', 'count': count}))
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message}))
+
+    @staticmethod
+    def is_valid_id(value):
+        return isinstance(value, int) and not isinstance(value, bool) and value > 0
 
     async def send_notification(self, event):
         message = event['message']
@@ -42,16 +193,14 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     # This method is needed to match the event type from channel_layer.group_send
     async def notification_message(self, event):
         message = event['message']
+        if message.get('notification_id', 0) <= self.replayed_up_to:
+            return
         await self.send(text_data=json.dumps(message))
 
+    async def unread_count_message(self, event):
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'count': event['count']}))
+
     @database_sync_to_async
-    def mark_notification_read(self, notification_id):
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                user=self.user
-            )
-            notification.is_read = True
-            notification.save()
-        except Notification.DoesNotExist:
-            pass
\ No newline at end of file
+    def apply_read_acks(self, notification_ids, up_to_id):
+        updated = mark_notifications_as_read(self.user, list(notification_ids), up_to_id)
+        return updated, get_unread_count(self.user)
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import logging
+import threading
+
+import psycopg2
+from channels.layers import InMemoryChannelLayer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7999
+
+# Seconds before retrying a lost listening connection, doubling up to the maximum
+LISTENER_RETRY_DELAY = 0.5
+LISTENER_MAX_RETRY_DELAY = 30
+
+
+class PostgresChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer that fans group messages out to every process on the host.
+
+    Channels and group memberships stay in process memory as with the
+    in-memory layer, but ``group_send`` is published with PostgreSQL
+    ``NOTIFY`` on the project database. Every process that has joined a
+    group ``LISTEN``s and delivers the messages to its local members, so a
+    socket in one ASGI worker receives messages sent from another worker or
+    from the notification worker. Messages must be JSON serialisable.
+    """
+
+    def __init__(self, database="default", channel="channels_group_send", **kwargs):
+        super().__init__(**kwargs)
+        self.database = database
+        self.notify_channel = channel
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+        self._listener = None
+        self._listener_fd = None
+        self._listener_loop = None
+        self._reconnecting = None
+
+    def _connect(self):
+        """Open an autocommit psycopg2 connection to the configured database"""
+        settings_dict = connections[self.database].settings_dict
+        params = {
+            "dbname": settings_dict["NAME"],
+            "user": settings_dict["USER"],
+            "password": settings_dict["PASSWORD"],
+            "host": settings_dict["HOST"] or None,
+            "port": settings_dict["PORT"] or None,
+        }
+        connection = psycopg2.connect(**{k: v for k, v in params.items() if v is not None})
+        connection.autocommit = True
+        return connection
+
+    def _publish(self, payload):
+        """Publish a payload with NOTIFY, reconnecting once if the connection dropped"""
+        with self._publish_lock:
+            for attempt in range(2):
+                if self._publisher is None or self._publisher.closed:
+                    self._publisher = self._connect()
+                try:
+                    with self._publisher.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", [self.notify_channel, payload])
+                    return
+                except psycopg2.OperationalError:
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _open_listener(self):
+        """Connect and LISTEN for published messages; blocks, so it runs in the executor"""
+        listener = self._connect()
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.notify_channel}"')
+        return listener
+
+    def _attach_listener(self, listener, loop):
+        """Use a listening connection and read it from the given event loop"""
+        if listener is not self._listener:
+            if self._listener is not None and not self._listener.closed:
+                # Another caller connected first
+                listener.close()
+                listener = self._listener
+            else:
+                self._listener, self._listener_fd = listener, listener.fileno()
+                self._listener_loop = None
+
+        if self._listener_loop is not loop:
+            if self._listener_loop is not None and not self._listener_loop.is_closed():
+                self._listener_loop.remove_reader(self._listener_fd)
+            loop.add_reader(
+                self._listener_fd,
+                lambda: loop.create_task(self._deliver(self._poll_listener())),
+            )
+            self._listener_loop = loop
+
+    def _drop_listener(self):
+        """Stop reading and close the listening connection"""
+        if self._listener is None:
+            return
+        if self._listener_loop is not None and not self._listener_loop.is_closed():
+            self._listener_loop.remove_reader(self._listener_fd)
+        self._listener.close()
+        self._listener = self._listener_fd = self._listener_loop = None
+
+    async def _ensure_listener(self):
+        """Listen for published messages on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._listener is not None and not self._listener.closed:
+            self._attach_listener(self._listener, loop)
+            return
+        if (
+            self._reconnecting is not None
+            and not self._reconnecting.done()
+            and self._reconnecting.get_loop() is loop
+        ):
+            # Local delivery goes on; messages from other processes resume once it reconnects
+            return
+        self._drop_listener()
+        listener = await loop.run_in_executor(None, self._open_listener)
+        self._attach_listener(listener, loop)
+
+    async def _reconnect_listener(self):
+        """Reopen a lost listening connection, backing off between failed attempts"""
+        loop = asyncio.get_running_loop()
+        delay = LISTENER_RETRY_DELAY
+        while self._listener is None:
+            try:
+                listener = await loop.run_in_executor(None, self._open_listener)
+            except psycopg2.Error as e:
+                logger.warning(f"Channel layer listener could not reconnect, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LISTENER_MAX_RETRY_DELAY)
+                continue
+            self._attach_listener(listener, loop)
+            logger.info("Channel layer listener reconnected")
+
+    def _poll_listener(self):
+        """Read the messages other processes have published off the listening connection"""
+        if self._listener is None:
+            return []
+        try:
+            self._listener.poll()
+        except psycopg2.OperationalError as e:
+            logger.warning(f"Channel layer listener lost its connection: {e}")
+            loop = self._listener_loop
+            self._drop_listener()
+            # Consumers already waiting in receive() never call _ensure_listener again
+            if loop is not None and not loop.is_closed():
+                self._reconnecting = loop.create_task(self._reconnect_listener())
+            return []
+
+        notifies = list(self._listener.notifies)
+        del self._listener.notifies[:]
+        return notifies
+
+    async def _deliver(self, notifies):
+        """Deliver published messages to the members of their groups in this process"""
+        for notify in notifies:
+            try:
+                data = json.loads(notify.payload)
+            except ValueError:
+                logger.warning("Channel layer ignored a malformed message")
+                continue
+            await super().group_send(data["group"], data["message"])
+
+    # Channel layer API
+
+    async def receive(self, channel):
+        await self._ensure_listener()
+        await self._deliver(self._poll_listener())
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        await self._ensure_listener()
+        await super().group_add(group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+
+        payload = json.dumps({"group": group, "message": message}, cls=DjangoJSONEncoder)
+        if len(payload.encode("utf-8")) > MAX_NOTIFY_PAYLOAD:
+            raise ValueError(
+                f"Message for group {group} is too large to publish ({len(payload)} bytes)"
+            )
+        await asyncio.get_running_loop().run_in_executor(None, self._publish, payload)
+
+    async def flush(self):
+        await super().flush()
+        await self.close()
+
+    async def close(self):
+        if self._reconnecting is not None and not self._reconnecting.get_loop().is_closed():
+            self._reconnecting.get_loop().call_soon_threadsafe(self._reconnecting.cancel)
+        self._reconnecting = None
+        self._drop_listener()
+        if self._publisher is not None:
+            self._publisher.close()
+        self._publisher = None
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class LegacyNotification(models.Model):
     # This class represents the notifications_legacynotification table in your database
@@ -35,10 +36,71 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['user', 'is_read', 'created_at'], name='notification_user_unread'
+            ),
+            models.Index(fields=['user', 'id'], name='notification_user_cursor'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.message[:50]}"
 
     def mark_as_read(self):
+        from .utils import mark_notifications_as_read
+
+        mark_notifications_as_read(self.user, [self.id])
         self.is_read = True
-        self.save()
+
+
+class NotificationCounter(models.Model):
+    """Cached number of unread notifications of a user.
+
+    Adjusted in the same transaction as every change to the user's
+    notifications so the unread badge never needs a COUNT query.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_counter'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+
+
+class NotificationOutbox(models.Model):
+    """Pending WebSocket delivery of a notification.
+
+    Written in the same transaction as the notification itself and drained by
+    the ``run_notification_worker`` command once that transaction commits.
+    """
+
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+
+    notification = models.OneToOneField(
+        Notification, on_delete=models.CASCADE, related_name='outbox_entry'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                name='notification_outbox_pending',
+                condition=models.Q(status='PENDING'),
+            )
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.notification_id} [{self.status}]"
@@ -0,0 +1,81 @@
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NotificationOutbox
+from .utils import dispatch_notifications, get_unread_counts
+
+logger = logging.getLogger(__name__)
+
+# Outbox entries delivered per worker batch
+OUTBOX_BATCH_SIZE = 200
+
+# Deliveries are retried with exponential backoff before being given up on
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = timedelta(seconds=2)
+
+
+def deliver_pending_notifications(batch_size=OUTBOX_BATCH_SIZE, channel_layer=None):
+    """Deliver one batch of pending outbox entries over the channel layer.
+
+    Entries are claimed with ``SKIP LOCKED`` so several workers can drain the
+    outbox side by side. Returns a dict with the number of entries ``sent``,
+    scheduled for a ``retry`` and ``failed`` for good.
+    """
+    channel_layer = channel_layer or get_channel_layer()
+    result = {"sent": 0, "retry": 0, "failed": 0}
+
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("notification")
+            .filter(status="PENDING", available_at__lte=timezone.now())
+            .order_by("available_at", "id")[:batch_size]
+        )
+        if not entries:
+            return result
+
+        if channel_layer is None:
+            errors = {entry.notification_id: "No channel layer configured" for entry in entries}
+        else:
+            notifications = [entry.notification for entry in entries]
+            unread_counts = get_unread_counts({n.user_id for n in notifications})
+            errors = {
+                failure["notification_id"]: failure["error"]
+                for failure in async_to_sync(dispatch_notifications)(
+                    channel_layer, notifications, unread_counts=unread_counts
+                )
+            }
+
+        now = timezone.now()
+        for entry in entries:
+            entry.attempts += 1
+            error = errors.get(entry.notification_id)
+            if error is None:
+                entry.status = "SENT"
+                entry.sent_at = now
+                entry.last_error = ""
+                result["sent"] += 1
+            elif entry.attempts >= OUTBOX_MAX_ATTEMPTS:
+                entry.status = "FAILED"
+                entry.last_error = error
+                result["failed"] += 1
+            else:
+                entry.available_at = now + OUTBOX_RETRY_DELAY * 2 ** (entry.attempts - 1)
+                entry.last_error = error
+                result["retry"] += 1
+
+        NotificationOutbox.objects.bulk_update(
+            entries, ["status", "attempts", "last_error", "available_at", "sent_at"]
+        )
+
+    if result["retry"] or result["failed"]:
+        logger.warning(
+            f"Notification outbox: {result['sent']} sent, {result['retry']} to retry, "
+            f"{result['failed']} failed"
+        )
+    return result
@@ -1,3 +1,419 @@
-from django.test import TestCase
+import asyncio
+import json
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .consumers import NotificationConsumer
+from .layers import PostgresChannelLayer
+from .models import Notification, NotificationCounter, NotificationOutbox
+from .outbox import OUTBOX_MAX_ATTEMPTS, deliver_pending_notifications
+from .utils import (
+    get_unread_count,
+    mark_notifications_as_read,
+    send_bulk_notification,
+    send_notification,
+)
+
+User = get_user_model()
+
+IN_MEMORY_CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BulkNotificationTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f"buyer{i}", email=f"buyer{i}@example.com", password="testpass123"
+            )
+            for i in range(5)
+        ]
+
+    def test_bulk_notification_delivers_to_every_user(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{self.users[0].id}_notifications", channel)
+
+        # Five recipients in batches of two take three INSERTs
+        with CaptureQueriesContext(connection) as queries:
+            result = send_bulk_notification(self.users, "Sale starts today", batch_size=2)
+        inserts = [
+            q for q in queries.captured_queries
+            if q["sql"].startswith('INSERT INTO "notifications_notification"')
+        ]
+        self.assertEqual(len(inserts), 3)
+
+        self.assertEqual(result["sent"], 5)
+        self.assertEqual(result["failed"], [])
+        self.assertEqual(Notification.objects.filter(message="Sale starts today").count(), 5)
+
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event["message"]["message"], "Sale starts today")
+        self.assertEqual(event["message"]["unread_count"], 1)
+        self.assertEqual(
+            event["message"]["notification_id"],
+            Notification.objects.get(user=self.users[0]).id,
+        )
+
+    def test_failed_deliveries_are_reported(self):
+        channel_layer = get_channel_layer()
+        original_send = channel_layer.group_send
+        failing_group = f"user_{self.users[2].id}_notifications"
+
+        async def flaky_group_send(group, message):
+            if group == failing_group:
+                raise ConnectionError("layer unavailable")
+            await original_send(group, message)
+
+        with mock.patch.object(channel_layer, "group_send", flaky_group_send):
+            result = send_bulk_notification(self.users, "Maintenance tonight")
+
+        self.assertEqual(result["sent"], 4)
+        self.assertEqual(len(result["failed"]), 1)
+        self.assertEqual(result["failed"][0]["user_id"], self.users[2].id)
+        self.assertEqual(result["failed"][0]["error"], "layer unavailable")
+        self.assertEqual(len(result["notifications"]), 5)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="factoryuser", email="factory@example.com", password="testpass123"
+        )
+        self.channel_layer = get_channel_layer()
+        self.channel = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(
+            f"user_{self.user.id}_notifications", self.channel
+        )
+
+    def test_send_notification_queues_delivery(self):
+        with mock.patch.object(self.channel_layer, "group_send") as group_send:
+            notification = send_notification(self.user, "Waste approved", "waste_approved")
+
+        group_send.assert_not_called()
+        self.assertEqual(notification.outbox_entry.status, "PENDING")
+
+    def test_rolled_back_notifications_are_never_queued(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                send_notification(self.user, "Order shipped")
+                raise ValueError("order update failed")
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_worker_delivers_pending_entries(self):
+        notification = send_notification(self.user, "Order shipped")
+
+        out = StringIO()
+        call_command("run_notification_worker", "--once", stdout=out)
+
+        self.assertIn("1 sent", out.getvalue())
+        event = async_to_sync(self.channel_layer.receive)(self.channel)
+        self.assertEqual(event["message"]["notification_id"], notification.id)
+        entry = NotificationOutbox.objects.get(notification=notification)
+        self.assertEqual(entry.status, "SENT")
+        self.assertIsNotNone(entry.sent_at)
+
+    def test_failed_deliveries_are_retried_then_given_up(self):
+        send_notification(self.user, "Order shipped")
+
+        async def failing_group_send(group, message):
+            raise ConnectionError("layer unavailable")
+
+        with mock.patch.object(self.channel_layer, "group_send", failing_group_send):
+            self.assertEqual(deliver_pending_notifications()["retry"], 1)
+            # Retries wait for their backoff to expire
+            self.assertEqual(deliver_pending_notifications(), {"sent": 0, "retry": 0, "failed": 0})
+
+            NotificationOutbox.objects.update(attempts=OUTBOX_MAX_ATTEMPTS - 1, available_at=timezone.now())
+            self.assertEqual(deliver_pending_notifications()["failed"], 1)
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.status, "FAILED")
+        self.assertEqual(entry.last_error, "layer unavailable")
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class UnreadCountTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="buyeruser", email="buyer@example.com", password="testpass123"
+        )
+        self.channel_layer = get_channel_layer()
+        self.channel = async_to_sync(self.channel_layer.new_channel)()
+        async_to_sync(self.channel_layer.group_add)(
+            f"user_{self.user.id}_notifications", self.channel
+        )
+
+    def test_counter_follows_sends_and_reads(self):
+        first = send_notification(self.user, "Order placed")
+        send_notification(self.user, "Order shipped")
+        send_bulk_notification([self.user], "Sale starts today")
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 3)
+
+        self.assertEqual(mark_notifications_as_read(self.user, [first.id]), 1)
+        # Already read notifications do not decrement the counter again
+        self.assertEqual(mark_notifications_as_read(self.user, [first.id]), 0)
+        self.assertEqual(get_unread_count(self.user), 2)
+
+        mark_notifications_as_read(self.user)
+        self.assertEqual(get_unread_count(self.user), 0)
+
+    def test_missing_counter_is_initialized_from_notifications(self):
+        Notification.objects.create(user=self.user, message="Order placed")
+        Notification.objects.create(user=self.user, message="Order shipped", is_read=True)
+
+        self.assertEqual(get_unread_count(self.user), 1)
+        self.assertEqual(NotificationCounter.objects.get(user=self.user).unread_count, 1)
+
+    def test_count_view_reads_the_counter(self):
+        send_notification(self.user, "Order placed")
+        self.client.force_login(self.user)
+
+        with self.assertNumQueries(3):  # session, user, counter
+            response = self.client.get(reverse("notifications:notification_count"))
+
+        self.assertEqual(response.json(), {"count": 1})
+
+    def test_marking_read_pushes_the_new_count(self):
+        notification = send_notification(self.user, "Order placed")
+        send_notification(self.user, "Order shipped")
+        self.client.force_login(self.user)
+
+        response = self.client.post(
+            reverse("notifications:mark_read", args=[notification.id])
+        )
+
+        self.assertEqual(response.json()["unread_count"], 1)
+        event = async_to_sync(self.channel_layer.receive)(self.channel)
+        self.assertEqual(event, {"type": "unread_count_message", "count": 1})
+
+    def test_worker_events_carry_the_unread_count(self):
+        send_notification(self.user, "Order placed")
+        send_notification(self.user, "Order shipped")
+
+        deliver_pending_notifications()
+
+        event = async_to_sync(self.channel_layer.receive)(self.channel)
+        self.assertEqual(event["message"]["unread_count"], 2)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationConsumerTest(TransactionTestCase):
+    # The consumer reaches the database from worker threads, outside a test transaction
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="socketuser", email="socket@example.com", password="testpass123"
+        )
+        self.notifications = [
+            send_notification(self.user, f"Order update {i}") for i in range(5)
+        ]
+
+    def acknowledge(self, *messages):
+        async def receive_json(communicator):
+            return json.loads((await communicator.receive_output(5))["text"])
+
+        async def run():
+            communicator = ApplicationCommunicator(
+                NotificationConsumer.as_asgi(),
+                {"type": "websocket", "path": "/ws/notifications/", "user": self.user},
+            )
+            await communicator.send_input({"type": "websocket.connect"})
+            self.assertEqual((await communicator.receive_output(5))["type"], "websocket.accept")
+            replies = [await receive_json(communicator)]
+            for message in messages:
+                await communicator.send_input({"type": "websocket.receive", "text": message})
+            replies.append(await receive_json(communicator))
+            await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+            await communicator.wait(5)
+            return replies
+
+        return async_to_sync(run)()
+
+    def test_batched_acknowledgements_share_one_update(self):
+        ids = [n.id for n in self.notifications]
+
+        with CaptureQueriesContext(connection) as queries:
+            replies = self.acknowledge(
+                '{"type": "mark_read", "notification_id": %d}' % ids[0],
+                '{"type": "mark_read", "notification_ids": [%d, %d]}' % (ids[1], ids[2]),
+                '{"type": "mark_read", "notification_ids": [%d]}' % ids[1],
+            )
+
+        self.assertEqual(
+            replies,
+            [
+                {"type": "unread_count", "count": 5, "last_id": ids[-1]},
+                {"type": "unread_count", "count": 2},
+            ],
+        )
+        updates = [
+            q for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "notifications_notification"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 2)
+
+    def test_acknowledge_up_to_id(self):
+        replies = self.acknowledge('{"type": "mark_read", "up_to": %d}' % self.notifications[3].id)
+
+        self.assertEqual(replies[1], {"type": "unread_count", "count": 1})
+        self.assertEqual(
+            list(Notification.objects.filter(is_read=False).values_list("id", flat=True)),
+            [self.notifications[4].id],
+        )
+
+    def test_invalid_messages_are_rejected(self):
+        self.assertEqual(self.acknowledge("not json")[1]["type"], "error")
+        replies = self.acknowledge('{"type": "mark_read", "notification_ids": ["1; DROP TABLE"]}')
+        self.assertEqual(replies[1]["type"], "error")
+        self.assertEqual(get_unread_count(self.user), 5)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class NotificationReplayTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="replayuser", email="replay@example.com", password="testpass123"
+        )
+        self.notifications = [
+            send_notification(self.user, f"Order update {i}") for i in range(7)
+        ]
+
+    def resume(self, last_id):
+        async def run():
+            communicator = ApplicationCommunicator(
+                NotificationConsumer.as_asgi(),
+                {"type": "websocket", "path": "/ws/notifications/", "user": self.user},
+            )
+            await communicator.send_input({"type": "websocket.connect"})
+            await communicator.receive_output(5)  # accept
+            await communicator.receive_output(5)  # unread count
+            await communicator.send_input(
+                {"type": "websocket.receive", "text": json.dumps({"type": "resume", "last_id": last_id})}
+            )
+            messages = []
+            while not messages or messages[-1].get("type") != "resume_complete":
+                messages.append(json.loads((await communicator.receive_output(5))["text"]))
+            await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+            await communicator.wait(5)
+            return messages
+
+        return async_to_sync(run)()
+
+    def test_missed_notifications_are_replayed_in_pages(self):
+        with mock.patch("notifications.consumers.REPLAY_PAGE_SIZE", 3):
+            messages = self.resume(self.notifications[1].id)
+
+        replayed, complete = messages[:-1], messages[-1]
+        self.assertEqual(
+            [m["notification_id"] for m in replayed], [n.id for n in self.notifications[2:]]
+        )
+        self.assertTrue(all(m["replayed"] for m in replayed))
+        self.assertEqual(
+            complete,
+            {"type": "resume_complete", "last_id": self.notifications[-1].id, "count": 5, "truncated": False},
+        )
+
+    def test_reconnect_without_a_notification_list_resumes_from_the_first_message(self):
+        async def first_message():
+            communicator = ApplicationCommunicator(
+                NotificationConsumer.as_asgi(),
+                {"type": "websocket", "path": "/ws/notifications/", "user": self.user},
+            )
+            await communicator.send_input({"type": "websocket.connect"})
+            await communicator.receive_output(5)  # accept
+            message = json.loads((await communicator.receive_output(5))["text"])
+            await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+            await communicator.wait(5)
+            return message
+
+        # The page had no ids to seed from, so the client keeps the cursor it is given
+        message = async_to_sync(first_message)()
+        self.assertEqual(message, {"type": "unread_count", "count": 7, "last_id": self.notifications[-1].id})
+
+        missed = send_notification(self.user, "Sent while disconnected")
+        messages = self.resume(message["last_id"])
+        self.assertEqual([m.get("notification_id") for m in messages[:-1]], [missed.id])
+        self.assertEqual(messages[-1]["count"], 1)
+
+    def test_replay_is_capped(self):
+        with mock.patch("notifications.consumers.REPLAY_PAGE_SIZE", 2), \
+                mock.patch("notifications.consumers.REPLAY_MAX_NOTIFICATIONS", 3):
+            messages = self.resume(0)
+
+        self.assertEqual(len(messages), 4)
+        self.assertTrue(messages[-1]["truncated"])
+        self.assertEqual(messages[-1]["last_id"], self.notifications[2].id)
+
+
+class PostgresChannelLayerTest(TestCase):
+    def setUp(self):
+        # Separate layer instances hold separate connections, like two worker processes
+        self.worker_layer = PostgresChannelLayer()
+        self.sender_layer = PostgresChannelLayer()
+
+    def tearDown(self):
+        async_to_sync(self.worker_layer.close)()
+        async_to_sync(self.sender_layer.close)()
+
+    def test_group_messages_reach_other_layer_instances(self):
+        channel = async_to_sync(self.worker_layer.new_channel)()
+        async_to_sync(self.worker_layer.group_add)("user_1_notifications", channel)
+
+        async_to_sync(self.sender_layer.group_send)(
+            "user_1_notifications",
+            {"type": "notification_message", "message": {"message": "Order shipped"}},
+        )
+
+        async def receive():
+            return await asyncio.wait_for(self.worker_layer.receive(channel), 5)
+
+        event = async_to_sync(receive)()
+        self.assertEqual(event["message"]["message"], "Order shipped")
+
+    def test_listener_reconnects_while_consumers_wait(self):
+        channel = async_to_sync(self.worker_layer.new_channel)()
+        message = {"type": "notification_message", "message": {"message": "Order shipped"}}
+
+        def terminate_listener():
+            with self.sender_layer._connect() as admin, admin.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_terminate_backend(%s)", [self.worker_layer._listener.get_backend_pid()]
+                )
+
+        async def lose_connection_then_receive():
+            await self.worker_layer.group_add("user_1_notifications", channel)
+            receiving = asyncio.ensure_future(self.worker_layer.receive(channel))
+            await asyncio.get_running_loop().run_in_executor(None, terminate_listener)
+
+            # The waiting receive() never calls back into the layer, so the poll error path reconnects
+            for _ in range(100):
+                if self.worker_layer._reconnecting is not None and self.worker_layer._listener:
+                    break
+                await asyncio.sleep(0.05)
+            await self.sender_layer.group_send("user_1_notifications", message)
+            return await asyncio.wait_for(receiving, 5)
+
+        event = async_to_sync(lose_connection_then_receive)()
+        self.assertEqual(event["message"]["message"], "Order shipped")
+
+    def test_oversized_messages_are_rejected(self):
+        with self.assertRaises(ValueError):
+            async_to_sync(self.sender_layer.group_send)(
+                "user_1_notifications", {"type": "notification_message", "message": "x" * 9000}
+            )
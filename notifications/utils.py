@@ -1,11 +1,22 @@
+import asyncio
 import uuid
+from collections import Counter, defaultdict
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import Notification
+from .models import Notification, NotificationCounter, NotificationOutbox
 import logging
 
+logger = logging.getLogger(__name__)
+
+# Rows inserted per INSERT when fanning a notification out to many users
+BULK_NOTIFICATION_BATCH_SIZE = 500
+
+# Channel layer group sends allowed in flight at once during a bulk fan-out
+BULK_SEND_CONCURRENCY = 50
+
 
 def generate_notification_id():
     """Generate a unique notification ID"""
@@ -14,38 +25,130 @@ def generate_notification_id():
 
 def send_notification(user, message, notification_type='info'):
     """
-    Send a notification to a specific user through WebSocket and save to database.
+    Save a notification for a user and queue its WebSocket delivery.
+    
+    The delivery is written to the notification outbox in the same transaction
+    as the notification and sent by the ``run_notification_worker`` command
+    after commit, so changes that roll back never notify anyone.
     
     Args:
         user: The user to send the notification to
         message: The notification message
         notification_type: Type of notification (info, success, warning, error)
     """
-    notification = Notification.objects.create(
-        user=user,
-        message=message,
-        notification_type=notification_type
-    )
-    
-    try:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{user.id}_notifications",
-            {
-                "type": "notification_message",
-                "message": {
-                    "notification_type": notification_type,
-                    "message": message,
-                    "notification_id": notification.id
-                }
-            }
+    with transaction.atomic():
+        notification = Notification.objects.create(
+            user=user,
+            message=message,
+            notification_type=notification_type
         )
-    except Exception as e:
-        logging.getLogger(__name__).warning(f"WebSocket notification failed: {e}")
+        NotificationOutbox.objects.create(notification=notification)
+        adjust_unread_counts({user.id: 1})
     
     return notification
 
 
+def build_notification_event(notification, unread_count=None):
+    """Build the channel layer event that delivers a notification to its user's sockets"""
+    message = {
+        "notification_type": notification.notification_type,
+        "message": notification.message,
+        "notification_id": notification.id
+    }
+    if unread_count is not None:
+        message["unread_count"] = unread_count
+    return {"type": "notification_message", "message": message}
+
+
+def build_unread_count_event(count):
+    """Build the channel layer event that updates the unread badge on a user's sockets"""
+    return {"type": "unread_count_message", "count": count}
+
+
+def initialize_unread_counts(user_ids):
+    """Create missing unread counters from the users' unread notifications
+
+    The COUNT is answered from the ``(user, is_read, created_at)`` index.
+    Returns a dict of user id to unread count.
+    """
+    counts = dict(
+        Notification.objects.filter(user_id__in=user_ids, is_read=False)
+        .order_by()
+        .values("user_id")
+        .annotate(count=models.Count("id"))
+        .values_list("user_id", "count")
+    )
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id, unread_count=counts.get(user_id, 0)) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    return {user_id: counts.get(user_id, 0) for user_id in user_ids}
+
+
+def adjust_unread_counts(deltas):
+    """Apply a dict of user id to unread count change to the unread counters
+
+    Users sharing the same change are updated with a single UPDATE. Call it
+    in the transaction that changes the notifications so the counters never
+    drift from them.
+    """
+    users_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            users_by_delta[delta].append(user_id)
+
+    missing = []
+    for delta, user_ids in users_by_delta.items():
+        counters = NotificationCounter.objects.filter(user_id__in=user_ids)
+        updated = counters.update(
+            unread_count=Greatest(models.F("unread_count") + delta, 0),
+            updated_at=timezone.now()
+        )
+        if updated < len(user_ids):
+            existing = set(counters.values_list("user_id", flat=True))
+            missing.extend(user_id for user_id in user_ids if user_id not in existing)
+
+    if missing:
+        # Counted after this transaction's changes, so no delta is applied
+        initialize_unread_counts(missing)
+
+
+def get_unread_counts(user_ids):
+    """Get the unread counts of several users in one query"""
+    user_ids = list(user_ids)
+    counts = dict(
+        NotificationCounter.objects.filter(user_id__in=user_ids).values_list("user_id", "unread_count")
+    )
+    missing = [user_id for user_id in user_ids if user_id not in counts]
+    if missing:
+        counts.update(initialize_unread_counts(missing))
+    return counts
+
+
+def get_unread_count(user):
+    """Get a user's unread notification count from their counter"""
+    return get_unread_counts([user.id])[user.id]
+
+
+def push_unread_count(user, count=None):
+    """Send a user's unread count to their open sockets
+
+    Delivery is best effort; a failure only leaves the badge stale until the
+    next push. Returns the count.
+    """
+    if count is None:
+        count = get_unread_count(user)
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"user_{user.id}_notifications", build_unread_count_event(count)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to push unread count to user {user.id}: {e}")
+    return count
+
+
 def get_user_notifications(user, include_read=False, limit=None):
     """Get notifications for a user"""
     notifications = Notification.objects.filter(user=user)
@@ -56,22 +159,57 @@ def get_user_notifications(user, include_read=False, limit=None):
     return notifications.order_by("-created_at")
 
 
-def mark_notifications_as_read(user, notification_ids=None):
-    """Mark notifications as read"""
-    notifications = Notification.objects.filter(user=user)
+def get_notifications_after(user, last_id, limit):
+    """Get up to ``limit`` of a user's notifications with ids after ``last_id``, oldest first
+
+    Pages are read off the ``(user, id)`` index, so catching up costs the
+    same however many notifications the user has.
+    """
+    return list(
+        Notification.objects.filter(user=user, id__gt=last_id)
+        .only("id", "user_id", "notification_type", "message", "created_at")
+        .order_by("id")[:limit]
+    )
+
+
+def get_latest_notification_id(user):
+    """Get the id of a user's newest notification, or 0, as the cursor a new socket resumes from"""
+    latest = Notification.objects.filter(user=user).order_by("-id").values_list("id", flat=True).first()
+    return latest or 0
+
+
+def mark_notifications_as_read(user, notification_ids=None, up_to_id=None):
+    """Mark notifications as read and return how many were unread
+
+    Marks the given ``notification_ids`` and every notification with an id
+    up to ``up_to_id`` in one UPDATE, or all of the user's notifications
+    when neither is given.
+    """
+    selected = models.Q()
     if notification_ids:
-        notifications = notifications.filter(id__in=notification_ids)
-    notifications.update(is_read=True)
-    return notifications.count()
+        selected |= models.Q(id__in=notification_ids)
+    if up_to_id is not None:
+        selected |= models.Q(id__lte=up_to_id)
+    notifications = Notification.objects.filter(selected, user=user, is_read=False)
+    with transaction.atomic():
+        updated = notifications.update(is_read=True)
+        adjust_unread_counts({user.id: -updated})
+    return updated
 
 
 def get_notification_stats(user):
     """Get notification statistics for a user"""
     all_notifications = Notification.objects.filter(user=user)
+    types = list(
+        all_notifications.order_by()
+        .values("notification_type")
+        .annotate(count=models.Count("id"))
+        .order_by("notification_type")
+    )
     return {
-        "total": all_notifications.count(),
-        "unread": all_notifications.filter(is_read=False).count(),
-        "types": all_notifications.values("notification_type").annotate(count=models.Count("id")),
+        "total": sum(row["count"] for row in types),
+        "unread": get_unread_count(user),
+        "types": types,
         "latest": all_notifications.order_by("-created_at").first(),
     }
 
@@ -94,34 +232,87 @@ def bulk_create_notifications(notifications_data):
         )
         for data in notifications_data
     ]
-    return Notification.objects.bulk_create(notifications)
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create(notifications)
+        adjust_unread_counts(Counter(notification.user_id for notification in notifications))
+    return notifications
+
+
+async def dispatch_notifications(channel_layer, notifications, concurrency=BULK_SEND_CONCURRENCY,
+                                 unread_counts=None):
+    """Send notifications to their users' groups concurrently from one event loop.
+
+    At most ``concurrency`` group sends are in flight at once. When a dict
+    of ``unread_counts`` by user id is given, each event carries the user's
+    unread count for the badge. Failed sends are collected rather than
+    raised and returned as a list of dicts with the ``user_id``,
+    ``notification_id`` and ``error``.
+    """
+    unread_counts = unread_counts or {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(notification):
+        async with semaphore:
+            try:
+                await channel_layer.group_send(
+                    f"user_{notification.user_id}_notifications",
+                    build_notification_event(notification, unread_counts.get(notification.user_id))
+                )
+            except Exception as e:
+                return {
+                    "user_id": notification.user_id,
+                    "notification_id": notification.id,
+                    "error": str(e)
+                }
+        return None
+
+    results = await asyncio.gather(*(send(notification) for notification in notifications))
+    return [result for result in results if result]
+
+
+def send_bulk_notification(users, message, notification_type='info',
+                           batch_size=BULK_NOTIFICATION_BATCH_SIZE,
+                           concurrency=BULK_SEND_CONCURRENCY):
+    """
+    Send the same notification to multiple users.
 
+    Rows are inserted with ``bulk_create`` in batches and the WebSocket
+    deliveries are pipelined through ``dispatch_notifications``, so one
+    failed recipient does not stop the rest.
 
-def send_bulk_notification(users, message, notification_type='info'):
-    """Send the same notification to multiple users."""
-    notifications = []
+    Returns a dict with the created ``notifications``, the number of
+    deliveries ``sent`` and the per-recipient ``failed`` deliveries.
+    """
+    with transaction.atomic():
+        notifications = Notification.objects.bulk_create(
+            [
+                Notification(user=user, notification_type=notification_type, message=message)
+                for user in users
+            ],
+            batch_size=batch_size
+        )
+        adjust_unread_counts(Counter(notification.user_id for notification in notifications))
+
+    failed = []
     channel_layer = get_channel_layer()
-    
-    for user in users:
-        # Create notification record
-        notification = Notification.objects.create(
-            user=user,
-            notification_type=notification_type,
-            message=message
+    if channel_layer is None:
+        failed = [
+            {"user_id": n.user_id, "notification_id": n.id, "error": "No channel layer configured"}
+            for n in notifications
+        ]
+    elif notifications:
+        unread_counts = get_unread_counts({n.user_id for n in notifications})
+        failed = async_to_sync(dispatch_notifications)(
+            channel_layer, notifications, concurrency, unread_counts
         )
-        notifications.append(notification)
-        
-        # Send real-time notification
-        async_to_sync(channel_layer.group_send)(
-            f"user_{user.id}_notifications",
-            {
-                "type": "notification_message",
-                "message": {
-                    "notification_type": notification_type,
-                    "message": message,
-                    "notification_id": notification.id
-                }
-            }
+
+    if failed:
+        logger.warning(
+            f"Bulk notification failed for {len(failed)} of {len(notifications)} recipients"
         )
-    
-    return notifications
+
+    return {
+        "notifications": notifications,
+        "sent": len(notifications) - len(failed),
+        "failed": failed,
+    }
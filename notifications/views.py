@@ -4,6 +4,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_POST
 
 from .models import Notification
+from .utils import get_unread_count, mark_notifications_as_read, push_unread_count
 
 
 @login_required
@@ -11,7 +12,7 @@ def notification_list(request):
     notifications = Notification.objects.filter(user=request.user).order_by(
         "-created_at"
     )
-    unread_count = notifications.filter(is_read=False).count()
+    unread_count = get_unread_count(request.user)
     return render(
         request,
         "notifications/notification_list.html",
@@ -25,41 +26,39 @@ def mark_as_read(request, notification_id):
         Notification, id=notification_id, user=request.user
     )
     notification.mark_as_read()
+    unread_count = push_unread_count(request.user)
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return JsonResponse({"status": "success"})
+        return JsonResponse({"status": "success", "unread_count": unread_count})
     return redirect("notifications:notification_list")
 
 
 @login_required
 def mark_all_as_read(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(
-        is_read=True
-    )
+    mark_notifications_as_read(request.user)
+    push_unread_count(request.user, 0)
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return JsonResponse({"status": "success"})
+        return JsonResponse({"status": "success", "unread_count": 0})
     return redirect("notifications:notification_list")
 
 
 @login_required
 def notification_count(request):
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({"count": count})
+    return JsonResponse({"count": get_unread_count(request.user)})
 
 
 @login_required
 @require_POST
 def mark_notification_read(request, notification_id):
-    try:
-        notification = Notification.objects.get(id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
-        return JsonResponse({'status': 'success'})
-    except Notification.DoesNotExist:
+    if not Notification.objects.filter(id=notification_id, user=request.user).exists():
         return JsonResponse({'status': 'error', 'message': 'Notification not found'}, status=404)
+    mark_notifications_as_read(request.user, [notification_id])
+    unread_count = push_unread_count(request.user)
+    return JsonResponse({'status': 'success', 'unread_count': unread_count})
 
 
 @login_required
 @require_POST
 def mark_all_read(request):
-    Notification.objects.filter(user=request.user).update(is_read=True)
-    return JsonResponse({'status': 'success'})
+    mark_notifications_as_read(request.user)
+    push_unread_count(request.user, 0)
+    return JsonResponse({'status': 'success', 'unread_count': 0})
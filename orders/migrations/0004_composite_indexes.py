@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0010_designer_status'),
+        ('designs', '0004_rename_date_updated_design_last_modified'),
+        ('orders', '0003_order_last_updated'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['buyer', 'status', 'date_ordered'], name='order_buyer_status_date'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['buyer', '-date_ordered', '-id'], name='order_buyer_recent'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', 'date_ordered'], name='order_status_date'),
+        ),
+    ]
@@ -81,6 +81,7 @@ class Order(models.Model):
         max_length=20, choices=ORDER_STATUS_CHOICES, default="PENDING"
     )
     date_ordered = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     payment_info = models.OneToOneField(PaymentInfo, on_delete=models.CASCADE)
     delivery_info = models.OneToOneField(DeliveryInfo, on_delete=models.CASCADE)    
@@ -129,3 +130,9 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-date_ordered"]
+        indexes = [
+            models.Index(fields=["buyer", "status", "date_ordered"], name="order_buyer_status_date"),
+            # Order list pages, newest first
+            models.Index(fields=["buyer", "-date_ordered", "-id"], name="order_buyer_recent"),
+            models.Index(fields=["status", "date_ordered"], name="order_status_date"),
+        ]
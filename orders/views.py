@@ -46,15 +46,13 @@ def order_list(request):
     # Apply status filter if provided
     if status_filter:
         orders = orders.filter(status=status_filter)
+
+    # The list shows the design, its designer and the buyer of every order
+    orders = orders.select_related("design__designer__user", "buyer__user")
     
-    # Order by most recent first
-    orders = orders.order_by('-date_ordered')
-    
-    # Pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(orders, 10)  # Show 10 orders per page
-    page = request.GET.get('page')
-    orders = paginator.get_page(page)
+    # Most recent first, 10 orders per page
+    from common.pagination import paginate_keyset
+    orders = paginate_keyset(request, orders, 10, ('-date_ordered', '-id'))
     
     context = {
         "orders": orders,
@@ -82,7 +80,8 @@ def create_order(request, design_id=None):
     design = None
     if design_id:
         from designs.models import Design
-        design = get_object_or_404(Design, design_id=design_id)
+        from designs.utils import annotate_material_availability
+        design = get_object_or_404(annotate_material_availability(Design.objects.all()), design_id=design_id)
         logger.debug(f"Found design with ID {design_id}: {design.name} (internal ID: {design.id})")
       
     if request.method == "POST":
@@ -3,6 +3,12 @@ class NotificationHandler {
         this.socket = null;
         this.badge = document.querySelector('.notification-badge');
         this.unreadCount = 0;
+        // Resume from the newest notification rendered on the page, if any
+        const ids = [...document.querySelectorAll('[data-notification-id]')]
+            .map(elem => parseInt(elem.dataset.notificationId, 10));
+        this.lastNotificationId = ids.length ? Math.max(...ids) : null;
+        // Ids already shown, so a replay never repeats them
+        this.seenIds = new Set(ids);
         this.connect();
         this.setupEventListeners();
     }
@@ -12,6 +18,14 @@ class NotificationHandler {
         const wsPath = `${wsScheme}://${window.location.host}/ws/notifications/`;
         
         this.socket = new WebSocket(wsPath);
+
+        this.socket.onopen = () => {
+            // Catch up on what arrived while disconnected. Pages without a notification
+            // list take their cursor from the first unread_count, so every reconnect resumes.
+            if (this.lastNotificationId !== null) {
+                this.socket.send(JSON.stringify({ type: 'resume', last_id: this.lastNotificationId }));
+            }
+        };
         
         this.socket.onmessage = (event) => {
             const data = JSON.parse(event.data);
@@ -25,18 +39,52 @@ class NotificationHandler {
     }
 
     setupEventListeners() {
-        // Update unread count on page load
-        fetch('/notifications/count/')
-            .then(response => response.json())
-            .then(data => this.updateBadge(data.count));
+        // The socket sends the unread count on connect; fetch it only if that fails
+        setTimeout(() => {
+            if (this.socket.readyState !== WebSocket.OPEN) {
+                updateNotificationCount();
+            }
+        }, 3000);
     }
 
     handleNotification(data) {
-        const { notification_type, message } = data;
-        // Show notification using SweetAlert2
-        showNotification(notification_type.toLowerCase(), message);
-        // Always update badge count from server for accuracy
-        updateNotificationCount();
+        // Unread count pushed by the server after any change on any tab
+        if (data.type === 'unread_count') {
+            if (this.lastNotificationId === null && data.last_id !== undefined) {
+                this.lastNotificationId = data.last_id;
+            }
+            this.updateBadge(data.count);
+            return;
+        }
+        if (data.type === 'resume_complete') {
+            // Too much was missed to replay; the list page reloads instead
+            if (data.truncated && document.querySelector('[data-notification-id]')) {
+                window.location.reload();
+            }
+            return;
+        }
+        if (data.type === 'error') {
+            console.warn(`Notification socket: ${data.message}`);
+            return;
+        }
+
+        const { notification_type, message, notification_id, unread_count, replayed } = data;
+        if (notification_id !== undefined) {
+            if (replayed && this.seenIds.has(notification_id)) {
+                return;
+            }
+            this.seenIds.add(notification_id);
+            this.lastNotificationId = Math.max(this.lastNotificationId || 0, notification_id);
+        }
+        // Show notification using SweetAlert2; replayed ones catch up silently
+        if (!replayed) {
+            showNotification(notification_type.toLowerCase(), message);
+        }
+        if (unread_count !== undefined) {
+            this.updateBadge(unread_count);
+        } else if (!replayed) {
+            updateNotificationCount();
+        }
     }
 
     updateBadge(count) {
@@ -53,19 +101,20 @@ document.addEventListener('DOMContentLoaded', () => {
     new NotificationHandler();
 });
 
+// Update notification badges/counters with an unread count
+function setNotificationCount(count) {
+    const notificationBadge = document.querySelector('.notification-badge');
+    if (notificationBadge) {
+        notificationBadge.textContent = count;
+        notificationBadge.style.display = count > 0 ? 'inline' : 'none';
+    }
+}
+
 // Fetch unread notifications count
 function updateNotificationCount() {
     fetch('/notifications/count/')
         .then(response => response.json())
-        .then(data => {
-            const count = data.count;
-            // Update any notification badges/counters here
-            const notificationBadge = document.querySelector('.notification-badge');
-            if (notificationBadge) {
-                notificationBadge.textContent = count;
-                notificationBadge.style.display = count > 0 ? 'inline' : 'none';
-            }
-        });
+        .then(data => setNotificationCount(data.count));
 }
 
 // SweetAlert2 notification presets
@@ -119,7 +168,7 @@ window.markAsRead = function(notificationId) {
     .then(response => response.json())
     .then(data => {
         if (data.status === 'success') {
-            updateNotificationCount();
+            setNotificationCount(data.unread_count);
             // Optionally remove or update the notification in the UI
             const notificationElement = document.querySelector(`[data-notification-id="${notificationId}"]`);
             if (notificationElement) {
@@ -143,7 +192,7 @@ function markAllAsRead() {
     .then(response => response.json())
     .then(data => {
         if (data.status === 'success') {
-            updateNotificationCount();
+            setNotificationCount(data.unread_count);
             // Update UI to reflect all notifications are read
             document.querySelectorAll('.unread').forEach(elem => {
                 elem.classList.remove('unread');
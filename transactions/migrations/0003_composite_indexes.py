@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking the tables against writes
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_composite_indexes'),
+        ('transactions', '0002_transaction_last_updated'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['type', 'status', 'date'], include=('amount',), name='transaction_type_status_date'),
+        ),
+    ]
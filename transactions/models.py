@@ -20,6 +20,7 @@ class Transaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     type = models.CharField(max_length=20, choices=TRANSACTION_TYPE_CHOICES)
     date = models.DateTimeField(auto_now_add=True)
+    last_updated = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=20, choices=TRANSACTION_STATUS_CHOICES, default='PENDING')
 
     def generate_receipt(self):
@@ -31,3 +32,8 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(
+                fields=['type', 'status', 'date'], include=['amount'], name='transaction_type_status_date'
+            ),
+        ]